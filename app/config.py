@@ -5,9 +5,118 @@ import json
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Point at a mock server for local testing
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+
+# AI response cache: "memory", "sqlite" or "none"
+AI_CACHE_BACKEND = os.getenv("AI_CACHE_BACKEND", "memory")
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "5000"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH", "ai_cache.sqlite3")
+# Also cache calls made with temperature > 0 (e.g. reply suggestions)
+AI_CACHE_NONDETERMINISTIC = os.getenv("AI_CACHE_NONDETERMINISTIC", "false").lower() == "true"
+
+# Incremental summaries: approx tokens per map chunk, and summaries merged per reduce call
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+SUMMARY_MERGE_FANIN = int(os.getenv("SUMMARY_MERGE_FANIN", "8"))
+
+# Batched task extraction: approx input tokens and messages packed into one model call,
+# calls in flight per job, and the local time used for reminders made from dated tasks
+EXTRACT_BATCH_TOKENS = int(os.getenv("EXTRACT_BATCH_TOKENS", "2000"))
+EXTRACT_BATCH_ITEMS = int(os.getenv("EXTRACT_BATCH_ITEMS", "40"))
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "4"))
+EXTRACT_REMINDER_TIME = os.getenv("EXTRACT_REMINDER_TIME", "09:00")
+
+# AI endpoint rate limits per user: requests/minute per endpoint ("default" covers the rest)
+# and estimated LLM tokens/minute across endpoints (0 disables either)
+RATE_LIMIT_REQUESTS = os.getenv("RATE_LIMIT_REQUESTS", "default=30,summarize=10,extract-tasks:batch=5")
+RATE_LIMIT_TOKENS = int(os.getenv("RATE_LIMIT_TOKENS", "40000"))
+# "module:ClassName" of a shared bucket store (empty = per-worker memory)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "")
+# Upstream LLM calls in flight per worker, and calls allowed to queue for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_WAITING = int(os.getenv("LLM_MAX_WAITING", "500"))
+
+# /metrics: bearer token required to scrape it (empty = open), and OpenTelemetry spans around timings
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_OTEL = os.getenv("METRICS_OTEL", "false").lower() == "true"
+# Honour `X-Profile: 1` request headers with a pyinstrument profile (needs pyinstrument installed)
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "false").lower() == "true"
+
+# Reminders due within this many seconds are held in memory and fired on time
+REMINDER_LOOKAHEAD_SECONDS = int(os.getenv("REMINDER_LOOKAHEAD_SECONDS", "600"))
+# How often the window is topped up and reminders created by other workers picked up
+REMINDER_REFRESH_SECONDS = int(os.getenv("REMINDER_REFRESH_SECONDS", "30"))
+# Reminders are hash-partitioned by userId into this many shards, each owned by one worker
+REMINDER_SHARDS = int(os.getenv("REMINDER_SHARDS", "1"))
+# A worker's claim on its shards lapses this long after its last heartbeat
+REMINDER_LEASE_SECONDS = int(os.getenv("REMINDER_LEASE_SECONDS", "30"))
+# Run the reminder scheduler inside each API process; set false to run it as `python -m app.worker`
+SCHEDULER_IN_API = os.getenv("SCHEDULER_IN_API", "true").lower() == "true"
+
+# Push notifications: "fcm", "log" (print only, for local runs) or "module:ClassName"
+NOTIFY_PROVIDER = os.getenv("NOTIFY_PROVIDER", "fcm")
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "10000"))
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "4"))
+# How long a worker waits to fill a batch before sending what it has
+NOTIFY_BATCH_WAIT_MS = float(os.getenv("NOTIFY_BATCH_WAIT_MS", "50"))
+# Attempts per device before a notification goes to notificationDeadLetters
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+# Notifications per user per minute; extra ones are delayed, not dropped
+NOTIFY_USER_RATE = float(os.getenv("NOTIFY_USER_RATE", "10"))
+# On shutdown, how long to keep delivering what is queued; the rest goes to notificationDeadLetters
+NOTIFY_DRAIN_SECONDS = float(os.getenv("NOTIFY_DRAIN_SECONDS", "10"))
+
+# Embeddings for semantic search and retrieval: "openai", "fake" (deterministic, offline) or "module:ClassName"
+EMBEDDINGS_PROVIDER = os.getenv("EMBEDDINGS_PROVIDER", "openai")
+EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "text-embedding-3-small")
+EMBEDDINGS_PATH = os.getenv("EMBEDDINGS_PATH", "embeddings.sqlite3")
+# New texts are collected for this long and embedded in one call
+EMBEDDINGS_BATCH_MS = float(os.getenv("EMBEDDINGS_BATCH_MS", "200"))
+# Users whose vectors are kept in memory
+EMBEDDINGS_MAX_USERS = int(os.getenv("EMBEDDINGS_MAX_USERS", "1000"))
+# Users with more vectors than this are searched through an approximate (IVF) index
+EMBEDDINGS_IVF_THRESHOLD = int(os.getenv("EMBEDDINGS_IVF_THRESHOLD", "20000"))
+# Search query vectors kept in memory; they are never written to EMBEDDINGS_PATH
+EMBEDDINGS_QUERY_CACHE = int(os.getenv("EMBEDDINGS_QUERY_CACHE", "1000"))
+# Snippets pulled into suggest/ask prompts, and the minimum cosine similarity to use one
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "5"))
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.3"))
+
+# SQLite file holding the full-text search index (shared by workers on one host)
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search_index.sqlite3")
+
+# Cold data archival: messages and inactive reminders older than this many days
+# are moved out of Firestore into gzip JSONL segments, at most this many records each
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_SEGMENT_SIZE = int(os.getenv("ARCHIVE_SEGMENT_SIZE", "5000"))
+# Directory holding the segments, or "module:ClassName" of another segment store (e.g. a bucket)
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH", "archive")
+ARCHIVE_STORE = os.getenv("ARCHIVE_STORE", "")
+
+# Real-time push: "module:ClassName" of a shared broker (empty = in-process only)
+REALTIME_BROKER = os.getenv("REALTIME_BROKER", "")
+# Events buffered per connection before it's dropped as a slow consumer
+REALTIME_QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", "100"))
 SECRET_KEY = os.getenv("SECRET_KEY")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
+# Max number of verified ID tokens kept in memory (0 disables the cache)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# Cached conversation participants / note and reminder owners
+ACL_CACHE_SIZE = int(os.getenv("ACL_CACHE_SIZE", "50000"))
+ACL_CACHE_TTL = float(os.getenv("ACL_CACHE_TTL", "300"))
+
+# Max number of Firestore calls in flight per worker process
+FIRESTORE_MAX_CONCURRENCY = int(os.getenv("FIRESTORE_MAX_CONCURRENCY", "16"))
+# Group messages sent within this many ms into one Firestore commit (0 = off)
+SEND_MICROBATCH_MS = float(os.getenv("SEND_MICROBATCH_MS", "0"))
+
+# Module providing client() and verify_id_token() to use instead of Firebase (e.g. "bench.fake_firestore")
+FIREBASE_BACKEND = os.getenv("FIREBASE_BACKEND", "")
 FIREBASE_SERVICE_ACCOUNT_JSON = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON")
 FIREBASE_SERVICE_ACCOUNT_PATH = os.getenv("FIREBASE_SERVICE_ACCOUNT_PATH")
 
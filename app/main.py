@@ -1,13 +1,52 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.config import FRONTEND_URL
+from fastapi.middleware.gzip import GZipMiddleware
+from app.config import FRONTEND_URL, METRICS_TOKEN, SCHEDULER_IN_API
+from app.middleware.metrics import MetricsMiddleware
+
+from app.routes import auth, chat, ai, reminders, notepad, search
+from app.scheduler import start_scheduler, stop_scheduler
+from app.services import ai_service, firebase, repository
+from app.services.ai_cache import ai_cache
+from app.services.notification import notifications
+from app.services.embeddings import embedding_store
+from app.services.search_index import search_index
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing above runs network I/O at import; clients are made here, per worker process
+    firebase.init_app()  # Fail fast on missing credentials
+    await asyncio.to_thread(search_index.open)
+    await asyncio.to_thread(embedding_store.open)
+    await asyncio.to_thread(ai_cache.open)
+    warmup = asyncio.create_task(asyncio.to_thread(ai_service.get_client))
+    scheduler = None
+    if SCHEDULER_IN_API:
+        await notifications.start()
+        # Lease acquisition and the first window load are Firestore round trips; don't hold up serving
+        scheduler = asyncio.create_task(asyncio.to_thread(start_scheduler))
+    yield
+    await repository.drain_messages()  # Senders are still waiting on these
+    if scheduler is not None:
+        await asyncio.gather(scheduler, return_exceptions=True)
+        await asyncio.to_thread(stop_scheduler)
+        await notifications.stop()
+    await asyncio.gather(warmup, return_exceptions=True)
+    await ai_service.close_client()
+    search_index.close()
+    embedding_store.close()
+    ai_cache.close()
 
-from app.routes import auth, chat, ai, reminders, notepad
 
 app = FastAPI(
     title="AI Conversation Notepad API",
     version="1.0.0",
-    description="Backend for AI-powered chat and productivity app"
+    description="Backend for AI-powered chat and productivity app",
+    lifespan=lifespan,
 )
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -18,15 +57,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Prev-Cursor"],
 )
 
+# Compress larger JSON bodies (note and message pages); SSE streams are left alone
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Outermost, so request latency includes the other middleware
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth.router,      prefix="/v1")
 app.include_router(chat.router,      prefix="/v1")
 app.include_router(ai.router,        prefix="/v1")
 app.include_router(reminders.router, prefix="/v1")
 app.include_router(notepad.router,   prefix="/v1")
-from app.scheduler import start_scheduler
-start_scheduler()
+app.include_router(search.router,    prefix="/v1")
+from app.services.ai_service import LLMOverloaded
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded(request: Request, exc: LLMOverloaded):
+    # Every upstream slot is busy and the wait queue is full
+    return JSONResponse(status_code=429, content={"detail": "AI service busy"}, headers={"Retry-After": "1"})
+
+from app.services import metrics, repository
+from app.services.acl_cache import acl_cache
+from app.services.ai_service import governor
+from app.services.rate_limit import rate_limiter
+from app.services.realtime import hub
+from app.services.token_cache import token_cache
+from app.scheduler import dispatcher
+
+metrics.register_stats("token_cache", token_cache.stats)
+metrics.register_stats("acl_cache", acl_cache.stats)
+metrics.register_stats("ai_cache", ai_cache.stats)
+metrics.register_stats("llm_governor", governor.stats)
+metrics.register_stats("rate_limit", rate_limiter.stats)
+metrics.register_stats("realtime", hub.stats)
+metrics.register_stats("notifications", notifications.stats)
+metrics.register_stats("embeddings", embedding_store.stats)
+metrics.register_stats("search_index", search_index.stats)
+metrics.register_stats("message_batcher", repository.message_batcher_stats)
+metrics.register_stats("reminders", dispatcher.stats)
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def health_check():
     return {"status": "API is running ✅"}
\ No newline at end of file
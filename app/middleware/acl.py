@@ -0,0 +1,51 @@
+from fastapi import Depends, HTTPException, Request
+from app.middleware.auth import get_current_user
+from app.services.acl_cache import acl_cache
+
+# Authorization dependencies backed by the ACL cache.
+# Each one keeps the status codes its routes have always returned.
+
+def _endpoint(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "name", request.url.path)
+
+
+def conversation_member(missing_status: int = 404):
+    """Dependency: the caller must be a participant. Returns the participants."""
+    async def dependency(
+        conv_id: str,
+        request: Request,
+        current_user: dict = Depends(get_current_user),
+    ) -> frozenset:
+        members = await acl_cache.conversation_members(conv_id, _endpoint(request))
+        if members is None:
+            detail = "Conversation not found" if missing_status == 404 else "Access denied"
+            raise HTTPException(status_code=missing_status, detail=detail)
+        if current_user["uid"] not in members:
+            raise HTTPException(status_code=403, detail="Access denied")
+        return members
+    return dependency
+
+
+async def note_owner(
+    note_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+):
+    """Dependency: the caller must own the note."""
+    owners = await acl_cache.note_owners(note_id, _endpoint(request))
+    if not owners or current_user["uid"] not in owners:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+
+async def reminder_owner(
+    reminder_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+):
+    """Dependency: the caller must own the reminder."""
+    owners = await acl_cache.reminder_owners(reminder_id, _endpoint(request))
+    if owners is None:
+        raise HTTPException(status_code=404, detail="Reminder not found")
+    if current_user["uid"] not in owners:
+        raise HTTPException(status_code=403, detail="Access denied")
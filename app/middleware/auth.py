@@ -1,5 +1,21 @@
 from fastapi import Request, HTTPException
+from app.services import metrics
 from app.services.firebase import verify_firebase_token
+from app.services.token_cache import token_cache
+
+def authenticate(token: str) -> dict | None:
+    """Verify an ID token, skipping signature checks for ones we've already verified."""
+    user = token_cache.get(token)
+    if not user:
+        with metrics.timed(metrics.AUTH_SECONDS):
+            user = verify_firebase_token(token)
+        if user:
+            token_cache.put(token, user)
+
+    if not user:
+        return None
+
+    return {"uid": user["uid"], "email": user.get("email")}
 
 async def get_current_user(request: Request) -> dict:
     """
@@ -7,15 +23,15 @@ async def get_current_user(request: Request) -> dict:
     Used as a dependency in protected routes.
     """
     auth_header = request.headers.get("Authorization")
-    
+
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="No token provided")
 
     token = auth_header.split(" ")[1]
 
-    user = verify_firebase_token(token)
+    user = authenticate(token)
 
     if not user:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    return {"uid": user["uid"], "email": user.get("email")}
\ No newline at end of file
+    return user
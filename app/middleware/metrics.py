@@ -0,0 +1,69 @@
+import time
+from app.config import PROFILE_REQUESTS
+from app.services import metrics
+
+try:
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+# ASGI middleware recording per-route latency. Routes are labelled by their
+# template ("/v1/notes/{note_id}"), never the raw path, to keep the number
+# of series bounded. Streaming responses are timed until the body ends.
+#
+# With PROFILE_REQUESTS on and pyinstrument installed, a request carrying
+# `X-Profile: 1` is run under the sampling profiler and answered with the
+# profile as HTML instead of its normal response.
+
+
+def _route(scope) -> str:
+    template = getattr(scope.get("route"), "path", None)
+    if not template:
+        return "unmatched"
+    # The route keeps its own path; put back the static prefixes it was included under ("/v1")
+    extra = scope["path"].rstrip("/").count("/") - template.rstrip("/").count("/")
+    prefix = "/".join(scope["path"].split("/")[:extra + 1]) if extra > 0 else ""
+    return prefix + template
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if PROFILE_REQUESTS and Profiler is not None and (b"x-profile", b"1") in scope["headers"]:
+            return await self._profile(scope, receive, send)
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], _route(scope), str(status))
+
+    async def _profile(self, scope, receive, send):
+        async def discard(message):
+            pass
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+        body = profiler.output_html().encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/html; charset=utf-8"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,42 @@
+import math
+from fastapi import Depends, HTTPException, Request
+from app.middleware.auth import get_current_user
+from app.services.rate_limit import rate_limiter
+from app.services.summarizer import estimate_tokens
+
+# Rate-limit dependencies for the AI routes.
+# The token estimate is the request body plus the reply the endpoint typically asks for.
+# Routes whose upstream cost isn't in the body (a stored conversation) call
+# settle_tokens() afterwards to charge what was actually used.
+
+OUTPUT_TOKENS = {"suggest": 100, "summarize": 300, "ask": 300, "extract-tasks": 200}
+
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many requests",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def ai_rate_limit(endpoint: str):
+    """Dependency: charge the caller's buckets for `endpoint`, or answer 429 with Retry-After."""
+    async def dependency(
+        request: Request,
+        current_user: dict = Depends(get_current_user),
+    ) -> dict:
+        body = await request.body()  # Cached; the route still gets it
+        tokens = estimate_tokens(body.decode(errors="ignore")) + OUTPUT_TOKENS.get(endpoint, 0)
+        wait = await rate_limiter.admit(current_user["uid"], endpoint, tokens)
+        if wait:
+            raise too_many_requests(wait)
+        request.state.ai_charge = (current_user["uid"], tokens)
+        return current_user
+    return dependency
+
+
+async def settle_tokens(request: Request, used: int):
+    """Replace the estimate ai_rate_limit charged for this request with the tokens used upstream."""
+    uid, charged = request.state.ai_charge
+    await rate_limiter.settle(uid, charged, used)
@@ -1,7 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from app.middleware.auth import get_current_user
-from app.services.ai_service import suggest_reply, summarize_conversation, extract_tasks
+from app.middleware.rate_limit import ai_rate_limit, settle_tokens
+from app.config import RAG_MIN_SCORE, RAG_TOP_K
+from app.services import recurrence, repository
+from app.services.embeddings import embedding_store
+from app.services.task_extraction import start_job
+from app.services.summarizer import summarize_incremental
+from app.services.ai_service import (
+    suggest_reply,
+    stream_suggest_reply,
+    summarize_conversation,
+    stream_summarize_conversation,
+    answer_question,
+    extract_tasks,
+    track_usage,
+)
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -10,46 +26,189 @@ class SuggestRequest(BaseModel):
     messages: list[dict]  # [{"isOwn": bool, "text": str}]
 
 class SummarizeRequest(BaseModel):
-    messages: list[dict]  # [{"senderId": str, "text": str}]
+    messages: list[dict] = []  # [{"senderId": str, "text": str}]
+    conversation_id: str | None = None  # Summarize a stored chat incrementally instead
+
+class AskRequest(BaseModel):
+    question: str
 
 class ExtractTasksRequest(BaseModel):
     text: str
 
+class BatchMessage(BaseModel):
+    id: str
+    text: str
+    conversation_id: str | None = None
+
+class ExtractTasksBatchRequest(BaseModel):
+    messages: list[BatchMessage]
+    create_reminders: bool = False  # Turn dated tasks into reminders when the job finishes
+    timezone: str | None = None     # For relative dates and reminder times; defaults like reminders do
+
+MAX_BATCH_MESSAGES = 500
+
+
+async def _retrieve(uid: str, query: str, exclude: set[str] = frozenset()) -> list[dict]:
+    """The user's notes/messages most relevant to `query`. Retrieval is best-effort."""
+    try:
+        hits = await embedding_store.search(uid, query, k=RAG_TOP_K + len(exclude))
+    except Exception as exc:
+        print(f"Retrieval failed: {exc}")
+        return []
+    hits = [h for h in hits if h["score"] >= RAG_MIN_SCORE and h["text"] not in exclude]
+    return hits[:RAG_TOP_K]
+
+
+def _sse(chunks, result_key: str) -> StreamingResponse:
+    """
+    Stream text chunks as Server-Sent Events.
+    Each chunk is sent as `data: {"delta": ...}`, followed by a final
+    `event: done` carrying the full text under `result_key`.
+    """
+    async def events():
+        parts = []
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+        except Exception:
+            yield f"event: error\ndata: {json.dumps({'detail': 'AI service unavailable'})}\n\n"
+            return
+        yield f"event: done\ndata: {json.dumps({result_key: ''.join(parts).strip()})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.post("/suggest")
 async def get_suggestion(
     body: SuggestRequest,
-    current_user: dict = Depends(get_current_user)  # Must be logged in
+    stream: bool = False,
+    current_user: dict = Depends(ai_rate_limit("suggest"))  # Must be logged in
 ):
     """Get an AI-suggested reply based on conversation context."""
     if not body.messages:
         raise HTTPException(status_code=400, detail="No messages provided")
 
-    suggestion = suggest_reply(body.messages)
+    # Pull in older context the last few messages don't cover
+    recent = {" ".join(m["text"].split()) for m in body.messages[-6:]}
+    query = " ".join(m["text"] for m in body.messages[-3:])
+    context = [h["text"] for h in await _retrieve(current_user["uid"], query, exclude=recent)]
+
+    if stream:
+        return _sse(stream_suggest_reply(body.messages, context), "suggestion")
+
+    suggestion = await suggest_reply(body.messages, context)
     return {"suggestion": suggestion}
 
 
 @router.post("/summarize")
 async def get_summary(
     body: SummarizeRequest,
-    current_user: dict = Depends(get_current_user)
+    request: Request,
+    stream: bool = False,
+    current_user: dict = Depends(ai_rate_limit("summarize"))
 ):
     """Summarize a conversation."""
+    if body.conversation_id:
+        # The stored summary is folded page by page, so there's nothing to stream
+        if stream:
+            raise HTTPException(status_code=400, detail="stream is not supported with conversation_id")
+        conv = await repository.get_conversation(body.conversation_id)
+        if not conv or current_user["uid"] not in conv.get("participants", []):
+            raise HTTPException(status_code=403, detail="Access denied")
+
+        # The body is only an ID; charge for however many unsummarized messages were folded in
+        with track_usage() as used:
+            try:
+                summary = await summarize_incremental(body.conversation_id, conv)
+            finally:
+                await settle_tokens(request, used[0])
+        if not summary:
+            raise HTTPException(status_code=400, detail="Need at least 2 messages to summarize")
+        return {"summary": summary}
+
     if len(body.messages) < 2:
         raise HTTPException(status_code=400, detail="Need at least 2 messages to summarize")
 
-    summary = summarize_conversation(body.messages)
+    if stream:
+        return _sse(stream_summarize_conversation(body.messages), "summary")
+
+    summary = await summarize_conversation(body.messages)
     return {"summary": summary}
 
 
+@router.post("/ask")
+async def ask(
+    body: AskRequest,
+    current_user: dict = Depends(ai_rate_limit("ask"))
+):
+    """Answer a question from the user's own notes and messages."""
+    if not body.question.strip():
+        raise HTTPException(status_code=400, detail="Empty question")
+
+    sources = await _retrieve(current_user["uid"], body.question)
+    if not sources:
+        return {"answer": "I couldn't find anything about that in your notes or messages.", "sources": []}
+
+    answer = await answer_question(body.question, [s["text"] for s in sources])
+    return {
+        "answer": answer,
+        "sources": [{k: s[k] for k in ("kind", "id", "conversationId", "text", "score")} for s in sources],
+    }
+
+
 @router.post("/extract-tasks")
 async def get_tasks(
     body: ExtractTasksRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(ai_rate_limit("extract-tasks"))
 ):
     """Extract actionable tasks from a message."""
     if not body.text.strip():
         raise HTTPException(status_code=400, detail="Empty text")
 
-    tasks = extract_tasks(body.text)
-    return {"tasks": tasks}
\ No newline at end of file
+    try:
+        tasks = await extract_tasks(body.text)
+    except ValueError:
+        raise HTTPException(status_code=502, detail="AI returned an unreadable response")
+    return {"tasks": tasks}
+
+
+@router.post("/extract-tasks:batch", status_code=202)
+async def start_task_extraction(
+    body: ExtractTasksBatchRequest,
+    current_user: dict = Depends(ai_rate_limit("extract-tasks:batch"))
+):
+    """Extract tasks from many messages in the background. Poll GET /ai/jobs/{jobId} for results."""
+    messages = [m for m in body.messages if m.text.strip()]
+    if not messages:
+        raise HTTPException(status_code=400, detail="No messages provided")
+    if len(messages) > MAX_BATCH_MESSAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_MESSAGES} messages per batch")
+    if len({m.id for m in messages}) != len(messages):
+        raise HTTPException(status_code=400, detail="Message ids must be unique")
+
+    zone = body.timezone or (await repository.get_user(current_user["uid"]) or {}).get("timezone") or "UTC"
+    try:
+        recurrence.get_zone(zone)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    items = [{"id": m.id, "text": m.text, "conversationId": m.conversation_id} for m in messages]
+    job = await start_job(current_user["uid"], items, zone, body.create_reminders)
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Status of a background AI job, with its results once done."""
+    job = await repository.get_job(job_id)
+    if not job or job["userId"] != current_user["uid"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from app.middleware.auth import get_current_user
-from app.services.firebase import verify_firebase_token, create_or_update_user, get_user
+from app.services import export, recurrence, repository
+from app.services.firebase import verify_firebase_token
 from datetime import datetime
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -9,9 +11,13 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 class LoginRequest(BaseModel):
     id_token: str  
 
+class DeviceTokenRequest(BaseModel):
+    token: str
+
 class ProfileUpdateRequest(BaseModel):
     display_name: str | None = None
     is_anonymous_enabled: bool | None = None
+    timezone: str | None = None  # IANA name; the default for reminders and task extraction
 
 
 @router.post("/login")
@@ -34,7 +40,7 @@ async def login(body: LoginRequest):
         "isAnonymousEnabled": False,
         "createdAt": datetime.utcnow().isoformat(),
     }
-    create_or_update_user(user["uid"], user_data)
+    await repository.save_user(user["uid"], user_data)
 
     return {"message": "Login successful", "user": user_data}
 
@@ -42,7 +48,7 @@ async def login(body: LoginRequest):
 @router.get("/profile")
 async def get_profile(current_user: dict = Depends(get_current_user)):
     """Get the logged-in user's profile."""
-    user = get_user(current_user["uid"])
+    user = await repository.get_user(current_user["uid"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -53,8 +59,47 @@ async def update_profile(
     body: ProfileUpdateRequest,
     current_user: dict = Depends(get_current_user)
 ):
-    """Update display name or anonymous chat setting."""
+    """Update display name, anonymous chat setting or time zone."""
     updates = body.dict(exclude_none=True)  # Only include fields that were sent
+    if "timezone" in updates:
+        try:
+            recurrence.get_zone(updates["timezone"])
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
     if updates:
-        create_or_update_user(current_user["uid"], updates)
-    return {"message": "Profile updated"}
\ No newline at end of file
+        await repository.save_user(current_user["uid"], updates)
+    return {"message": "Profile updated"}
+
+
+@router.post("/device-token")
+async def register_device_token(
+    body: DeviceTokenRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Register an FCM token so reminders are pushed to this device."""
+    await repository.add_device_token(current_user["uid"], body.token)
+    return {"message": "Device registered"}
+
+
+@router.delete("/device-token")
+async def unregister_device_token(
+    body: DeviceTokenRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stop pushing reminders to this device (e.g. on sign-out)."""
+    await repository.remove_device_tokens(current_user["uid"], [body.token])
+    return {"message": "Device unregistered"}
+
+
+@router.get("/export")
+async def export_data(current_user: dict = Depends(get_current_user)):
+    """
+    Download everything stored for the logged-in user, archived history
+    included, as newline-delimited JSON. Streamed, so large accounts start
+    downloading straight away.
+    """
+    return StreamingResponse(
+        export.to_jsonl(export.export_user(current_user["uid"])),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="export.jsonl"'},
+    )
@@ -1,8 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from google.api_core.exceptions import NotFound
 from pydantic import BaseModel
-from app.middleware.auth import get_current_user
-from app.services.firebase import db
-from datetime import datetime
+from app.middleware.auth import get_current_user, authenticate
+from app.middleware.acl import conversation_member
+from app.routes.cursors import decode_cursor, encode_cursor
+from app.services import archive, recurrence, repository
+from app.services.acl_cache import acl_cache
+from app.services.embeddings import embedding_store
+from app.services.realtime import hub
+from app.services.search_index import search_index
+from datetime import datetime, timedelta, timezone
+import asyncio
+import hashlib
+import json
 import uuid
 
 router = APIRouter(prefix="/chat", tags=["chat"])
@@ -12,36 +23,55 @@ class NewConversationRequest(BaseModel):
 
 class NewMessageRequest(BaseModel):
     text: str
-    ai_suggested: bool = False  
+    ai_suggested: bool = False
+
+def _parse_timestamp(value: str) -> str | None:
+    """An ISO timestamp as stored (naive UTC), or None if `value` isn't one. No offset means UTC."""
+    try:
+        return recurrence.parse_datetime(value, timezone.utc).isoformat()
+    except ValueError:
+        return None
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match is a list of tags compared weakly (W/ ignored); * matches any version."""
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
 
 @router.get("/search")
 async def search_user(email: str, current_user: dict = Depends(get_current_user)):
     """Find a user by their Gmail address."""
-    users = db.collection("users").where("email", "==", email).limit(1).get()
-    results = [u.to_dict() for u in users]
+    user = await repository.find_user_by_email(email)
 
-    if not results:
+    if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Don't return your own profile
-    if results[0]["uid"] == current_user["uid"]:
+    if user["uid"] == current_user["uid"]:
         raise HTTPException(status_code=400, detail="Cannot chat with yourself")
 
-    return results[0]
+    return user
 
 
 @router.get("/conversations")
-async def list_conversations(current_user: dict = Depends(get_current_user)):
-    """Get all conversations for the logged-in user."""
-    uid = current_user["uid"]
-    convs = (
-        db.collection("conversations")
-        .where("participants", "array_contains", uid)
-        .order_by("lastMessageAt", direction="DESCENDING")
-        .limit(50)
-        .get()
-    )
-    return [c.to_dict() for c in convs]
+async def list_conversations(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: str | None = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    The logged-in user's conversations, most recently active first, each
+    with its `unreadCount`. Pass the X-Next-Cursor header back as `before`
+    for the next page.
+    """
+    before_ts = decode_cursor(before)[0] if before else None
+    conversations = await repository.list_conversations(current_user["uid"], limit + 1, before=before_ts)
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(conversations[-1]["lastMessageAt"])
+    return conversations
 
 
 @router.post("/conversations")
@@ -51,94 +81,265 @@ async def start_conversation(
 ):
     """Start a new conversation with a user found by email."""
     # Find recipient
-    users = db.collection("users").where("email", "==", body.recipient_email).limit(1).get()
-    if not users:
+    recipient = await repository.find_user_by_email(body.recipient_email)
+    if not recipient:
         raise HTTPException(status_code=404, detail="User not found")
 
-    recipient = users[0].to_dict()
     uid = current_user["uid"]
     recipient_uid = recipient["uid"]
 
-    # Check if conversation already exists between these two users
-    existing = (
-        db.collection("conversations")
-        .where("participants", "array_contains", uid)
-        .get()
-    )
-    for conv in existing:
-        data = conv.to_dict()
-        if recipient_uid in data.get("participants", []):
-            return data  # Return the existing conversation
-
-    # Create a new conversation document
+    # Return the existing conversation between these two users, or create one
     conv_id = str(uuid.uuid4())
+    key = repository.pair_key(uid, recipient_uid)
     conv_data = {
         "conversationId": conv_id,
         "participants": [uid, recipient_uid],
+        "pairKey": key,
         "type": "known",
         "lastMessage": "",
         "lastMessageAt": datetime.utcnow().isoformat(),
         "createdAt": datetime.utcnow().isoformat(),
     }
-    db.collection("conversations").document(conv_id).set(conv_data)
-    return conv_data
+    conv = await repository.get_or_create_pair_conversation(key, conv_data)
+    acl_cache.put("conversation", conv["conversationId"], conv["participants"])
+    return conv
 
 
 @router.get("/conversations/{conv_id}/messages")
-async def get_messages(conv_id: str, current_user: dict = Depends(get_current_user)):
-    """Get messages in a conversation."""
-    # Security check: user must be a participant
-    conv = db.collection("conversations").document(conv_id).get()
-    if not conv.exists:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-
-    if current_user["uid"] not in conv.to_dict().get("participants", []):
-        raise HTTPException(status_code=403, detail="Access denied")
-
-    messages = (
-        db.collection("conversations").document(conv_id)
-        .collection("messages")
-        .order_by("timestamp")
-        .limit(100)
-        .get()
-    )
-    return [m.to_dict() for m in messages]
+async def get_messages(
+    conv_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: str | None = None,  # Cursor: page back through older messages
+    after: str | None = None,   # Cursor: page forward through newer messages
+    since: str | None = None,   # Timestamp or messageId: only messages newer than it
+    members: frozenset = Depends(conversation_member(missing_status=404)),
+):
+    """
+    Get messages in a conversation, oldest first.
+
+    Without cursors this returns the newest `limit` messages. The
+    X-Prev-Cursor / X-Next-Cursor headers page older / newer, and an ETag
+    lets polling clients get a 304 when nothing has changed. Paging past the
+    oldest message still in Firestore continues into the archive.
+    """
+    def make_etag(last_message_at: str) -> str:
+        # Nothing in the conversation changes without lastMessageAt moving
+        version = f"{conv_id}|{last_message_at}|{limit}|{before}|{after}|{since}"
+        return f'W/"{hashlib.sha1(version.encode()).hexdigest()}"'
+
+    # Conditional requests cost one small read instead of a page of messages
+    etag = None
+    if request.headers.get("If-None-Match"):
+        etag = make_etag(await repository.get_conversation_version(conv_id))
+        if _etag_matches(request.headers["If-None-Match"], etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+    if since:
+        after_ts = _parse_timestamp(since)
+        if after_ts is None:
+            anchor = await repository.get_message(conv_id, since)
+            if not anchor:
+                raise HTTPException(status_code=404, detail="Message not found")
+            after_pos = (anchor["timestamp"], anchor["messageId"])
+        else:
+            after_pos = (after_ts, None)
+    else:
+        after_pos = decode_cursor(after) if after else None
+
+    if after_pos:
+        messages = await archive.messages_after(conv_id, after_pos, limit)
+    else:
+        before_pos = decode_cursor(before) if before else None
+        messages = await archive.messages_before(conv_id, limit, before=before_pos)
+
+    # lastMessageAt is written with the newest message, so a page that
+    # reaches the end of the conversation tells us the version for free
+    if after_pos:
+        at_end = len(messages) < limit
+    else:
+        at_end = not before
+    if etag is None and messages and at_end:
+        etag = make_etag(messages[-1]["timestamp"])
+    if etag:
+        response.headers["ETag"] = etag
+
+    if messages:
+        response.headers["X-Next-Cursor"] = encode_cursor(messages[-1]["timestamp"], messages[-1]["messageId"])
+        # A short page going backwards means we've reached the start
+        if after_pos or len(messages) == limit:
+            response.headers["X-Prev-Cursor"] = encode_cursor(messages[0]["timestamp"], messages[0]["messageId"])
+    elif after_pos:
+        # Nothing new yet: keep polling from the same point
+        response.headers["X-Next-Cursor"] = encode_cursor(*after_pos)
+    return messages
+
+
+def _new_message(uid: str, body: NewMessageRequest, timestamp: str) -> dict:
+    return {
+        "messageId": str(uuid.uuid4()),
+        "senderId": uid,
+        "text": body.text,
+        "aiSuggested": body.ai_suggested,
+        "timestamp": timestamp,
+        "readBy": [uid],
+    }
+
+
+async def _publish(conv_id: str, participants, messages: list[dict]):
+    # Push to everyone connected to /chat/stream
+    for msg_data in messages:
+        await hub.publish(list(participants), {
+            "type": "message",
+            "conversationId": conv_id,
+            "message": msg_data,
+        })
 
 
 @router.post("/conversations/{conv_id}/messages")
 async def send_message(
     conv_id: str,
     body: NewMessageRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    members: frozenset = Depends(conversation_member(missing_status=403)),
 ):
     """Send a message in a conversation."""
     uid = current_user["uid"]
 
-    # Security check
-    conv_ref = db.collection("conversations").document(conv_id)
-    conv = conv_ref.get()
-    if not conv.exists or uid not in conv.to_dict().get("participants", []):
-        raise HTTPException(status_code=403, detail="Access denied")
-
-    # Create the message
-    msg_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
-    msg_data = {
-        "messageId": msg_id,
-        "senderId": uid,
-        "text": body.text,
-        "aiSuggested": body.ai_suggested,
-        "timestamp": now,
-        "readBy": [uid],
-    }
-
-    # Save message as subcollection
-    conv_ref.collection("messages").document(msg_id).set(msg_data)
+    msg_data = _new_message(uid, body, now)
 
-    # Update conversation preview
-    conv_ref.update({
+    # Save message and update conversation preview in one commit
+    await repository.add_message(conv_id, msg_data, {
         "lastMessage": body.text[:50],  # First 50 chars as preview
         "lastMessageAt": now,
-    })
+    }, members)
+
+    await _publish(conv_id, members, [msg_data])
+    await search_index.index_messages(conv_id, members, [msg_data])
+    embedding_store.add(members, "message", msg_data["messageId"], body.text, conv_id)
+    return msg_data
+
+
+@router.post("/conversations/{conv_id}/read")
+async def mark_read(
+    conv_id: str,
+    current_user: dict = Depends(get_current_user),
+    members: frozenset = Depends(conversation_member(missing_status=404)),
+):
+    """Clear the user's unread count for a conversation."""
+    try:
+        await repository.mark_conversation_read(current_user["uid"], conv_id, datetime.utcnow().isoformat())
+    except NotFound:
+        pass  # No inbox entry yet (conversation predates the inbox backfill): nothing is counted as unread
+    return {"message": "Marked as read"}
+
+
+MAX_BATCH_MESSAGES = 200
+
+class NewMessagesBatchRequest(BaseModel):
+    messages: list[NewMessageRequest]
+
+
+@router.post("/conversations/{conv_id}/messages:batch")
+async def send_messages_batch(
+    conv_id: str,
+    body: NewMessagesBatchRequest,
+    current_user: dict = Depends(get_current_user),
+    members: frozenset = Depends(conversation_member(missing_status=403)),
+):
+    """Send several messages at once, e.g. a client's offline queue."""
+    uid = current_user["uid"]
+
+    if not body.messages:
+        raise HTTPException(status_code=400, detail="No messages provided")
+    if len(body.messages) > MAX_BATCH_MESSAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_MESSAGES} messages per batch")
+
+    # Spread timestamps by a microsecond so the batch keeps its order
+    start = datetime.utcnow()
+    messages = [
+        _new_message(uid, m, (start + timedelta(microseconds=i)).isoformat())
+        for i, m in enumerate(body.messages)
+    ]
+
+    await repository.add_messages(conv_id, messages, {
+        "lastMessage": messages[-1]["text"][:50],
+        "lastMessageAt": messages[-1]["timestamp"],
+    }, members)
+
+    await _publish(conv_id, members, messages)
+    await search_index.index_messages(conv_id, members, messages)
+    for message in messages:
+        embedding_store.add(members, "message", message["messageId"], message["text"], conv_id)
+    return messages
+
+
+KEEPALIVE_SECONDS = 15
+
 
-    return msg_data
\ No newline at end of file
+@router.websocket("/stream")
+async def stream_ws(websocket: WebSocket, token: str = ""):
+    """
+    Push new messages from all of the user's conversations.
+    Browsers can't set headers on a WebSocket, so the ID token goes in ?token=.
+    """
+    user = authenticate(token)
+    if not user:
+        await websocket.close(code=4401)
+        return
+
+    await websocket.accept()
+    sub = await hub.subscribe(user["uid"])
+
+    async def drain_client():
+        # We don't expect messages, but receiving is how a disconnect shows up
+        while True:
+            await websocket.receive_text()
+
+    receiver = asyncio.create_task(drain_client())
+    try:
+        while not receiver.done():
+            try:
+                event = await sub.next(timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "ping"})
+                continue
+            if event is None:
+                # Fell too far behind: the client should reconnect and catch up with ?since=
+                await websocket.close(code=1013)
+                break
+            await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        hub.unsubscribe(sub)
+
+
+@router.get("/stream")
+async def stream_sse(current_user: dict = Depends(get_current_user)):
+    """Server-Sent Events fallback for clients that can't use WebSockets."""
+    sub = await hub.subscribe(current_user["uid"])
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await sub.next(timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    yield "event: overflow\ndata: {}\n\n"
+                    return
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
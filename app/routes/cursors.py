@@ -0,0 +1,23 @@
+import base64
+import binascii
+from datetime import datetime
+from fastapi import HTTPException
+
+# Opaque page cursors shared by the list endpoints.
+# A cursor is the base64 of the ISO timestamp the page is keyed on, then
+# "|" and the document ID when several documents can share a timestamp
+# (messages), so a page boundary never falls between two of them.
+
+def encode_cursor(timestamp: str, doc_id: str | None = None) -> str:
+    value = f"{timestamp}|{doc_id}" if doc_id else timestamp
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, str | None]:
+    """(timestamp, document ID); the ID is None in timestamp-only cursors."""
+    try:
+        timestamp, _, doc_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition("|")
+        datetime.fromisoformat(timestamp)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return timestamp, doc_id or None
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel
 from app.middleware.auth import get_current_user
-from app.services.firebase import db
+from app.middleware.acl import note_owner
+from app.routes.cursors import decode_cursor, encode_cursor
+from app.services import repository
+from app.services.acl_cache import acl_cache
+from app.services.embeddings import embedding_store
+from app.services.search_index import search_index
+from google.api_core.exceptions import NotFound
 from datetime import datetime
 import uuid
 
 router = APIRouter(prefix="/notepad", tags=["notepad"])
 
+SNIPPET_LENGTH = 160
+
 class NoteRequest(BaseModel):
     title: str
     summary: str
@@ -16,15 +24,36 @@ class NoteUpdateRequest(BaseModel):
     title: str | None = None
     summary: str | None = None
 
+def make_snippet(summary: str) -> str:
+    """Short preview of a note for the list view."""
+    text = " ".join(summary.split())
+    return text if len(text) <= SNIPPET_LENGTH else text[:SNIPPET_LENGTH - 1].rstrip() + "…"
+
 @router.get("/")
-async def list_notes(current_user: dict = Depends(get_current_user)):
-    notes = (
-        db.collection("notes")
-        .where("userId", "==", current_user["uid"])
-        .order_by("createdAt", direction="DESCENDING")
-        .get()
-    )
-    return [n.to_dict() for n in notes]
+async def list_notes(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: str | None = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    A page of the user's notes, newest first, without their full bodies.
+    Pass the X-Next-Cursor header back as `before` for the next page.
+    """
+    before_ts = decode_cursor(before)[0] if before else None
+    notes = await repository.list_notes(current_user["uid"], limit + 1, before=before_ts)
+    if len(notes) > limit:
+        notes = notes[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(notes[-1]["createdAt"])
+    return notes
+
+@router.get("/{note_id}")
+async def get_note(note_id: str, _: None = Depends(note_owner)):
+    note = await repository.get_note(note_id)
+    if not note:
+        acl_cache.invalidate("note", note_id)
+        raise HTTPException(status_code=403, detail="Access denied")
+    return note
 
 @router.post("/")
 async def create_note(body: NoteRequest, current_user: dict = Depends(get_current_user)):
@@ -35,34 +64,48 @@ async def create_note(body: NoteRequest, current_user: dict = Depends(get_curren
         "userId": current_user["uid"],
         "title": body.title,
         "summary": body.summary,
+        "snippet": make_snippet(body.summary),
         "sourceConversationId": body.source_conversation_id,
         "createdAt": now,
         "updatedAt": now,
     }
-    db.collection("notes").document(note_id).set(data)
+    await repository.create_note(note_id, data)
+    acl_cache.put("note", note_id, [current_user["uid"]])
+    await search_index.index_note(data)
+    embedding_store.add([current_user["uid"]], "note", note_id, f"{body.title}\n{body.summary}")
     return data
 
 @router.patch("/{note_id}")
 async def update_note(
     note_id: str,
     body: NoteUpdateRequest,
-    current_user: dict = Depends(get_current_user)
+    _: None = Depends(note_owner)
 ):
-    ref = db.collection("notes").document(note_id)
-    doc = ref.get()
-    if not doc.exists or doc.to_dict()["userId"] != current_user["uid"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
     updates = {k: v for k, v in body.dict().items() if v is not None}
+    if "summary" in updates:
+        updates["snippet"] = make_snippet(updates["summary"])
     updates["updatedAt"] = datetime.utcnow().isoformat()
-    ref.update(updates)
+    try:
+        await repository.update_note(note_id, updates)
+    except NotFound:
+        # Deleted since its owner was cached (e.g. by another worker)
+        acl_cache.invalidate("note", note_id)
+        raise HTTPException(status_code=403, detail="Access denied")
+    await search_index.update_note(note_id, updates)
+    if "title" in updates or "summary" in updates:
+        note = await repository.get_note(note_id)
+        if note:
+            embedding_store.add([note["userId"]], "note", note_id, f"{note['title']}\n{note['summary']}")
     return {"message": "Updated"}
 
 @router.delete("/{note_id}")
-async def delete_note(note_id: str, current_user: dict = Depends(get_current_user)):
-    ref = db.collection("notes").document(note_id)
-    doc = ref.get()
-    if not doc.exists or doc.to_dict()["userId"] != current_user["uid"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-    ref.delete()
+async def delete_note(
+    note_id: str,
+    _: None = Depends(note_owner),
+    current_user: dict = Depends(get_current_user)
+):
+    await repository.delete_note(note_id)
+    acl_cache.invalidate("note", note_id)
+    await search_index.delete_note(note_id)
+    await embedding_store.remove([current_user["uid"]], "note", note_id)
     return {"message": "Deleted"}
\ No newline at end of file
@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from app.middleware.auth import get_current_user
-from app.services.firebase import db
+from app.middleware.acl import reminder_owner
+from app.services import recurrence, repository
+from app.services.acl_cache import acl_cache
+from app.scheduler import dispatcher
+from app.services.coordination import shard_for
+from app.config import REMINDER_SHARDS
 from datetime import datetime
 import uuid
 
@@ -10,21 +15,19 @@ router = APIRouter(prefix="/reminders", tags=["reminders"])
 class ReminderRequest(BaseModel):
     title: str
     body: str = ""
-    schedule_type: str  # "once", "daily", "weekly", "yearly"
-    trigger_at: str     # ISO date string like "2025-06-15T09:00:00"
+    schedule_type: str  # "once", "daily", "weekly", "monthly", "yearly", "cron"
+    trigger_at: str     # ISO date string like "2025-06-15T09:00:00", local to `timezone` unless it has an offset
+    timezone: str | None = None  # IANA name; defaults to the user's profile time zone, then UTC
+    interval: int = 1   # Every N days/weeks/months/years
+    cron: str | None = None   # "30 9 * * 1-5" when schedule_type is "cron"
+    rrule: str | None = None  # "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR"; overrides schedule_type/interval
+    catch_up: str = "once"    # Missed occurrences: "once", "all" or "skip"
     source_conversation_id: str | None = None
 
 @router.get("/")
 async def list_reminders(current_user: dict = Depends(get_current_user)):
     """Get all reminders for the logged-in user."""
-    uid = current_user["uid"]
-    reminders = (
-        db.collection("reminders")
-        .where("userId", "==", uid)
-        .where("isActive", "==", True)
-        .get()
-    )
-    return [r.to_dict() for r in reminders]
+    return await repository.list_reminders(current_user["uid"])
 
 @router.post("/")
 async def create_reminder(
@@ -32,34 +35,39 @@ async def create_reminder(
     current_user: dict = Depends(get_current_user)
 ):
     """Create a new reminder."""
+    zone = body.timezone or (await repository.get_user(current_user["uid"]) or {}).get("timezone") or "UTC"
+    try:
+        schedule = recurrence.new_schedule(
+            body.schedule_type, body.trigger_at, zone,
+            interval=body.interval, cron=body.cron, rrule=body.rrule, catch_up=body.catch_up,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
     rem_id = str(uuid.uuid4())
     data = {
         "reminderId": rem_id,
         "userId": current_user["uid"],
         "title": body.title,
         "body": body.body,
-        "scheduleType": body.schedule_type,
-        "triggerAt": body.trigger_at,
+        **schedule,
         "isActive": True,
+        "shard": shard_for(current_user["uid"], REMINDER_SHARDS),
         "sourceConversationId": body.source_conversation_id,
         "createdAt": datetime.utcnow().isoformat(),
     }
-    db.collection("reminders").document(rem_id).set(data)
+    await repository.create_reminder(rem_id, data)
+    acl_cache.put("reminder", rem_id, [current_user["uid"]])
+    dispatcher.schedule(data)
     return data
 
 @router.delete("/{reminder_id}")
 async def delete_reminder(
     reminder_id: str,
-    current_user: dict = Depends(get_current_user)
+    _: None = Depends(reminder_owner)
 ):
     """Delete a reminder (only the owner can delete)."""
-    ref = db.collection("reminders").document(reminder_id)
-    doc = ref.get()
-
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="Reminder not found")
-    if doc.to_dict()["userId"] != current_user["uid"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-
-    ref.delete()
-    return {"message": "Deleted"}
\ No newline at end of file
+    await repository.delete_reminder(reminder_id)
+    acl_cache.invalidate("reminder", reminder_id)
+    dispatcher.cancel(reminder_id)
+    return {"message": "Deleted"}
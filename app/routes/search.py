@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Literal
+from app.middleware.auth import get_current_user
+from app.services.search_index import search_index
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+@router.get("")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Literal["note", "message"] | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Search the user's notes and chat messages. Every word must match, as a
+    prefix; results are ranked by relevance with the matches marked up.
+    """
+    return await search_index.search(current_user["uid"], q, kind=kind, limit=limit)
@@ -1,45 +1,312 @@
 # app/scheduler.py
-# Checks every minute for due reminders and sends notifications
+# Fires reminders at their exact trigger time.
+#
+# Reminders due within the look-ahead window are held in an in-memory
+# min-heap. A dispatcher thread sleeps until the earliest one is due, fires
+# everything that is due, and commits the rescheduling updates to Firestore
+# in batches. The window is topped up periodically with a range query on
+# triggerAtMs, and create/delete through the API update it immediately.
+# When the next trigger is computed, missed occurrences (e.g. after
+# downtime) are handled by the reminder's catch-up policy; see recurrence.py.
+#
+# When several workers run, reminders are split into shards by userId and
+# each worker only loads the shards it holds a lease on. Every occurrence
+# is claimed in a transaction before it fires, so it fires exactly once
+# even if two workers briefly believe they own the same shard.
 
+import heapq
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
-from app.services.firebase import db
+from firebase_admin import firestore
+from app.config import (
+    REMINDER_LEASE_SECONDS,
+    REMINDER_LOOKAHEAD_SECONDS,
+    REMINDER_REFRESH_SECONDS,
+    REMINDER_SHARDS,
+)
+from app.services import firebase, recurrence
+from app.services.coordination import LeaseManager
+from app.services.notification import notifications
 from datetime import datetime, timedelta
 
-def check_reminders():
-    """Find all due reminders and mark them triggered."""
-    now = datetime.utcnow().isoformat()
+BATCH_SIZE = 400  # Firestore allows at most 500 writes per batch/transaction
+RESYNC_EVERY = 10  # Every Nth refresh reloads the whole window
+CLAIM_RETRY_SECONDS = 5  # Pause after a failed claim before trying again
+IN_QUERY_LIMIT = 30  # Max values in a Firestore "in" filter
+CLOCK_SKEW = timedelta(seconds=60)  # Overlap when looking for newly created reminders
 
-    # Get all active reminders that are due
-    reminders = (
-        db.collection("reminders")
-        .where("isActive", "==", True)
-        .where("triggerAt", "<=", now)
-        .get()
-    )
 
-    for doc in reminders:
-        reminder = doc.to_dict()
+def utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def log_due(reminders: list[dict]):
+    for reminder in reminders:
         print(f"⏰ Reminder due: {reminder['title']} for user {reminder['userId']}")
 
-        # Calculate next trigger for recurring reminders
-        trigger = datetime.fromisoformat(reminder["triggerAt"])
-        schedule = reminder["scheduleType"]
-
-        if schedule == "daily":
-            next_trigger = (trigger + timedelta(days=1)).isoformat()
-            doc.reference.update({"triggerAt": next_trigger})
-        elif schedule == "weekly":
-            next_trigger = (trigger + timedelta(weeks=1)).isoformat()
-            doc.reference.update({"triggerAt": next_trigger})
-        elif schedule == "yearly":
-            next_trigger = trigger.replace(year=trigger.year + 1).isoformat()
-            doc.reference.update({"triggerAt": next_trigger})
+
+class ReminderDispatcher:
+    def __init__(self, lookahead: timedelta, clock=utcnow, on_due=log_due, leases: LeaseManager | None = None):
+        self.lookahead = lookahead
+        self.clock = clock
+        self.on_due = on_due
+        self.leases = leases
+        self._heap: list[tuple[datetime, str]] = []
+        self._entries: dict[str, tuple[datetime, dict]] = {}
+        self._window_end: datetime | None = None
+        self._last_refresh: datetime | None = None
+        self._cv = threading.Condition()
+        self._refresh_lock = threading.Lock()  # refresh() runs from both scheduler jobs
+        self._stopped = False
+        self._thread = None
+        self._refreshes = 0
+        self.fired = 0
+        self.lost_claims = 0
+
+    # ---------- Ownership ----------
+
+    def owns(self, reminder: dict) -> bool:
+        """Whether this worker currently holds the lease for the reminder's shard."""
+        return self.leases is None or self.leases.holds(reminder.get("shard", 0))
+
+    def rebalance(self):
+        """Called when the set of held shards changes: drop foreign entries and reload."""
+        with self._cv:
+            for reminder_id, (_, reminder) in list(self._entries.items()):
+                if not self.owns(reminder):
+                    del self._entries[reminder_id]
+            self._window_end = None
+        self.refresh()
+
+    # ---------- Window maintenance ----------
+
+    def _push(self, reminder: dict, when: datetime):
+        # Replacing an entry leaves its old heap item behind; _pop_due skips it
+        self._entries[reminder["reminderId"]] = (when, reminder)
+        heapq.heappush(self._heap, (when, reminder["reminderId"]))
+
+    def schedule(self, reminder: dict):
+        """Track a new or changed reminder if it falls inside the window and our shards."""
+        when = recurrence.trigger_time(reminder)
+        with self._cv:
+            if (self._window_end is None or when > self._window_end
+                    or not reminder.get("isActive", True) or not self.owns(reminder)):
+                self._entries.pop(reminder["reminderId"], None)
+                return
+            self._push(reminder, when)
+            self._cv.notify()
+
+    def cancel(self, reminder_id: str):
+        with self._cv:
+            self._entries.pop(reminder_id, None)
+
+    def _shard_queries(self, query):
+        """Restrict a query to the shards we hold. No leases means everything."""
+        if self.leases is None or self.leases.shards == 1:
+            return [query] if self.leases is None or self.leases.held else []
+        held = sorted(self.leases.held)
+        return [
+            query.where("shard", "in", held[i:i + IN_QUERY_LIMIT])
+            for i in range(0, len(held), IN_QUERY_LIMIT)
+        ]
+
+    def refresh(self):
+        """
+        Load reminders that have come into the window since the last refresh,
+        plus any created since then by other workers. Every RESYNC_EVERY
+        refreshes the whole window is reloaded instead, to pick up other
+        changes made outside this process and retry failed commits.
+        """
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        now = self.clock()
+        new_end = now + self.lookahead
+        active = firebase.db.collection("reminders").where("isActive", "==", True)
+        full = self._window_end is None or self._refreshes % RESYNC_EVERY == 0
+        self._refreshes += 1
+
+        window = active.where("triggerAtMs", "<=", recurrence.to_ms(new_end))
+        if full:
+            queries = self._shard_queries(window)
         else:
-            # "once" — deactivate after firing
-            doc.reference.update({"isActive": False})
+            queries = self._shard_queries(window.where("triggerAtMs", ">", recurrence.to_ms(self._window_end)))
+            created = (self._last_refresh - CLOCK_SKEW).isoformat()
+            queries += self._shard_queries(active.where("createdAt", ">", created))
+
+        docs = [doc for query in queries for doc in query.get()]
+        with self._cv:
+            for doc in docs:
+                reminder = doc.to_dict()
+                when = recurrence.trigger_time(reminder)
+                if when > new_end or not self.owns(reminder):
+                    continue
+                current = self._entries.get(reminder["reminderId"])
+                if current and current[0] > when:
+                    continue  # Already rescheduled here; Firestore hasn't caught up
+                self._push(reminder, when)
+            self._window_end = new_end
+            self._last_refresh = now
+            self._cv.notify()
+
+    def heartbeat(self):
+        """Renew shard leases; reload the window if ownership changed."""
+        if self.leases.heartbeat():
+            print(f"⏰ Reminder shards held by {self.leases.worker_id}: {sorted(self.leases.held)}")
+            self.rebalance()
+
+    # ---------- Firing ----------
+
+    def _pop_due(self, now: datetime) -> list[dict]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, reminder_id = heapq.heappop(self._heap)
+            entry = self._entries.get(reminder_id)
+            if entry is None or entry[0] != when:
+                continue  # Cancelled or rescheduled since it was pushed
+            del self._entries[reminder_id]
+            due.append(entry[1])
+        return due
+
+    def run_due(self, now: datetime | None = None) -> int:
+        """Claim and fire everything due at `now`. Returns the number of occurrences fired."""
+        now = now or self.clock()
+        with self._cv:
+            due = [reminder for reminder in self._pop_due(now) if self.owns(reminder)]
+        if not due:
+            return 0
+
+        fired = 0
+        for i in range(0, len(due), BATCH_SIZE):
+            try:
+                claimed = self._claim(due[i:i + BATCH_SIZE], now)
+            except Exception:
+                # The transaction didn't commit, so nothing from here on was claimed
+                self._requeue(due[i:])
+                raise
+            occurrences = []
+            for reminder, fires, following in claimed:
+                occurrences += [{**reminder, "occurrenceAt": when.isoformat()} for when in fires]
+                if following is not None:
+                    self.schedule({**reminder, **recurrence.trigger_fields(following)})
+            if occurrences:
+                self.on_due(occurrences)
+            fired += len(occurrences)
+
+        self.fired += fired
+        return fired
+
+    def _requeue(self, reminders: list[dict]):
+        """Put popped reminders back on the heap unless they were rescheduled meanwhile."""
+        with self._cv:
+            for reminder in reminders:
+                if reminder["reminderId"] not in self._entries:
+                    self._push(reminder, recurrence.trigger_time(reminder))
+
+    def _claim(self, due: list[dict], now: datetime) -> list[tuple[dict, list[datetime], datetime | None]]:
+        """
+        Atomically move each due reminder on to its next trigger (or deactivate
+        it) and return (reminder, occurrences to fire, next trigger) for the
+        ones this worker claimed. A reminder that was already moved on,
+        deactivated or deleted elsewhere is skipped, so each occurrence fires once.
+        """
+        collection = firebase.db.collection("reminders")
+        refs = [collection.document(reminder["reminderId"]) for reminder in due]
+        expected = {reminder["reminderId"]: reminder for reminder in due}
+
+        @firestore.transactional
+        def _apply(transaction):
+            claimed = []
+            for snapshot in firebase.db.get_all(refs, transaction=transaction):
+                if not snapshot.exists:
+                    continue
+                stored = snapshot.to_dict()
+                reminder = expected[snapshot.id]
+                if not stored.get("isActive") or recurrence.trigger_time(stored) != recurrence.trigger_time(reminder):
+                    continue
+                fires, following = recurrence.plan(reminder, now)
+                if following is None:
+                    transaction.update(snapshot.reference, {"isActive": False})
+                else:
+                    transaction.update(snapshot.reference, recurrence.trigger_fields(following))
+                claimed.append((reminder, fires, following))
+            return claimed
+
+        claimed = _apply(firebase.db.transaction())
+        self.lost_claims += len(due) - len(claimed)
+        return claimed
+
+    def _run(self):
+        while True:
+            with self._cv:
+                if self._stopped:
+                    return
+                timeout = self.lookahead.total_seconds()
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - self.clock()).total_seconds())
+                if timeout > 0:
+                    self._cv.wait(timeout)
+                    continue
+            try:
+                self.run_due()
+            except Exception as exc:
+                print(f"⏰ Reminder dispatch failed: {exc}")
+                # Requeued reminders are already due; don't retry in a tight loop
+                with self._cv:
+                    if not self._stopped:
+                        self._cv.wait(CLAIM_RETRY_SECONDS)
+
+    def start(self):
+        if self.leases is not None:
+            self.leases.heartbeat()
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="reminder-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._entries),
+            "fired": self.fired,
+            "lostClaims": self.lost_claims,
+            "refreshes": self._refreshes,
+            "shardsHeld": len(self.leases.held) if self.leases is not None else 0,
+        }
+
+    def stop(self):
+        with self._cv:
+            self._stopped = True
+            self._cv.notify()
+        if self.leases is not None:
+            self.leases.release_all()
+
+
+dispatcher = ReminderDispatcher(
+    lookahead=timedelta(seconds=REMINDER_LOOKAHEAD_SECONDS),
+    on_due=notifications.submit,
+    leases=LeaseManager("reminders", shards=REMINDER_SHARDS, ttl=REMINDER_LEASE_SECONDS),
+)
+
+
+_scheduler: BackgroundScheduler | None = None
+
 
 def start_scheduler():
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(check_reminders, 'interval', minutes=1)
-    scheduler.start()
-    print("⏰ Reminder scheduler started")
\ No newline at end of file
+    """Start the dispatcher and its periodic jobs. Blocking: makes Firestore round trips."""
+    global _scheduler
+    dispatcher.start()
+    _scheduler = BackgroundScheduler()
+    _scheduler.add_job(dispatcher.refresh, 'interval', seconds=max(1, min(REMINDER_REFRESH_SECONDS, REMINDER_LOOKAHEAD_SECONDS // 2)))
+    # Renew well inside the lease so a slow heartbeat doesn't lose the shards
+    _scheduler.add_job(dispatcher.heartbeat, 'interval', seconds=max(1, REMINDER_LEASE_SECONDS // 3))
+    _scheduler.start()
+    print(f"⏰ Reminder scheduler started ({dispatcher.leases.worker_id}, shards {sorted(dispatcher.leases.held)})")
+
+
+def stop_scheduler():
+    """Stop the periodic jobs and hand this worker's shards back."""
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+    dispatcher.stop()
@@ -0,0 +1,87 @@
+# app/services/acl_cache.py
+# Cache of who may access what: conversation participants and the owners
+# of notes and reminders.
+#
+# Membership rarely changes, so caching it lets routes authorize without
+# reading the whole document on every request. Entries are bounded, expire
+# after a TTL, and are invalidated by writes made through this service.
+
+import threading
+import time
+from collections import OrderedDict
+from app.config import ACL_CACHE_SIZE, ACL_CACHE_TTL
+from app.services import repository
+
+
+class ACLCache:
+    def __init__(self, max_size: int = 50_000, ttl: float = 300, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[tuple[str, str], tuple[float, frozenset]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    def _count(self, endpoint: str, outcome: str):
+        counts = self._stats.setdefault(endpoint, {"readsSaved": 0, "reads": 0})
+        counts[outcome] += 1
+
+    def get(self, kind: str, resource_id: str) -> frozenset | None:
+        key = (kind, resource_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, members = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return members
+
+    def put(self, kind: str, resource_id: str, members) -> frozenset:
+        members = frozenset(members)
+        if self.max_size <= 0:
+            return members
+        with self._lock:
+            self._entries[(kind, resource_id)] = (self.clock() + self.ttl, members)
+            self._entries.move_to_end((kind, resource_id))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return members
+
+    def invalidate(self, kind: str, resource_id: str):
+        with self._lock:
+            self._entries.pop((kind, resource_id), None)
+
+    async def _load(self, kind: str, resource_id: str, endpoint: str, loader) -> frozenset | None:
+        members = self.get(kind, resource_id)
+        if members is not None:
+            self._count(endpoint, "readsSaved")
+            return members
+
+        self._count(endpoint, "reads")
+        doc = await loader(resource_id)
+        if doc is None:
+            return None
+        if kind == "conversation":
+            return self.put(kind, resource_id, doc.get("participants", []))
+        return self.put(kind, resource_id, [doc["userId"]])
+
+    async def conversation_members(self, conv_id: str, endpoint: str) -> frozenset | None:
+        """Participants of a conversation, or None if it doesn't exist."""
+        return await self._load("conversation", conv_id, endpoint, repository.get_conversation)
+
+    async def note_owners(self, note_id: str, endpoint: str) -> frozenset | None:
+        return await self._load("note", note_id, endpoint, repository.get_note)
+
+    async def reminder_owners(self, reminder_id: str, endpoint: str) -> frozenset | None:
+        return await self._load("reminder", reminder_id, endpoint, repository.get_reminder)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {"size": size, "endpoints": {k: dict(v) for k, v in self._stats.items()}}
+
+
+acl_cache = ACLCache(max_size=ACL_CACHE_SIZE, ttl=ACL_CACHE_TTL)
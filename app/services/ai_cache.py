@@ -0,0 +1,271 @@
+# app/services/ai_cache.py
+# Content-addressed cache for AI completions.
+#
+# Keys are a hash of the full upstream request (model, prompt template,
+# parameters and the normalized message window), so two requests share an
+# entry only if the model would have been sent exactly the same thing.
+# The SQLite backend opens its connection per process, in the app lifespan
+# or on first use; nothing is opened at import.
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from app.config import (
+    AI_CACHE_BACKEND,
+    AI_CACHE_SIZE,
+    AI_CACHE_TTL,
+    AI_CACHE_PATH,
+    AI_CACHE_NONDETERMINISTIC,
+)
+
+
+class MemoryBackend:
+    """In-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_size: int = 5000, clock=time.time):
+        self.max_size = max_size
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._entries[key] = (self.clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class SQLiteBackend:
+    """On-disk cache that survives restarts and is shared by workers on one host."""
+
+    _PRUNE_EVERY = 500
+
+    def __init__(self, path: str, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = None
+        os.register_at_fork(after_in_child=self._forget)
+
+    def _db(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def open(self):
+        """Open this process's connection now rather than on first use."""
+        with self._lock:
+            self._db()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _forget(self):
+        # A connection (or a held lock) inherited across fork() must not be used by the child
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT value FROM ai_cache WHERE key = ? AND expires_at > ?",
+                (key, self.clock()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str, ttl: float):
+        now = self.clock()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl),
+            )
+            self._writes += 1
+            if self._writes % self._PRUNE_EVERY == 0:
+                db.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (now,))
+            db.commit()
+
+    async def get(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+
+class _Flight:
+    """One upstream call shared by every identical request waiting on it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.waiters = 0
+
+
+class AICache:
+    """
+    Cache in front of the AI service with single-flight coalescing.
+
+    Calls with temperature > 0 are non-deterministic, so they are only
+    cached when `cache_nondeterministic` is switched on.
+    """
+
+    def __init__(self, backend, ttl: float = 3600, cache_nondeterministic: bool = False):
+        self.backend = backend
+        self.ttl = ttl
+        self.cache_nondeterministic = cache_nondeterministic
+        self._inflight: dict[str, _Flight] = {}
+        self._stats: dict[str, dict] = {}
+
+    def open(self):
+        """Open the backend's connection now, for backends that hold one."""
+        if hasattr(self.backend, "open"):
+            self.backend.open()
+
+    def close(self):
+        if hasattr(self.backend, "close"):
+            self.backend.close()
+
+    @staticmethod
+    def key(request: dict) -> str:
+        payload = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _count(self, endpoint: str, outcome: str):
+        counts = self._stats.setdefault(
+            endpoint, {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0}
+        )
+        counts[outcome] += 1
+
+    def cacheable(self, request: dict) -> bool:
+        if self.backend is None:
+            return False
+        return request.get("temperature", 1.0) == 0 or self.cache_nondeterministic
+
+    async def lookup(self, endpoint: str, request: dict):
+        """Return the cached result for `request`, or None (counts as a miss)."""
+        if not self.cacheable(request):
+            self._count(endpoint, "bypassed")
+            return None
+        value = await self.backend.get(self.key(request))
+        self._count(endpoint, "hits" if value is not None else "misses")
+        return json.loads(value) if value is not None else None
+
+    async def _save(self, key: str, result):
+        try:
+            await self.backend.set(key, json.dumps(result), self.ttl)
+        except Exception as exc:
+            # The result is still good; it just won't be reused
+            print(f"AI cache write failed: {exc}")
+
+    async def store(self, endpoint: str, request: dict, result):
+        if self.cacheable(request):
+            await self._save(self.key(request), result)
+
+    async def get_or_compute(self, endpoint: str, request: dict, producer):
+        """
+        Return the cached result for `request`, calling `producer()` on a miss.
+        Concurrent identical requests wait on the same upstream call.
+        """
+        if not self.cacheable(request):
+            self._count(endpoint, "bypassed")
+            return await producer()
+
+        key = self.key(request)
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self._count(endpoint, "coalesced")
+            return await self._join(key, flight)
+
+        value = await self.backend.get(key)
+        if value is not None:
+            self._count(endpoint, "hits")
+            return json.loads(value)
+
+        # Re-check: another request may have started while we hit the backend
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self._count(endpoint, "coalesced")
+            return await self._join(key, flight)
+
+        self._count(endpoint, "misses")
+        flight = _Flight()
+        self._inflight[key] = flight
+        flight.task = asyncio.ensure_future(self._compute(key, flight, producer))
+        return await self._join(key, flight)
+
+    async def _compute(self, key: str, flight: "_Flight", producer):
+        try:
+            result = await producer()
+            await self._save(key, result)
+            return result
+        finally:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+
+    async def _join(self, key: str, flight: "_Flight"):
+        # The upstream call runs in its own task, so a caller that goes away
+        # (client disconnect) doesn't cancel it for everyone else waiting
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody wants the answer any more; later callers start afresh
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                flight.task.cancel()
+
+    def stats(self) -> dict:
+        result = {}
+        for endpoint, counts in self._stats.items():
+            lookups = counts["hits"] + counts["misses"] + counts["coalesced"]
+            result[endpoint] = {
+                **counts,
+                "hitRate": (counts["hits"] + counts["coalesced"]) / lookups if lookups else 0.0,
+            }
+        return result
+
+
+def _make_backend():
+    if AI_CACHE_BACKEND == "sqlite":
+        return SQLiteBackend(AI_CACHE_PATH)
+    if AI_CACHE_BACKEND == "memory":
+        return MemoryBackend(max_size=AI_CACHE_SIZE)
+    return None  # "none" disables caching
+
+
+ai_cache = AICache(
+    _make_backend(),
+    ttl=AI_CACHE_TTL,
+    cache_nondeterministic=AI_CACHE_NONDETERMINISTIC,
+)
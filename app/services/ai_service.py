@@ -1,21 +1,276 @@
-from openai import OpenAI
-from app.config import OPENAI_API_KEY
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+import httpx
+from app.config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_TIMEOUT,
+    OPENAI_MAX_RETRIES,
+    OPENAI_MAX_CONNECTIONS,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_WAITING,
+)
+from app.services import metrics
+from app.services.ai_cache import ai_cache
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+MODEL = "gpt-4o-mini"
 
-def suggest_reply(messages: list[dict]) -> str:
+# One pooled client per process, created on first use rather than at import:
+# the openai package is the slowest import we have, and a forked worker must
+# not inherit its parent's connections. Retries are handled below (with
+# jitter), so the SDK's own retry loop is switched off.
+_client = None
+_client_lock = threading.Lock()
+_RETRYABLE: tuple = ()
+
+
+def get_client():
+    global _client, _RETRYABLE
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import (
+                    AsyncOpenAI,
+                    DefaultAsyncHttpxClient,
+                    APIConnectionError,
+                    RateLimitError,
+                    InternalServerError,
+                )
+                # Connection errors include timeouts
+                _RETRYABLE = (APIConnectionError, RateLimitError, InternalServerError)
+                _client = AsyncOpenAI(
+                    api_key=OPENAI_API_KEY,
+                    base_url=OPENAI_BASE_URL,
+                    timeout=OPENAI_TIMEOUT,
+                    max_retries=0,
+                    http_client=DefaultAsyncHttpxClient(
+                        limits=httpx.Limits(
+                            max_connections=OPENAI_MAX_CONNECTIONS,
+                            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                        ),
+                    ),
+                )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _forget_client():
+    global _client
+    _client = None
+
+
+os.register_at_fork(after_in_child=_forget_client)
+
+_RETRY_BASE_DELAY = 0.5
+_RETRY_MAX_DELAY = 8.0
+
+
+async def _with_retries(call):
+    """Run `call` with exponential backoff and full jitter on transient errors."""
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        try:
+            return await call()
+        except _RETRYABLE:
+            if attempt == OPENAI_MAX_RETRIES:
+                raise
+            delay = min(_RETRY_MAX_DELAY, _RETRY_BASE_DELAY * 2 ** attempt)
+            await asyncio.sleep(random.uniform(0, delay))
+
+
+# Upstream call priorities: lower numbers get free slots first
+INTERACTIVE = 0  # A user is waiting on a short reply (suggest, ask)
+STANDARD = 1     # Summaries, single extractions
+BACKGROUND = 2   # Batch jobs
+
+
+class LLMOverloaded(Exception):
+    """Too many calls are already waiting for an upstream slot."""
+
+
+class LLMGovernor:
     """
-    Given the last few chat messages, suggest a helpful reply.
-    messages = [{"sender": "me", "text": "..."}, ...]
+    Caps concurrent upstream calls per worker. When all slots are busy,
+    callers queue and are let in by priority, then arrival order.
     """
-    
+
+    def __init__(self, limit: int, max_waiting: int):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._stats = {"queued": 0, "rejected": 0, "waitSeconds": 0.0}
+
+    async def acquire(self, priority: int):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_waiting:
+            self._stats["rejected"] += 1
+            raise LLMOverloaded()
+
+        entry = (priority, next(self._order), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, entry)
+        self._stats["queued"] += 1
+        started = time.monotonic()
+        try:
+            await entry[2]  # Resolved by release(), which hands over its slot
+        except asyncio.CancelledError:
+            if entry[2].done() and not entry[2].cancelled():
+                self.release()  # Got the slot just as we were cancelled
+            elif entry in self._waiters:
+                # release() may already have popped (and skipped) our cancelled entry
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+        finally:
+            self._stats["waitSeconds"] += time.monotonic() - started
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = STANDARD):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {**self._stats, "active": self.active, "waiting": len(self._waiters), "limit": self.limit}
+
+
+governor = LLMGovernor(LLM_MAX_CONCURRENCY, LLM_MAX_WAITING)
+
+
+@asynccontextmanager
+async def _upstream(kind: str, model: str):
+    """Time one upstream call and count it if it fails."""
+    try:
+        with metrics.timed(metrics.LLM_SECONDS, kind, model):
+            yield
+    except Exception:
+        metrics.LLM_ERRORS.inc(1, kind, model)
+        raise
+
+
+# Upstream tokens spent by the current request, while track_usage() is counting
+_usage: ContextVar[list[int] | None] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_usage():
+    """
+    Count the upstream tokens spent inside the block, including by tasks it
+    starts; yields a one-item list holding the total. Cache hits cost nothing.
+    """
+    counter = [0]
+    token = _usage.set(counter)
+    try:
+        yield counter
+    finally:
+        _usage.reset(token)
+
+
+def _record_usage(model: str, usage):
+    metrics.record_usage(model, usage)
+    counter = _usage.get()
+    if counter is not None and usage is not None:
+        counter[0] += (usage.prompt_tokens or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+
+
+async def _complete(priority: int = STANDARD, **kwargs) -> str:
+    async def call():
+        # Slots are held per attempt, not across retry backoff
+        async with governor.slot(priority), _upstream("chat", kwargs["model"]):
+            return await get_client().chat.completions.create(**kwargs)
+
+    response = await _with_retries(call)
+    _record_usage(kwargs["model"], response.usage)
+    return response.choices[0].message.content.strip()
+
+
+async def _stream(priority: int = STANDARD, **kwargs):
+    """Yield content deltas as they arrive. Only opening the stream is retried."""
+    async def open_stream():
+        # Like _complete, a slot is taken per attempt and not held across backoff;
+        # the one from the attempt that succeeds is kept while the stream is read
+        await governor.acquire(priority)
+        try:
+            return await get_client().chat.completions.create(
+                stream=True, stream_options={"include_usage": True}, **kwargs
+            )
+        except BaseException:
+            governor.release()
+            raise
+
+    async with _upstream("stream", kwargs["model"]):
+        stream = await _with_retries(open_stream)
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    _record_usage(kwargs["model"], chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            governor.release()
+            await stream.close()  # Frees the connection if the reader stopped early
+
+
+async def _cached_stream(endpoint: str, request: dict, priority: int = STANDARD):
+    """Stream a completion, serving it from the cache when possible."""
+    cached = await ai_cache.lookup(endpoint, request)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async for chunk in _stream(priority, **request):
+        parts.append(chunk)
+        yield chunk
+    await ai_cache.store(endpoint, request, "".join(parts).strip())
+
+
+def _normalize(text: str) -> str:
+    # Whitespace differences shouldn't produce different cache keys
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _context_block(snippets: list[str]) -> str:
+    return "\n".join(f"[{i + 1}] {_normalize(s)}" for i, s in enumerate(snippets))
+
+
+def _suggest_prompt(messages: list[dict], context: list[str] = ()) -> dict:
     conversation = "\n".join(
-        f"{'Me' if m['isOwn'] else 'Them'}: {m['text']}"
+        f"{'Me' if m['isOwn'] else 'Them'}: {_normalize(m['text'])}"
         for m in messages[-6:]  # Only last 6 messages for context
     )
-
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",  
+    if context:
+        # Older messages and notes retrieved by similarity to the conversation
+        conversation = f"Possibly relevant notes and earlier messages:\n{_context_block(context)}\n\n{conversation}"
+    return dict(
+        model=MODEL,
         messages=[
             {
                 "role": "system",
@@ -33,17 +288,12 @@ def suggest_reply(messages: list[dict]) -> str:
         max_tokens=100,
         temperature=0.7,  # Slightly creative but not random
     )
-    return response.choices[0].message.content.strip()
 
 
-def summarize_conversation(messages: list[dict]) -> str:
-    """
-    Summarize a list of chat messages into key bullet points.
-    """
-    text = "\n".join(f"{m['senderId']}: {m['text']}" for m in messages)
-
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
+def _summarize_prompt(messages: list[dict]) -> dict:
+    text = "\n".join(f"{m['senderId']}: {_normalize(m['text'])}" for m in messages)
+    return dict(
+        model=MODEL,
         messages=[
             {
                 "role": "system",
@@ -52,34 +302,194 @@ def summarize_conversation(messages: list[dict]) -> str:
             {"role": "user", "content": text}
         ],
         max_tokens=300,
+        temperature=0,  # Deterministic, so summaries can be cached
     )
-    return response.choices[0].message.content.strip()
 
 
-def extract_tasks(text: str) -> list[dict]:
+def _merge_prompt(summaries: list[str]) -> dict:
+    text = "\n\n".join(f"Part {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+    return dict(
+        model=MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "These are summaries of consecutive parts of one conversation, oldest first. "
+                    "Combine them into a single summary of 3-5 clear bullet points, "
+                    "keeping the most important and most recent points."
+                )
+            },
+            {"role": "user", "content": text}
+        ],
+        max_tokens=300,
+        temperature=0,
+    )
+
+
+async def suggest_reply(messages: list[dict], context: list[str] = ()) -> str:
     """
-    Extract tasks or reminders from a message.
-    Returns a list like: [{"task": "Call dentist", "date": "2025-03-15", "repeat": "none"}]
+    Given the last few chat messages, suggest a helpful reply.
+    messages = [{"isOwn": bool, "text": "..."}, ...]
+    context = relevant snippets from the user's notes and older messages
+    """
+    request = _suggest_prompt(messages, context)
+    return await ai_cache.get_or_compute("suggest", request, lambda: _complete(INTERACTIVE, **request))
+
+
+def stream_suggest_reply(messages: list[dict], context: list[str] = ()):
+    """Same as suggest_reply, but yields the reply token by token."""
+    return _cached_stream("suggest", _suggest_prompt(messages, context), INTERACTIVE)
+
+
+async def summarize_conversation(messages: list[dict]) -> str:
+    """
+    Summarize a list of chat messages into key bullet points.
+    """
+    request = _summarize_prompt(messages)
+    return await ai_cache.get_or_compute("summarize", request, lambda: _complete(**request))
+
+
+def stream_summarize_conversation(messages: list[dict]):
+    """Same as summarize_conversation, but yields the summary token by token."""
+    return _cached_stream("summarize", _summarize_prompt(messages))
+
+
+async def merge_summaries(summaries: list[str]) -> str:
+    """
+    Fold several partial summaries (oldest first) into one.
     """
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
+    request = _merge_prompt(summaries)
+    return await ai_cache.get_or_compute("summarize", request, lambda: _complete(**request))
+
+
+def _ask_prompt(question: str, sources: list[str]) -> dict:
+    return dict(
+        model=MODEL,
         messages=[
             {
                 "role": "system",
                 "content": (
-                    "Extract any tasks, deadlines, or reminders from the text. "
-                    "Return a JSON array of objects with keys: task, date (YYYY-MM-DD or null), repeat (none/daily/weekly/yearly). "
-                    "If no tasks found, return empty array []. "
-                    "Return ONLY the JSON array, no other text."
+                    "Answer the user's question using only their notes and messages below. "
+                    "Cite the snippets you used like [1]. If they don't contain the answer, say so briefly."
                 )
             },
-            {"role": "user", "content": text}
+            {"role": "user", "content": f"{_context_block(sources)}\n\nQuestion: {_normalize(question)}"}
+        ],
+        max_tokens=300,
+        temperature=0,
+    )
+
+
+async def answer_question(question: str, sources: list[str]) -> str:
+    """Answer a question from retrieved snippets of the user's own data."""
+    request = _ask_prompt(question, sources)
+    return await ai_cache.get_or_compute("ask", request, lambda: _complete(INTERACTIVE, **request))
+
+
+def stream_answer_question(question: str, sources: list[str]):
+    return _cached_stream("ask", _ask_prompt(question, sources), INTERACTIVE)
+
+
+async def embed_texts(texts: list[str], model: str) -> list[list[float]]:
+    """Embedding vectors for `texts`, in order, from one API call."""
+    async def call():
+        async with _upstream("embeddings", model):
+            return await get_client().embeddings.create(model=model, input=texts)
+
+    response = await _with_retries(call)
+    _record_usage(model, response.usage)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+# Structured output for task extraction. Each input item is echoed back by
+# id, so many messages can share one call and still be matched up.
+_TASKS_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "task_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "tasks": {
+                                "type": "array",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "task": {"type": "string"},
+                                        "date": {"type": ["string", "null"]},
+                                        "repeat": {"type": "string", "enum": ["none", "daily", "weekly", "monthly", "yearly"]},
+                                    },
+                                    "required": ["task", "date", "repeat"],
+                                    "additionalProperties": False,
+                                },
+                            },
+                        },
+                        "required": ["id", "tasks"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+_TASK_TOKENS_PER_ITEM = 80  # Output budget per message in a batched call
+
+
+def _extract_tasks_prompt(items: list[tuple[str, str]], today: str | None = None) -> dict:
+    system = (
+        "Extract any tasks, deadlines, or reminders from each message. "
+        "Return one result per message id, with tasks as objects with keys: "
+        "task, date (YYYY-MM-DD or null), repeat (none/daily/weekly/monthly/yearly). "
+        "Use an empty tasks list for messages without any."
+    )
+    if today:
+        system += f" Today is {today}; resolve relative dates against it."
+    payload = [{"id": item_id, "text": _normalize(text)} for item_id, text in items]
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
         ],
-        max_tokens=200,
+        response_format=_TASKS_SCHEMA,
+        max_tokens=min(4096, 100 + _TASK_TOKENS_PER_ITEM * len(items)),
+        temperature=0,
     )
 
-    import json
+
+async def extract_tasks_batch(
+    items: list[tuple[str, str]], today: str | None = None, priority: int = BACKGROUND
+) -> dict[str, list[dict]]:
+    """
+    Extract tasks from many (id, text) messages in one call.
+    Returns {id: [{"task": ..., "date": ..., "repeat": ...}]}. Ids the model
+    left out are missing from the result; an unreadable reply raises ValueError.
+    """
+    content = await _complete(priority, **_extract_tasks_prompt(items, today))
     try:
-        return json.loads(response.choices[0].message.content.strip())
-    except json.JSONDecodeError:
-        return []  # Return empty list if parsing fails
\ No newline at end of file
+        results = json.loads(content)["results"]
+        wanted = {item_id for item_id, _ in items}
+        return {r["id"]: list(r["tasks"]) for r in results if r["id"] in wanted}
+    except (json.JSONDecodeError, KeyError, TypeError) as exc:
+        raise ValueError(f"Unreadable task extraction response: {exc}") from exc
+
+
+async def extract_tasks(text: str, today: str | None = None) -> list[dict]:
+    """
+    Extract tasks or reminders from a message.
+    Returns a list like: [{"task": "Call dentist", "date": "2025-03-15", "repeat": "none"}]
+    """
+    results = await extract_tasks_batch([("0", text)], today, STANDARD)
+    if "0" not in results:
+        raise ValueError("Task extraction response is missing the message")
+    return results["0"]
@@ -0,0 +1,303 @@
+# app/services/archive.py
+# Cold storage for old messages and inactive reminders.
+#
+# scripts/archive_cold_data.py streams messages older than ARCHIVE_AFTER_DAYS
+# out of Firestore into gzip JSONL segments, a page at a time, and deletes
+# them once the segment is written. Each message segment is recorded in
+# conversations/{id}/archive with its time range, and the conversation's
+# `archivedThroughAt` / `archivedThroughId` say how far the archive reaches
+# (messages are ordered by timestamp, then ID), so messages_before /
+# messages_after can page from live Firestore into the archive without
+# clients noticing. Inactive reminders go to per-user segments, kept for
+# exports.
+
+import asyncio
+import functools
+import gzip
+import importlib
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator
+from app.config import ARCHIVE_AFTER_DAYS, ARCHIVE_PATH, ARCHIVE_SEGMENT_SIZE, ARCHIVE_STORE
+from app.services import firebase, recurrence, repository
+from app.services.repository import BATCH_SIZE
+
+PAGE_SIZE = 500
+SEGMENT_CACHE = 16  # Decoded message segments kept for paging back through the archive
+
+
+class LocalStore:
+    """Segment files under a directory (local disk or a mounted bucket)."""
+
+    def __init__(self, root: str = ARCHIVE_PATH):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def write(self, key: str, records: Iterable[dict]) -> int:
+        """Stream records into a new segment and return how many were written."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        count = 0
+        # Written aside and renamed, and synced before the caller deletes the originals
+        with open(f"{path}.tmp", "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                for record in records:
+                    f.write((json.dumps(record, separators=(",", ":"), default=str) + "\n").encode())
+                    count += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(f"{path}.tmp", path)
+        return count
+
+    def read(self, key: str) -> Iterator[dict]:
+        with gzip.open(self._path(key), "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def list(self, prefix: str) -> list[str]:
+        directory = self._path(prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f"{prefix.rstrip('/')}/{name}" for name in os.listdir(directory) if name.endswith(".jsonl.gz"))
+
+
+def _make_store():
+    # ARCHIVE_STORE is "module:ClassName" for a store with the same methods (e.g. GCS)
+    if not ARCHIVE_STORE:
+        return LocalStore()
+    module_name, _, class_name = ARCHIVE_STORE.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+archive_store = _make_store()
+
+
+def _segment_key(kind: str, owner: str, first_at: str) -> str:
+    # Sortable by the segment's first timestamp; the suffix keeps reruns from colliding
+    stamp = "".join(c for c in first_at if c.isdigit())
+    return f"{kind}/{owner}/{stamp}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+
+
+def horizon() -> str:
+    """Nothing newer than this is ever archived."""
+    return (datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+
+
+# ---------- Reading ----------
+
+@functools.lru_cache(maxsize=SEGMENT_CACHE)
+def _read_segment(key: str) -> tuple[dict, ...]:
+    # Segments never change once written, so decoded ones can be shared
+    return tuple(archive_store.read(key))
+
+
+def _older(message: dict, position: tuple[str, str | None]) -> bool:
+    """Whether `message` sorts before a (timestamp, messageId) position, as Firestore orders them."""
+    timestamp, message_id = position
+    if message["timestamp"] != timestamp:
+        return message["timestamp"] < timestamp
+    return message_id is not None and message["messageId"] < message_id
+
+
+def _newer(message: dict, position: tuple[str, str | None]) -> bool:
+    timestamp, message_id = position
+    if message["timestamp"] != timestamp:
+        return message["timestamp"] > timestamp
+    return message_id is not None and message["messageId"] > message_id
+
+
+def _at(message: dict) -> tuple[str, str]:
+    return message["timestamp"], message["messageId"]
+
+
+async def _archived_before(conv_id: str, count: int, before: tuple[str, str | None] | None) -> list[dict]:
+    """The newest `count` archived messages older than `before`, oldest first."""
+    segments = await repository.list_archive_segments(conv_id)
+    found: list[dict] = []
+    for segment in reversed(segments):
+        if before and segment["firstAt"] > before[0]:
+            continue
+        messages = await asyncio.to_thread(_read_segment, segment["key"])
+        found = [m for m in messages if not before or _older(m, before)] + found
+        if len(found) >= count:
+            break
+    return found[-count:]
+
+
+async def _archived_after(conv_id: str, count: int, after: tuple[str, str | None] | None) -> list[dict]:
+    """The oldest `count` archived messages newer than `after`."""
+    segments = await repository.list_archive_segments(conv_id)
+    found: list[dict] = []
+    for segment in segments:
+        if after and segment["lastAt"] < after[0]:
+            continue
+        messages = await asyncio.to_thread(_read_segment, segment["key"])
+        found += [m for m in messages if not after or _newer(m, after)]
+        if len(found) >= count:
+            break
+    return found[:count]
+
+
+async def messages_before(conv_id: str, limit: int, before: tuple[str, str | None] | None = None) -> list[dict]:
+    """repository.list_messages, continuing into the archive past the oldest live message."""
+    messages = await repository.list_messages(conv_id, limit, before=before)
+    if len(messages) == limit:
+        return messages
+    # A short page reached the start of what's live; older messages may be archived
+    if not await repository.get_archive_boundary(conv_id):
+        return messages
+    oldest = _at(messages[0]) if messages else before
+    return await _archived_before(conv_id, limit - len(messages), oldest) + messages
+
+
+async def messages_after(conv_id: str, after: tuple[str, str | None] | None, limit: int) -> list[dict]:
+    """repository.list_messages_after, starting in the archive when `after` is older than the live window."""
+    if after and after[0] >= horizon():
+        return await repository.list_messages_after(conv_id, after, limit)
+    boundary = await repository.get_archive_boundary(conv_id)
+    if not boundary or (after and after[0] > boundary):
+        return await repository.list_messages_after(conv_id, after, limit)
+
+    archived = await _archived_after(conv_id, limit, after)
+    if len(archived) == limit:
+        return archived
+    live = await repository.list_messages_after(conv_id, _at(archived[-1]) if archived else after, limit - len(archived))
+    # Skip any left in Firestore by an interrupted archival run
+    seen = {m["messageId"] for m in archived}
+    return archived + [m for m in live if m["messageId"] not in seen]
+
+
+# ---------- Archival (blocking; run from scripts/archive_cold_data.py) ----------
+
+def _page(query, after, limit: int = PAGE_SIZE) -> list:
+    return (query.start_after(after) if after is not None else query).limit(limit).get()
+
+
+def _delete(refs: list):
+    for i in range(0, len(refs), BATCH_SIZE):
+        batch = firebase.db.batch()
+        for ref in refs[i:i + BATCH_SIZE]:
+            batch.delete(ref)
+        batch.commit()
+
+
+def _archived_through(conv_ref) -> tuple[str, str] | None:
+    """(timestamp, messageId) of the newest archived message, if any were archived."""
+    conv = conv_ref.get(field_paths=["archivedThroughAt", "archivedThroughId"]).to_dict() or {}
+    if not conv.get("archivedThroughAt"):
+        return None
+    if conv.get("archivedThroughId"):
+        return conv["archivedThroughAt"], conv["archivedThroughId"]
+    # Archived before the ID was recorded: the newest segment ends with it
+    [segment] = conv_ref.collection("archive").order_by("lastAt").limit_to_last(1).get()
+    *_, last = archive_store.read(segment.get("key"))
+    return last["timestamp"], last["messageId"]
+
+
+def archive_conversation(conv_ref, cutoff: str, dry_run: bool = False) -> int:
+    """Move a conversation's messages older than `cutoff` into segments. Returns how many."""
+    boundary = _archived_through(conv_ref)
+    # Timestamps can tie, so positions are (timestamp, document ID) throughout
+    messages = conv_ref.collection("messages").order_by("timestamp").order_by("__name__")
+    position = boundary and {"timestamp": boundary[0], "__name__": boundary[1]}
+    if boundary and not dry_run:
+        # Left behind by an interrupted run after their segment was recorded; a
+        # message sharing the boundary's timestamp but past it was never archived
+        _delete([doc.reference for doc in messages.where("timestamp", "<=", boundary[0]).end_at(position).get()])
+
+    query = messages.where("timestamp", "<", cutoff)
+    if boundary:
+        query = query.start_after(position)
+
+    archived, last = 0, None
+    while page := _page(query, last, min(PAGE_SIZE, ARCHIVE_SEGMENT_SIZE)):
+        refs = []
+
+        def records(page=page):
+            nonlocal last
+            while page:
+                for doc in page:
+                    refs.append(doc.reference)
+                    yield doc.to_dict()
+                last = page[-1]
+                room = ARCHIVE_SEGMENT_SIZE - len(refs)
+                page = _page(query, last, min(PAGE_SIZE, room)) if room > 0 and len(page) == PAGE_SIZE else []
+
+        first_at = page[0].get("timestamp")
+        key = _segment_key("messages", conv_ref.id, first_at)
+        if dry_run:
+            archived += sum(1 for _ in records())
+            continue
+        count = archive_store.write(key, records())
+        last_at = last.get("timestamp")
+
+        # Record the segment before deleting anything, so a crash can't lose messages
+        batch = firebase.db.batch()
+        segment_id = key.rsplit("/", 1)[-1].split(".")[0]
+        batch.set(conv_ref.collection("archive").document(segment_id), {
+            "segmentId": segment_id,
+            "key": key,
+            "firstAt": first_at,
+            "lastAt": last_at,
+            "lastId": last.id,
+            "count": count,
+            "createdAt": datetime.utcnow().isoformat(),
+        })
+        batch.update(conv_ref, {"archivedThroughAt": last_at, "archivedThroughId": last.id})
+        batch.commit()
+        _delete(refs)
+        archived += count
+    return archived
+
+
+def archive_messages(cutoff: str, dry_run: bool = False) -> tuple[int, int]:
+    """Archive old messages in every conversation. Returns (conversations scanned, messages archived)."""
+    query = firebase.db.collection("conversations").order_by("__name__")
+    scanned, archived, last = 0, 0, None
+    while page := _page(query, last):
+        for conv in page:
+            scanned += 1
+            # Nothing in a conversation started after the cutoff can be old enough
+            if conv.to_dict().get("createdAt", "") < cutoff:
+                archived += archive_conversation(conv.reference, cutoff, dry_run)
+        last = page[-1]
+    return scanned, archived
+
+
+def archive_reminders(cutoff: str, dry_run: bool = False) -> int:
+    """Move inactive reminders whose last trigger is older than `cutoff` into per-user segments."""
+    cutoff_ms = recurrence.to_ms(datetime.fromisoformat(cutoff))
+    # Grouped by user so each segment belongs to one person (needs an isActive+userId index)
+    query = firebase.db.collection("reminders").where("isActive", "==", False).order_by("userId")
+    archived, last = 0, None
+    user, pending = None, []
+
+    def flush():
+        nonlocal archived
+        if not pending:
+            return
+        if not dry_run:
+            archive_store.write(
+                _segment_key("reminders", user, datetime.utcnow().isoformat()),
+                (doc.to_dict() for doc in pending),
+            )
+            _delete([doc.reference for doc in pending])
+        archived += len(pending)
+        pending.clear()
+
+    while page := _page(query, last):
+        for doc in page:
+            reminder = doc.to_dict()
+            if reminder.get("triggerAtMs", 0) >= cutoff_ms:
+                continue
+            if reminder["userId"] != user or len(pending) >= ARCHIVE_SEGMENT_SIZE:
+                flush()
+                user = reminder["userId"]
+            pending.append(doc)
+        last = page[-1]
+    flush()
+    return archived
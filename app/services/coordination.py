@@ -0,0 +1,127 @@
+# app/services/coordination.py
+# Lease-based coordination between worker processes.
+#
+# Work is split into numbered shards. Each shard has a lease document
+# (`schedulerLeases/{name}-{shard}`) naming the worker that holds it and
+# when the lease expires. Workers heartbeat into `schedulerWorkers` and
+# hold at most their fair share of shards, so adding workers spreads the
+# load and a crashed worker's shards are taken over once its leases expire.
+# With a single shard this is plain leader election.
+
+import math
+import os
+import socket
+import time
+import uuid
+import zlib
+from firebase_admin import firestore
+from app.services import firebase
+
+
+def make_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def shard_for(key: str, shards: int) -> int:
+    """Stable shard number for a key (e.g. a userId)."""
+    return zlib.crc32(key.encode()) % shards
+
+
+class LeaseManager:
+    def __init__(self, name: str, shards: int, ttl: float, worker_id: str | None = None, clock=time.time):
+        self.name = name
+        self.shards = shards
+        self.ttl = ttl
+        self._worker_id = worker_id
+        self.clock = clock
+        self.held: set[int] = set()
+        self._expires: dict[int, float] = {}
+
+    @property
+    def worker_id(self) -> str:
+        # Made on first use, so workers forked from one preloaded parent get distinct ids
+        if self._worker_id is None:
+            self._worker_id = make_worker_id()
+        return self._worker_id
+
+    def _lease_ref(self, shard: int):
+        return firebase.db.collection("schedulerLeases").document(f"{self.name}-{shard}")
+
+    def _live_workers(self) -> int:
+        workers = (
+            firebase.db.collection("schedulerWorkers")
+            .where("group", "==", self.name)
+            .where("expiresAt", ">", self.clock())
+            .get()
+        )
+        return max(1, len(workers))
+
+    def _try_acquire(self, shard: int) -> bool:
+        """Take or renew the lease if it's free, expired or already ours."""
+        ref = self._lease_ref(shard)
+        now = self.clock()
+
+        @firestore.transactional
+        def _acquire(transaction):
+            lease = ref.get(transaction=transaction)
+            if lease.exists:
+                data = lease.to_dict()
+                if data["holder"] != self.worker_id and data["expiresAt"] > now:
+                    return False
+            transaction.set(ref, {"holder": self.worker_id, "expiresAt": now + self.ttl})
+            return True
+
+        if _acquire(firebase.db.transaction()):
+            self._expires[shard] = now + self.ttl
+            return True
+        return False
+
+    def _release(self, shard: int):
+        ref = self._lease_ref(shard)
+
+        @firestore.transactional
+        def _give_up(transaction):
+            lease = ref.get(transaction=transaction)
+            if lease.exists and lease.to_dict()["holder"] == self.worker_id:
+                transaction.delete(ref)
+
+        _give_up(firebase.db.transaction())
+        self._expires.pop(shard, None)
+
+    def heartbeat(self) -> bool:
+        """Renew held leases and rebalance. Returns True if the held set changed."""
+        firebase.db.collection("schedulerWorkers").document(self.worker_id).set({
+            "group": self.name,
+            "expiresAt": self.clock() + self.ttl,
+        })
+        fair_share = math.ceil(self.shards / self._live_workers())
+        before = set(self.held)
+
+        # Renew what we hold; anything we failed to renew is someone else's now
+        self.held = {shard for shard in self.held if self._try_acquire(shard)}
+
+        # Give back shards beyond our fair share so newcomers get some
+        for shard in sorted(self.held)[fair_share:]:
+            self._release(shard)
+            self.held.discard(shard)
+
+        # Pick up free shards, starting at a worker-specific offset to avoid contention
+        start = shard_for(self.worker_id, self.shards)
+        for i in range(self.shards):
+            if len(self.held) >= fair_share:
+                break
+            shard = (start + i) % self.shards
+            if shard not in self.held and self._try_acquire(shard):
+                self.held.add(shard)
+
+        return self.held != before
+
+    def holds(self, shard: int) -> bool:
+        """True only while the lease is held and not about to expire."""
+        return shard in self.held and self._expires.get(shard, 0) > self.clock()
+
+    def release_all(self):
+        for shard in list(self.held):
+            self._release(shard)
+        self.held.clear()
+        firebase.db.collection("schedulerWorkers").document(self.worker_id).delete()
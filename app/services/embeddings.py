@@ -0,0 +1,552 @@
+# app/services/embeddings.py
+# Embedding store for semantic search over a user's notes and messages.
+#
+# New texts are collected for EMBEDDINGS_BATCH_MS and embedded in one
+# provider call. Vectors are cached in SQLite by a hash of (model, text),
+# so identical text — a note saved twice, a message shared by both
+# participants, a rebuild — is never embedded again. For search, each
+# user's vectors are held in memory as one normalized float32 matrix and
+# scored with a single matrix-vector product; users with very many vectors
+# get an inverted-file (IVF) index that only scores the closest clusters.
+# Each process opens its own SQLite connection, in the app lifespan or on
+# first use; nothing is opened at import.
+#
+# Several workers can share the file: every write bumps the user's row in
+# `generations`, and a worker reloads a user from SQLite when that number
+# isn't the one its in-memory copy was built at. Search queries are only
+# cached in memory (EMBEDDINGS_QUERY_CACHE), so the vector table holds
+# note and message text only.
+
+import asyncio
+import hashlib
+import importlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+import numpy as np
+from app.config import (
+    EMBEDDINGS_BATCH_MS,
+    EMBEDDINGS_IVF_THRESHOLD,
+    EMBEDDINGS_MAX_USERS,
+    EMBEDDINGS_MODEL,
+    EMBEDDINGS_PATH,
+    EMBEDDINGS_PROVIDER,
+    EMBEDDINGS_QUERY_CACHE,
+)
+from app.services import ai_service
+
+EMBED_BATCH = 256       # Texts per provider call
+MIN_TEXT_CHARS = 12     # "ok", "thanks!" etc. aren't worth a vector
+MAX_TEXT_CHARS = 2000
+REMOVE_RETRY_SECONDS = 5  # Before a failed removal is tried again
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (hash TEXT PRIMARY KEY, vector BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS entries (
+    uid TEXT NOT NULL, key TEXT NOT NULL, kind TEXT NOT NULL, doc_id TEXT NOT NULL,
+    parent_id TEXT, text TEXT NOT NULL, hash TEXT NOT NULL,
+    PRIMARY KEY (uid, key)
+);
+CREATE TABLE IF NOT EXISTS generations (uid TEXT PRIMARY KEY, generation INTEGER NOT NULL);
+"""
+
+
+# ---------- Providers ----------
+
+class OpenAIEmbeddings:
+    def __init__(self, model: str = EMBEDDINGS_MODEL):
+        self.model = model
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        return np.asarray(await ai_service.embed_texts(texts, self.model), dtype=np.float32)
+
+
+class FakeEmbeddings:
+    """Deterministic bag-of-words hashing, for tests and offline runs. Shared words => similar vectors."""
+
+    model = "fake"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                h = zlib.crc32(word.encode())
+                vectors[i, h % self.dim] += 1.0 if h & 1 else -1.0
+        return vectors
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+# ---------- Approximate index ----------
+
+class IVFIndex:
+    """Spherical k-means clusters; a query only scores rows in its `nprobe` nearest clusters."""
+
+    def __init__(self, matrix: np.ndarray, iterations: int = 8, seed: int = 0):
+        n = len(matrix)
+        self.size = n
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(n, min(n, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            filled = np.bincount(assign, minlength=nlist) > 0
+            centroids[filled] = _normalize(sums[filled])
+        self.centroids = centroids
+
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        self.order = np.argsort(assign, kind="stable")
+        self.bounds = np.searchsorted(assign[self.order], np.arange(nlist + 1))
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nearest = np.argsort(self.centroids @ query)[::-1][:nprobe]
+        return np.concatenate([self.order[self.bounds[c]:self.bounds[c + 1]] for c in nearest])
+
+
+# ---------- Per-user vectors ----------
+
+class UserVectors:
+    """One user's vectors as a growable float32 matrix plus row metadata."""
+
+    def __init__(self, dim: int):
+        self._data = np.zeros((16, dim), dtype=np.float32)
+        self.size = 0
+        self.meta: list[dict] = []
+        self.position: dict[str, int] = {}
+        self.ivf: IVFIndex | None = None
+        self.generation = 0  # The user's row in `generations` this copy matches
+        self._changes = 0
+        # Rows rewritten since the IVF index was built; its clusters are wrong for them
+        self._stale: set[int] = set()
+        self._build_size: int | None = None  # Rows in the snapshot an index is being built from
+        self._build_stale: set[int] = set()
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._data[:self.size]
+
+    def _touch(self, row: int):
+        self._changes += 1
+        if self.ivf is not None and row < self.ivf.size:
+            self._stale.add(row)
+        if self._build_size is not None and row < self._build_size:
+            self._build_stale.add(row)
+
+    def put(self, key: str, meta: dict, vector: np.ndarray):
+        row = self.position.get(key)
+        if row is None:
+            if self.size == len(self._data):
+                self._data = np.concatenate([self._data, np.zeros_like(self._data)])
+            row = self.size
+            self.size += 1
+            self.meta.append(meta)
+            self.position[key] = row
+        else:
+            self.meta[row] = meta
+        self._data[row] = vector
+        self._touch(row)
+
+    def remove(self, key: str):
+        row = self.position.pop(key, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            # Move the last row into the gap
+            self._data[row] = self._data[last]
+            self.meta[row] = self.meta[last]
+            self.position[self.meta[row]["key"]] = row
+            self._touch(row)
+        self.meta.pop()
+        self.size -= 1
+        self._stale.discard(last)
+        self._build_stale.discard(last)
+        self._changes += 1
+
+    # An IVF build takes seconds at large sizes, so the store runs it on a
+    # snapshot without holding its lock; rows written meanwhile are marked stale.
+
+    def needs_index(self, ivf_threshold: int) -> bool:
+        return (
+            self.size > ivf_threshold and self._build_size is None
+            and (self.ivf is None or self._changes > self.ivf.size // 10)
+        )
+
+    def start_index(self) -> np.ndarray:
+        self._build_size = self.size
+        self._build_stale = set()
+        return self.matrix.copy()
+
+    def finish_index(self, ivf: IVFIndex | None):
+        """Install an index built from start_index()'s snapshot (None if the build failed)."""
+        if ivf is not None:
+            self.ivf = ivf
+            self._stale = {row for row in self._build_stale if row < self.size}
+            self._changes = len(self._stale)
+        self._build_size = None
+        self._build_stale = set()
+
+    def search(self, query: np.ndarray, k: int, kinds=None, ivf_threshold: int = 20_000) -> list[tuple[float, dict]]:
+        if self.size == 0:
+            return []
+        rows = None
+        if self.ivf is not None and self.size > ivf_threshold:
+            nprobe = max(4, len(self.ivf.centroids) // 16)
+            probed = self.ivf.candidates(query, nprobe)
+            # Rows added or rewritten since the index was built are always scanned
+            rows = np.unique(np.concatenate([
+                probed[probed < self.size],
+                np.fromiter(self._stale, dtype=np.int64, count=len(self._stale)),
+                np.arange(self.ivf.size, self.size),
+            ]))
+            scores = self._data[rows] @ query
+        else:
+            scores = self.matrix @ query
+
+        if kinds:
+            keep = np.array([self.meta[r]["kind"] in kinds for r in (rows if rows is not None else range(self.size))])
+            scores = np.where(keep, scores, -np.inf)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            if scores[i] == -np.inf:
+                break
+            row = rows[i] if rows is not None else i
+            results.append((float(scores[i]), self.meta[row]))
+        return results
+
+
+# ---------- Store ----------
+
+class EmbeddingStore:
+    def __init__(self, provider, path: str, batch_ms: float = 200, max_users: int = 1000, ivf_threshold: int = 20_000,
+                 query_cache: int = 1000):
+        self.provider = provider
+        self.window = batch_ms / 1000
+        self.max_users = max_users
+        self.ivf_threshold = ivf_threshold
+        self.query_cache = query_cache
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        os.register_at_fork(after_in_child=self._forget)
+        self._users: OrderedDict[str, UserVectors] = OrderedDict()
+        self._queries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._pending: list[tuple] = []
+        self._removals: list[tuple] = []
+        self._timer = None
+        self._counts = dict.fromkeys(("embedded", "cacheHits", "providerCalls", "searches", "ivfSearches"), 0)
+
+    def _db(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def open(self):
+        """Open this process's connection now rather than on first use."""
+        with self._lock:
+            self._db()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _forget(self):
+        # A connection (or a held lock) inherited across fork() must not be used by the child
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _hash(self, text: str) -> str:
+        return hashlib.sha256(f"{self.provider.model}\0{text}".encode()).hexdigest()
+
+    # ---------- Vectors (content-hash cache) ----------
+
+    def _cached(self, hashes: list[str]) -> dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                rows = self._db().execute(
+                    f"SELECT hash, vector FROM vectors WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((h, np.frombuffer(blob, dtype=np.float32)) for h, blob in rows)
+        return found
+
+    def _save_vectors(self, vectors: dict[str, np.ndarray]):
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT OR IGNORE INTO vectors (hash, vector) VALUES (?, ?)",
+                [(h, v.astype(np.float32).tobytes()) for h, v in vectors.items()],
+            )
+            db.commit()
+
+    async def vectors(self, texts: list[str], persist: bool = True) -> list[np.ndarray]:
+        """
+        Normalized vectors for `texts`, embedding only those not seen before.
+        With persist=False new vectors aren't written to the cache table.
+        """
+        hashes = [self._hash(t) for t in texts]
+        found = await asyncio.to_thread(self._cached, list(set(hashes)))
+        self._counts["cacheHits"] += sum(1 for h in hashes if h in found)
+
+        missing = {h: t for h, t in zip(hashes, texts) if h not in found}
+        if missing:
+            items = list(missing.items())
+            fresh = {}
+            for i in range(0, len(items), EMBED_BATCH):
+                chunk = items[i:i + EMBED_BATCH]
+                self._counts["providerCalls"] += 1
+                self._counts["embedded"] += len(chunk)
+                embedded = _normalize(await self.provider.embed([t for _, t in chunk]))
+                fresh.update((h, v) for (h, _), v in zip(chunk, embedded))
+            if persist:
+                await asyncio.to_thread(self._save_vectors, fresh)
+            found.update(fresh)
+        return [found[h] for h in hashes]
+
+    async def query_vector(self, text: str) -> np.ndarray:
+        """Vector for a search query, kept in a bounded in-memory LRU rather than in SQLite."""
+        key = self._hash(text)
+        vector = self._queries.get(key)
+        if vector is not None:
+            self._queries.move_to_end(key)
+            self._counts["cacheHits"] += 1
+            return vector
+        [vector] = await self.vectors([text], persist=False)
+        self._queries[key] = vector
+        while len(self._queries) > self.query_cache:
+            self._queries.popitem(last=False)
+        return vector
+
+    def prune_vectors(self) -> int:
+        """Drop cached vectors no entry uses (deleted notes, superseded text). Returns how many."""
+        with self._lock:
+            db = self._db()
+            pruned = db.execute("DELETE FROM vectors WHERE hash NOT IN (SELECT hash FROM entries)").rowcount
+            db.commit()
+            return pruned
+
+    # ---------- Per-user entries ----------
+
+    def _load_user(self, uid: str) -> UserVectors | None:
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT generation FROM generations WHERE uid = ?", (uid,)).fetchone()
+            generation = row[0] if row else 0
+            user = self._users.get(uid)
+            if user is not None and user.generation == generation:
+                self._users.move_to_end(uid)
+                return user
+            # Not loaded, or another worker has written since
+            self._users.pop(uid, None)
+            rows = db.execute(
+                "SELECT e.key, e.kind, e.doc_id, e.parent_id, e.text, v.vector "
+                "FROM entries e JOIN vectors v ON v.hash = e.hash WHERE e.uid = ?",
+                (uid,),
+            ).fetchall()
+            if not rows:
+                return None
+            user = UserVectors(len(np.frombuffer(rows[0][5], dtype=np.float32)))
+            for key, kind, doc_id, parent_id, text, blob in rows:
+                user.put(key, _meta(key, kind, doc_id, parent_id, text), np.frombuffer(blob, dtype=np.float32))
+            user._changes = 0
+            user.generation = generation
+            self._users[uid] = user
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return user
+
+    def _bump(self, db: sqlite3.Connection, uids) -> dict[str, UserVectors]:
+        """
+        Advance the users' generations, in the caller's transaction. Returns
+        the loaded users this process can patch in place; ones another worker
+        has written to meanwhile are dropped and reloaded on next use.
+        """
+        current = {}
+        for uid in set(uids):
+            (generation,) = db.execute(
+                "INSERT INTO generations (uid, generation) VALUES (?, 1) "
+                "ON CONFLICT (uid) DO UPDATE SET generation = generation + 1 RETURNING generation",
+                (uid,),
+            ).fetchone()
+            user = self._users.get(uid)
+            if user is None:
+                continue
+            if user.generation + 1 == generation:
+                user.generation = generation
+                current[uid] = user
+            else:
+                del self._users[uid]
+        return current
+
+    def _apply(self, entries: list[tuple], vectors: list[np.ndarray]):
+        """Persist (uid, key, kind, doc_id, parent_id, text) entries and update loaded users."""
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT OR REPLACE INTO entries (uid, key, kind, doc_id, parent_id, text, hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(*entry, self._hash(entry[5])) for entry in entries],
+            )
+            loaded = self._bump(db, [entry[0] for entry in entries])
+            db.commit()
+            for (uid, key, kind, doc_id, parent_id, text), vector in zip(entries, vectors):
+                user = loaded.get(uid)
+                if user is not None:
+                    user.put(key, _meta(key, kind, doc_id, parent_id, text), vector)
+
+    def _delete(self, uids, key: str):
+        with self._lock:
+            db = self._db()
+            db.executemany("DELETE FROM entries WHERE uid = ? AND key = ?", [(uid, key) for uid in uids])
+            loaded = self._bump(db, uids)
+            db.commit()
+            for user in loaded.values():
+                user.remove(key)
+
+    async def index(self, entries: list[tuple]):
+        """Embed and store (uid, key, kind, doc_id, parent_id, text) entries now."""
+        if not entries:
+            return
+        vectors = await self.vectors([entry[5] for entry in entries])
+        await asyncio.to_thread(self._apply, entries, vectors)
+
+    # ---------- Write path (micro-batched) ----------
+
+    def add(self, owners, kind: str, doc_id: str, text: str, parent_id: str | None = None):
+        """Queue a note or message for embedding. Must be called on the event loop."""
+        entries = entries_for(owners, kind, doc_id, text, parent_id)
+        if not entries:
+            return
+        self._pending += entries
+        self._schedule_flush(self.window)
+
+    def _schedule_flush(self, delay: float):
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(delay, lambda: asyncio.ensure_future(self._flush()))
+
+    async def _flush(self):
+        self._timer = None
+        entries, self._pending = self._pending, []
+        removals, self._removals = self._removals, []
+        for owners, key in removals:
+            try:
+                await asyncio.to_thread(self._delete, owners, key)
+            except sqlite3.Error as exc:
+                print(f"Embedding removal of {key} failed, retrying later: {exc}")
+                self._removals.append((owners, key))
+        if self._removals:
+            self._schedule_flush(REMOVE_RETRY_SECONDS)
+        if not entries:
+            return
+        try:
+            await self.index(entries)
+        except Exception as exc:
+            # The rebuild script can fill gaps; the write itself already succeeded
+            print(f"Embedding batch of {len(entries)} failed: {exc}")
+
+    async def remove(self, owners, kind: str, doc_id: str):
+        """Drop a deleted note/message. Best-effort: a failure is retried, never raised."""
+        key = f"{kind}:{doc_id}"
+        try:
+            await asyncio.to_thread(self._delete, list(owners), key)
+        except sqlite3.Error as exc:
+            print(f"Embedding removal of {key} failed, retrying later: {exc}")
+            self._removals.append((list(owners), key))
+            self._schedule_flush(REMOVE_RETRY_SECONDS)
+
+    def clear_entries(self):
+        """Forget every user's entries (cached vectors are kept)."""
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM entries")
+            db.execute("UPDATE generations SET generation = generation + 1")
+            db.commit()
+            self._users.clear()
+
+    # ---------- Search ----------
+
+    def _search(self, uid: str, query: np.ndarray, k: int, kinds) -> list[dict]:
+        user = self._load_user(uid)
+        if user is None:
+            return []
+        with self._lock:
+            snapshot = user.start_index() if user.needs_index(self.ivf_threshold) else None
+        if snapshot is not None:
+            # Built outside the lock so other users' adds and searches aren't held up
+            ivf = None
+            try:
+                ivf = IVFIndex(snapshot)
+            finally:
+                with self._lock:
+                    user.finish_index(ivf)
+        with self._lock:
+            if user.ivf is not None and user.size > self.ivf_threshold:
+                self._counts["ivfSearches"] += 1
+            hits = user.search(query, k, kinds, self.ivf_threshold)
+        return [{**meta, "score": round(score, 4)} for score, meta in hits]
+
+    async def search(self, uid: str, text: str, k: int = 5, kinds=None) -> list[dict]:
+        """The user's k most similar notes/messages to `text`, best first."""
+        self._counts["searches"] += 1
+        query = await self.query_vector(" ".join(text.split())[:MAX_TEXT_CHARS])
+        return await asyncio.to_thread(self._search, uid, query, k, kinds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            loaded = sum(user.size for user in self._users.values())
+            return {**self._counts, "usersLoaded": len(self._users), "vectorsLoaded": loaded}
+
+
+def entries_for(owners, kind: str, doc_id: str, text: str, parent_id: str | None = None) -> list[tuple]:
+    """Store entries for one note/message, one per user who can see it. Empty if too short to embed."""
+    text = " ".join(text.split())[:MAX_TEXT_CHARS]
+    if len(text) < MIN_TEXT_CHARS:
+        return []
+    return [(uid, f"{kind}:{doc_id}", kind, doc_id, parent_id, text) for uid in owners]
+
+
+def _meta(key: str, kind: str, doc_id: str, parent_id: str | None, text: str) -> dict:
+    return {"key": key, "kind": kind, "id": doc_id, "conversationId": parent_id, "text": text}
+
+
+def _make_provider():
+    if EMBEDDINGS_PROVIDER == "openai":
+        return OpenAIEmbeddings()
+    if EMBEDDINGS_PROVIDER == "fake":
+        return FakeEmbeddings()
+    module_name, _, class_name = EMBEDDINGS_PROVIDER.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+embedding_store = EmbeddingStore(
+    _make_provider(),
+    EMBEDDINGS_PATH,
+    batch_ms=EMBEDDINGS_BATCH_MS,
+    max_users=EMBEDDINGS_MAX_USERS,
+    ivf_threshold=EMBEDDINGS_IVF_THRESHOLD,
+    query_cache=EMBEDDINGS_QUERY_CACHE,
+)
@@ -0,0 +1,94 @@
+# app/services/export.py
+# Bulk export and import of everything stored for one user (GDPR requests).
+#
+# An export is a stream of records, one per document:
+#   {"kind": "message", "path": "conversations/<id>/messages/<id>", "data": {...}}
+# Firestore is read a page at a time and archived segments a line at a
+# time, so memory use doesn't grow with the user's history. Archived
+# messages and reminders are exported as ordinary documents; an import
+# writes them back to Firestore, where a later archival run can move them
+# out again.
+
+import json
+from typing import Iterable, Iterator
+from app.services import firebase
+from app.services.archive import archive_store
+from app.services.repository import BATCH_SIZE
+
+PAGE_SIZE = 500
+KINDS = {"user", "inbox", "note", "reminder", "job", "conversation", "message"}
+
+
+def _pages(query) -> Iterator:
+    last = None
+    while True:
+        page = (query.start_after(last) if last is not None else query).limit(PAGE_SIZE).get()
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        last = page[-1]
+
+
+def _records(kind: str, query) -> Iterator[dict]:
+    for doc in _pages(query):
+        yield {"kind": kind, "path": doc.reference.path, "data": doc.to_dict()}
+
+
+def export_user(uid: str) -> Iterator[dict]:
+    """Every document belonging to `uid`, including conversations they take part in. Blocking."""
+    db = firebase.db
+    user_ref = db.collection("users").document(uid)
+    user = user_ref.get()
+    if user.exists:
+        yield {"kind": "user", "path": user_ref.path, "data": user.to_dict()}
+    yield from _records("inbox", user_ref.collection("inbox"))
+    yield from _records("note", db.collection("notes").where("userId", "==", uid))
+    yield from _records("job", db.collection("aiJobs").where("userId", "==", uid))
+
+    yield from _records("reminder", db.collection("reminders").where("userId", "==", uid))
+    for key in archive_store.list(f"reminders/{uid}"):
+        for reminder in archive_store.read(key):
+            yield {"kind": "reminder", "path": f"reminders/{reminder['reminderId']}", "data": reminder}
+
+    for conv in _pages(db.collection("conversations").where("participants", "array_contains", uid)):
+        data = conv.to_dict()
+        # The archive itself isn't exported, so an import mustn't claim to have one
+        data.pop("archivedThroughAt", None)
+        data.pop("archivedThroughId", None)
+        yield {"kind": "conversation", "path": conv.reference.path, "data": data}
+        for segment in _pages(conv.reference.collection("archive").order_by("firstAt")):
+            for message in archive_store.read(segment.get("key")):
+                path = f"{conv.reference.path}/messages/{message['messageId']}"
+                yield {"kind": "message", "path": path, "data": message}
+        yield from _records("message", conv.reference.collection("messages").order_by("timestamp"))
+
+
+def import_records(records: Iterable[dict]) -> dict[str, int]:
+    """Write exported records back in batches. Returns a count per kind. Blocking."""
+    db = firebase.db
+    counts: dict[str, int] = {}
+    batch, pending = db.batch(), 0
+    for record in records:
+        kind = record.get("kind")
+        if kind not in KINDS:
+            raise ValueError(f"Unknown record kind: {kind!r}")
+        batch.set(db.document(record["path"]), record["data"])
+        counts[kind] = counts.get(kind, 0) + 1
+        pending += 1
+        if pending >= BATCH_SIZE:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+    return counts
+
+
+def to_jsonl(records: Iterable[dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, separators=(",", ":"), default=str) + "\n"
+
+
+def from_jsonl(lines: Iterable[str]) -> Iterator[dict]:
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
@@ -1,35 +1,95 @@
 # app/services/firebase.py
+#
+# The Firebase app and Firestore client are created on first use, not at
+# import, and again in a forked child: gRPC channels must not be shared
+# across fork(). `firebase.db` still works everywhere (module __getattr__).
 
+import importlib
+import os
+import threading
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
-from app.config import get_firebase_credentials
+from app.config import FIREBASE_BACKEND, get_firebase_credentials
 
-firebase_credentials = get_firebase_credentials()
+_db = None
+_backend = None
+_lock = threading.RLock()
 
-if not firebase_credentials:
-    raise ValueError("Firebase credentials not found.")
 
-# Prevent double initialization (important for reloads)
-if not firebase_admin._apps:
-    if isinstance(firebase_credentials, dict):
-        cred = credentials.Certificate(firebase_credentials)
-    else:
-        cred = credentials.Certificate(firebase_credentials)
+def init_app():
+    """Initialize the Firebase app once. Cheap (no network); raises if credentials are missing."""
+    if FIREBASE_BACKEND or firebase_admin._apps:
+        return
+    with _lock:
+        firebase_credentials = get_firebase_credentials()
 
-    firebase_admin.initialize_app(cred)
+        if not firebase_credentials:
+            raise ValueError("Firebase credentials not found.")
+
+        # Prevent double initialization (important for reloads)
+        if not firebase_admin._apps:
+            if isinstance(firebase_credentials, dict):
+                cred = credentials.Certificate(firebase_credentials)
+            else:
+                cred = credentials.Certificate(firebase_credentials)
+
+            firebase_admin.initialize_app(cred)
+
+
+def _get_backend():
+    # In-process stand-in for Firestore and token checks (benchmarks, offline runs)
+    global _backend
+    if _backend is None:
+        _backend = importlib.import_module(FIREBASE_BACKEND)
+    return _backend
+
+
+def get_db():
+    global _db
+    if _db is None:
+        with _lock:
+            if _db is None:
+                if FIREBASE_BACKEND:
+                    _db = _get_backend().client()
+                else:
+                    init_app()
+                    _db = firestore.client()
+    return _db
+
+
+def set_db(client):
+    """Swap the Firestore client everything reads through `firebase.db` (tests, benchmarks)."""
+    global _db
+    _db = client
+
+
+def _forget_db():
+    global _db
+    _db = None
+
+
+os.register_at_fork(after_in_child=_forget_db)
+
+
+def __getattr__(name: str):
+    if name == "db":
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-db = firestore.client()
 
 def get_user(uid: str):
-    doc = db.collection("users").document(uid).get()
+    doc = get_db().collection("users").document(uid).get()
     return doc.to_dict() if doc.exists else None
 
 def create_or_update_user(uid: str, data: dict):
-    db.collection("users").document(uid).set(data, merge=True)
+    get_db().collection("users").document(uid).set(data, merge=True)
 
 def verify_firebase_token(id_token: str) -> dict:
     try:
+        if FIREBASE_BACKEND:
+            return _get_backend().verify_id_token(id_token)
+        init_app()
         decoded = auth.verify_id_token(id_token)
         return decoded
     except Exception:
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,173 @@
+# app/services/metrics.py
+# In-process metrics, exported in the Prometheus text format at /metrics.
+#
+# Hot paths record into a few labelled histograms and counters: HTTP
+# requests by route template, Firestore calls by operation, token
+# verification and upstream LLM calls, plus LLM token usage. The caches
+# and pipelines that already keep a stats() dict are registered with
+# `register_stats` and exported as gauges when scraped.
+#
+# Timings optionally also open OpenTelemetry spans (METRICS_OTEL); without
+# an SDK configured those are no-ops.
+
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from app.config import METRICS_OTEL
+
+try:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("ai-notepad-backend") if METRICS_OTEL else None
+except ImportError:
+    _tracer = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in self._values.items():
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            bucket = bisect_left(self.buckets, value)
+            if bucket < len(self.buckets):
+                series[bucket] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+FIRESTORE_SECONDS = Histogram("firestore_call_duration_seconds", "Firestore call latency, including pool wait", ("op",))
+AUTH_SECONDS = Histogram("auth_verify_duration_seconds", "Firebase ID token verification latency")
+LLM_SECONDS = Histogram("llm_request_duration_seconds", "Upstream LLM call latency", ("kind", "model"))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens reported by the API", ("model", "type"))
+LLM_ERRORS = Counter("llm_errors_total", "Failed upstream LLM calls", ("kind", "model"))
+
+_metrics = [REQUEST_SECONDS, FIRESTORE_SECONDS, AUTH_SECONDS, LLM_SECONDS, LLM_TOKENS, LLM_ERRORS]
+_stats_sources: dict[str, object] = {}
+
+
+@contextmanager
+def timed(histogram: Histogram, *labels):
+    """Observe the duration of the block, in a tracing span when enabled."""
+    started = time.perf_counter()
+    if _tracer is None:
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started, *labels)
+        return
+    with _tracer.start_as_current_span(histogram.name, attributes=dict(zip(histogram.labelnames, labels))):
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started, *labels)
+
+
+def record_usage(model: str, usage):
+    """Count tokens from an OpenAI `usage` object (absent on some streams)."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens or 0, model, "prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model, "completion")
+
+
+def register_stats(prefix: str, source):
+    """Export a component's stats() dict as gauges named `{prefix}_{key}`."""
+    _stats_sources[prefix] = source
+
+
+_CAMEL = re.compile(r"(?<=[a-z0-9])([A-Z])")
+_INVALID = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _metric_name(*parts: str) -> str:
+    return "_".join(_INVALID.sub("_", _CAMEL.sub(r"_\1", part)).lower() for part in parts)
+
+
+def _flatten(stats: dict, path: tuple = ()):
+    """(path, leaf key, value) for every numeric leaf of a nested stats dict."""
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, path + (str(key),))
+        elif isinstance(value, bool):
+            yield path, str(key), int(value)
+        elif isinstance(value, (int, float)):
+            yield path, str(key), value
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for prefix, source in _stats_sources.items():
+        try:
+            stats = source()
+        except Exception as exc:
+            print(f"Metrics: {prefix} stats failed: {exc}")
+            continue
+        families: dict[str, list[str]] = {}
+        for path, key, value in _flatten(stats):
+            name = _metric_name(prefix, key)
+            labels = f'{{path="{_escape("/".join(path))}"}}' if path else ""
+            families.setdefault(name, [f"# TYPE {name} gauge"]).append(f"{name}{labels} {value}")
+        for samples in families.values():
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,469 @@
+# app/services/notification.py
+# Push notification delivery for due reminders.
+#
+# The reminder dispatcher hands due occurrences to a bounded asyncio queue
+# (blocking its thread when the queue is full). A small pool of workers
+# drains the queue in batches, looks up device tokens for the whole batch
+# in one read, and sends up to 500 messages per provider call. Transient
+# failures are retried per device with jittered exponential backoff; a
+# notification that still fails is written to `notificationDeadLetters`.
+# Unregistered tokens are removed from the user's profile. Each user gets
+# a token bucket so a burst of reminders (e.g. catch-up after downtime) is
+# spread out rather than dropped.
+
+import asyncio
+import importlib
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime
+from firebase_admin import exceptions, messaging
+from app.config import (
+    NOTIFY_BATCH_WAIT_MS,
+    NOTIFY_DRAIN_SECONDS,
+    NOTIFY_MAX_ATTEMPTS,
+    NOTIFY_PROVIDER,
+    NOTIFY_QUEUE_SIZE,
+    NOTIFY_USER_RATE,
+    NOTIFY_WORKERS,
+)
+from app.services import repository
+
+logger = logging.getLogger(__name__)
+
+# Outcomes a provider reports per message
+SENT = "sent"
+RETRY = "retry"                  # Transient; try again later
+INVALID_TOKEN = "invalid_token"  # Device is gone; forget the token
+FAILED = "failed"                # Permanent; dead-letter it
+
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 300.0
+LATENCY_SAMPLES = 1000
+
+
+class FCMProvider:
+    """Firebase Cloud Messaging via the Admin SDK's batch send."""
+
+    max_batch = 500  # FCM limit per send_each call
+
+    async def send(self, messages: list[dict]) -> list[tuple[str, str | None]]:
+        batch = [
+            messaging.Message(
+                token=m["token"],
+                notification=messaging.Notification(title=m["title"], body=m["body"]),
+                data=m["data"],
+            )
+            for m in messages
+        ]
+        response = await asyncio.to_thread(messaging.send_each, batch)
+        return [self._outcome(r) for r in response.responses]
+
+    @staticmethod
+    def _outcome(response) -> tuple[str, str | None]:
+        if response.success:
+            return SENT, None
+        exc = response.exception
+        if isinstance(exc, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+            return INVALID_TOKEN, str(exc)
+        if isinstance(exc, (messaging.QuotaExceededError, exceptions.UnavailableError, exceptions.InternalError)):
+            return RETRY, str(exc)
+        return FAILED, str(exc)
+
+
+class LogProvider:
+    """Stand-in for local runs and tests: prints and records instead of pushing."""
+
+    max_batch = 500
+
+    def __init__(self):
+        self.sent: list[dict] = []
+
+    async def send(self, messages: list[dict]) -> list[tuple[str, str | None]]:
+        for m in messages:
+            print(f"⏰ Reminder due: {m['title']} → {m['token']}")
+        self.sent.extend(messages)
+        return [(SENT, None)] * len(messages)
+
+
+class UserRateLimiter:
+    """Token bucket per user: `rate` per minute with a burst of the same size (0 disables it)."""
+
+    MAX_USERS = 100_000
+
+    def __init__(self, rate: float, clock=time.monotonic):
+        self.capacity = max(1.0, rate)
+        self.refill = rate / 60
+        self.clock = clock
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def take(self, uid: str) -> float:
+        """Consume one token. Returns 0 if allowed, else seconds until one is available."""
+        if self.refill <= 0:
+            return 0.0
+        now = self.clock()
+        tokens, updated = self._buckets.get(uid, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill)
+        if tokens >= 1:
+            self._buckets[uid] = (tokens - 1, now)
+            if len(self._buckets) > self.MAX_USERS:
+                self._prune(now)
+            return 0.0
+        self._buckets[uid] = (tokens, now)
+        return (1 - tokens) / self.refill
+
+    def _prune(self, now: float):
+        # Buckets that have refilled are the same as no bucket at all
+        full = [uid for uid, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.refill >= self.capacity]
+        for uid in full:
+            del self._buckets[uid]
+
+
+class NotificationPipeline:
+    def __init__(
+        self,
+        provider,
+        queue_size: int = 10_000,
+        workers: int = 4,
+        batch_wait_ms: float = 50,
+        max_attempts: int = 5,
+        user_rate: float = 10,
+        drain_seconds: float = 10,
+        clock=time.monotonic,
+    ):
+        self.provider = provider
+        self.queue_size = queue_size
+        self.workers = workers
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_attempts = max_attempts
+        self.drain_seconds = drain_seconds
+        self.limiter = UserRateLimiter(user_rate, clock)
+        self.clock = clock
+        self._loop = None
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._draining = False
+        self._closed = False
+        # Items waiting out a rate limit or backoff: key -> (timer, or requeue task once due; item)
+        self._deferred: dict[int, tuple[asyncio.TimerHandle | asyncio.Task, dict]] = {}
+        self._keys = itertools.count()
+        self._busy: dict[int, list[dict]] = {}       # Worker -> batch it is building or delivering
+        self._intake: set[asyncio.Task] = set()      # submit() calls waiting for queue space
+        self._background: set[asyncio.Task] = set()  # Requeues and dead-letter writes
+        self._unqueued: list[dict] = []              # Intake cut short by stop()
+        self._latencies: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._counts = dict.fromkeys(
+            ("submitted", "sent", "retried", "deadLettered", "invalidTokens",
+             "noDevice", "rateLimited", "batches", "messages"), 0)
+
+    # ---------- Lifecycle ----------
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._draining = self._closed = False
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        """
+        Keep delivering what is queued or deferred for up to `drain_seconds`,
+        then dead-letter the rest. The dispatcher has already moved these
+        reminders on, so anything dropped here would never be sent.
+        """
+        if not self._tasks:
+            return
+        self._draining = True
+        try:
+            await asyncio.wait_for(self._drain(), self.drain_seconds)
+        except asyncio.TimeoutError:
+            logger.warning("Notification drain timed out after %ss", self.drain_seconds)
+
+        self._closed = True
+        intake = list(self._intake)
+        for task in self._tasks + intake:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *intake, return_exceptions=True)
+
+        # A batch cut off mid-delivery may be partly sent; a duplicate record beats a lost reminder
+        left = [item for batch in self._busy.values() for item in batch] + self._unqueued
+        while not self._queue.empty():
+            left.append(self._queue.get_nowait())
+        for handle, item in self._deferred.values():
+            handle.cancel()
+            left.append(item)
+        if left:
+            logger.warning("Dead-lettering %d notifications not delivered before shutdown", len(left))
+            await self._record_dead_letters(left, "Not delivered before shutdown")
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+        self._tasks = []
+        self._busy.clear()
+        self._deferred.clear()
+        self._unqueued = []
+        self._loop = None
+
+    async def _drain(self):
+        # Stop waiting out rate limits and backoff: late is better than never
+        for key, (handle, item) in list(self._deferred.items()):
+            if isinstance(handle, asyncio.TimerHandle):
+                handle.cancel()
+                self._release(key, item)
+        while self._deferred or any(self._busy.values()) or not self._queue.empty():
+            await asyncio.sleep(0.01)
+
+    # ---------- Intake ----------
+
+    def submit(self, reminders: list[dict]):
+        """
+        Queue due reminder occurrences. Called from the dispatcher thread;
+        blocks it while the queue is full so backpressure reaches the scheduler.
+        """
+        queued_at = self.clock()
+        items = [{"reminder": r, "attempt": 0, "tokens": None, "queuedAt": queued_at} for r in reminders]
+        self._counts["submitted"] += len(items)
+        loop = self._loop
+        if loop is None or self._closed:
+            # Already claimed by the dispatcher, so keep a record rather than drop them
+            logger.warning("Dead-lettering %d due reminders: notifications are not running", len(items))
+            entries = [self._dead_letter(item, None, "Notifications not running", attempted=False) for item in items]
+            self._counts["deadLettered"] += len(entries)
+            try:
+                repository.write_dead_letters(entries)
+            except Exception:
+                logger.exception("Writing %d notification dead letters failed", len(entries))
+            return
+        asyncio.run_coroutine_threadsafe(self._put_all(items), loop).result()
+
+    async def _put_all(self, items: list[dict]):
+        if self._closed:
+            await self._record_dead_letters(items, "Not delivered before shutdown")
+            return
+        task = asyncio.current_task()
+        self._intake.add(task)
+        queued = 0
+        try:
+            for item in items:
+                await self._queue.put(item)
+                queued += 1
+        except asyncio.CancelledError:
+            self._unqueued += items[queued:]  # stop() dead-letters these
+        finally:
+            self._intake.discard(task)
+
+    def _later(self, delay: float, item: dict):
+        key = next(self._keys)
+        handle = self._loop.call_later(0 if self._draining else delay, self._release, key, item)
+        self._deferred[key] = (handle, item)
+
+    def _release(self, key: int, item: dict):
+        # Stays in _deferred until it is actually back on the queue
+        self._deferred[key] = (self._spawn(self._requeue(key, item)), item)
+
+    async def _requeue(self, key: int, item: dict):
+        await self._queue.put(item)
+        self._deferred.pop(key, None)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = self._loop.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    # ---------- Workers ----------
+
+    async def _next_batch(self, batch: list[dict]):
+        batch.append(await self._queue.get())
+        deadline = self._loop.time() + self.batch_wait
+        while len(batch) < self.provider.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def _worker(self, index: int):
+        while True:
+            # Held in _busy from the first item on, so stop() can account for it
+            batch = self._busy[index] = []
+            await self._next_batch(batch)
+            ready = self._busy[index] = self._admit(batch)
+            if not ready:
+                continue
+            try:
+                await self._deliver(ready)
+            except Exception as exc:
+                # Only what was admitted; rate-limited items are already rescheduled
+                logger.warning("Notification batch failed: %s", exc)
+                for item in ready:
+                    self._retry(item, item["tokens"], str(exc))
+
+    def _admit(self, batch: list[dict]) -> list[dict]:
+        """Apply the per-user rate limit to new items; deferred ones are requeued via _later."""
+        if self._draining:
+            return batch
+        ready = []
+        for item in batch:
+            if item["attempt"] == 0:
+                wait = self.limiter.take(item["reminder"]["userId"])
+                if wait > 0:
+                    self._counts["rateLimited"] += 1
+                    self._later(wait, item)
+                    continue
+            ready.append(item)
+        return ready
+
+    async def _deliver(self, ready: list[dict]):
+        lookup = list({item["reminder"]["userId"] for item in ready if item["tokens"] is None})
+        tokens = await repository.get_device_tokens(lookup) if lookup else {}
+
+        messages = []  # (item, token, payload)
+        for item in ready:
+            reminder = item["reminder"]
+            if item["tokens"] is None:
+                item["tokens"] = tokens.get(reminder["userId"], [])
+            if not item["tokens"]:
+                self._counts["noDevice"] += 1
+                continue
+            payload = {
+                "title": reminder["title"],
+                "body": reminder.get("body", ""),
+                "data": {
+                    "type": "reminder",
+                    "reminderId": reminder["reminderId"],
+                    "occurrenceAt": reminder.get("occurrenceAt", reminder["triggerAt"]),
+                },
+            }
+            messages += [(item, token, {**payload, "token": token}) for token in item["tokens"]]
+
+        outcomes = []
+        for i in range(0, len(messages), self.provider.max_batch):
+            chunk = messages[i:i + self.provider.max_batch]
+            self._counts["batches"] += 1
+            self._counts["messages"] += len(chunk)
+            try:
+                outcomes += await self.provider.send([payload for _, _, payload in chunk])
+            except Exception as exc:
+                outcomes += [(RETRY, str(exc))] * len(chunk)
+
+        await self._settle(messages, outcomes)
+
+    async def _settle(self, messages: list[tuple], outcomes: list[tuple[str, str | None]]):
+        retry: dict[int, tuple[dict, list[str], str]] = {}
+        invalid: dict[str, list[str]] = {}
+        dead = []
+        done: dict[int, dict] = {}
+
+        for (item, token, _), (status, error) in zip(messages, outcomes):
+            if status == SENT:
+                self._counts["sent"] += 1
+            elif status == INVALID_TOKEN:
+                self._counts["invalidTokens"] += 1
+                invalid.setdefault(item["reminder"]["userId"], []).append(token)
+            elif status == RETRY and item["attempt"] + 1 < self.max_attempts:
+                retry.setdefault(id(item), (item, [], error))[1].append(token)
+            else:
+                dead.append(self._dead_letter(item, token, error))
+            done[id(item)] = item
+
+        now = self.clock()
+        for key, item in done.items():
+            if key not in retry:
+                self._latencies.append(now - item["queuedAt"])
+        for item, tokens, error in retry.values():
+            self._retry(item, tokens, error)
+        # Everything below is bookkeeping; failing it must not resend the batch
+        try:
+            for uid, tokens in invalid.items():
+                await repository.remove_device_tokens(uid, tokens)
+            if dead:
+                self._counts["deadLettered"] += len(dead)
+                await repository.add_dead_letters(dead)
+        except Exception:
+            logger.exception("Notification bookkeeping failed")
+
+    def _retry(self, item: dict, tokens: list[str] | None, error: str | None):
+        attempt = item["attempt"] + 1
+        if attempt >= self.max_attempts:
+            self._counts["deadLettered"] += len(tokens or [None])
+            entries = [self._dead_letter(item, token, error) for token in tokens or [None]]
+            self._spawn(self._write_dead_letters(entries))
+            return
+        self._counts["retried"] += 1
+        # Full jitter keeps retries from a failed batch from arriving together
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        self._later(delay, {**item, "attempt": attempt, "tokens": tokens})
+
+    async def _record_dead_letters(self, items: list[dict], error: str):
+        """Dead-letter items whose current attempt never ran, one entry per known device."""
+        entries = [self._dead_letter(item, token, error, attempted=False)
+                   for item in items for token in item["tokens"] or [None]]
+        self._counts["deadLettered"] += len(entries)
+        await self._write_dead_letters(entries)
+
+    async def _write_dead_letters(self, entries: list[dict]):
+        try:
+            await repository.add_dead_letters(entries)
+        except Exception:
+            logger.exception("Writing %d notification dead letters failed", len(entries))
+
+    def _dead_letter(self, item: dict, token: str | None, error: str | None, attempted: bool = True) -> dict:
+        reminder = item["reminder"]
+        return {
+            "reminderId": reminder["reminderId"],
+            "userId": reminder["userId"],
+            "occurrenceAt": reminder.get("occurrenceAt", reminder["triggerAt"]),
+            "token": token,
+            "error": error,
+            "attempts": item["attempt"] + attempted,
+            "createdAt": datetime.utcnow().isoformat(),
+        }
+
+    # ---------- Instrumentation ----------
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def pct(p: float) -> float | None:
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+
+        batches = self._counts["batches"]
+        return {
+            **self._counts,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "deferred": len(self._deferred),
+            "avgBatchSize": round(self._counts["messages"] / batches, 1) if batches else 0,
+            "latencyMs": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+        }
+
+
+def _make_provider():
+    if NOTIFY_PROVIDER == "fcm":
+        return FCMProvider()
+    if NOTIFY_PROVIDER == "log":
+        return LogProvider()
+    # "module:ClassName" for any other provider with the same send() interface
+    module_name, _, class_name = NOTIFY_PROVIDER.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+notifications = NotificationPipeline(
+    _make_provider(),
+    queue_size=NOTIFY_QUEUE_SIZE,
+    workers=NOTIFY_WORKERS,
+    batch_wait_ms=NOTIFY_BATCH_WAIT_MS,
+    max_attempts=NOTIFY_MAX_ATTEMPTS,
+    user_rate=NOTIFY_USER_RATE,
+    drain_seconds=NOTIFY_DRAIN_SECONDS,
+)
@@ -0,0 +1,132 @@
+# app/services/rate_limit.py
+# Admission control for the AI endpoints.
+#
+# Two token buckets are charged per call: one counting requests per user
+# and endpoint, and one counting estimated LLM tokens per user across all
+# endpoints. Buckets live in a backend with a single `take` operation (a
+# negative cost refunds, capped at the burst). The in-memory one is per
+# worker, so with several workers each enforces its own share unless
+# RATE_LIMIT_BACKEND points at a shared store.
+
+import importlib
+import time
+from app.config import (
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_REQUESTS,
+    RATE_LIMIT_TOKENS,
+)
+
+
+class MemoryBackend:
+    """Token buckets in a dict, pruned once they refill."""
+
+    MAX_KEYS = 100_000
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        # key -> (tokens, updated, time the bucket is full again)
+        self._buckets: dict[str, tuple[float, float, float]] = {}
+
+    async def take(self, key: str, cost: float, per_minute: float, burst: float) -> float:
+        """Consume `cost` from the bucket. Returns 0 if allowed, else seconds until it would be.
+        A negative cost puts tokens back."""
+        now = self.clock()
+        refill = per_minute / 60
+        cost = min(cost, burst)  # A single oversized call may drain a full bucket
+        tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+        tokens = min(burst, tokens + (now - updated) * refill)
+        allowed = tokens >= cost
+        if allowed:
+            tokens = min(burst, tokens - cost)
+        self._buckets[key] = (tokens, now, now + (burst - tokens) / refill)
+        if len(self._buckets) > self.MAX_KEYS:
+            self._prune(now)
+        return 0.0 if allowed else (cost - tokens) / refill
+
+    def _prune(self, now: float):
+        # Buckets that have refilled are the same as no bucket at all
+        full = [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]
+        for key in full:
+            del self._buckets[key]
+
+
+def parse_limits(spec: str) -> dict[str, float]:
+    """Parse "default=30,summarize=10" into {"default": 30.0, "summarize": 10.0}."""
+    limits = {}
+    for part in spec.split(","):
+        name, _, value = part.strip().partition("=")
+        if name and value:
+            limits[name] = float(value)
+    return limits
+
+
+class RateLimiter:
+    def __init__(self, backend, requests: dict[str, float], tokens_per_minute: float):
+        self.backend = backend
+        self.requests = requests
+        self.tokens_per_minute = tokens_per_minute
+        self._stats: dict[str, dict[str, int]] = {}
+
+    def _count(self, endpoint: str, outcome: str):
+        counts = self._stats.setdefault(endpoint, {"allowed": 0, "limited": 0})
+        counts[outcome] += 1
+
+    async def admit(self, uid: str, endpoint: str, tokens: int = 0) -> float:
+        """
+        Charge one request and `tokens` estimated tokens. Returns 0, or seconds to wait.
+        Nothing is charged for a call that is refused.
+        """
+        per_minute = self.requests.get(endpoint, self.requests.get("default", 0))
+        request_key = f"req:{endpoint}:{uid}"
+        if per_minute > 0:
+            wait = await self.backend.take(request_key, 1, per_minute, per_minute)
+            if wait:
+                self._count(endpoint, "limited")
+                return wait
+        if self.tokens_per_minute > 0 and tokens:
+            limit = self.tokens_per_minute
+            wait = await self.backend.take(f"tok:{uid}", tokens, limit, limit)
+            if wait:
+                # Give back the request slot, or clients retrying on 429 drain it too
+                if per_minute > 0:
+                    await self.backend.take(request_key, -1, per_minute, per_minute)
+                self._count(endpoint, "limited")
+                return wait
+        self._count(endpoint, "allowed")
+        return 0.0
+
+    async def settle(self, uid: str, charged: int, used: int):
+        """
+        Correct an admitted call's token charge to what it really used upstream.
+        The difference is refunded, or debited as far as the bucket goes;
+        a bucket can't go below empty, so a larger overrun isn't carried over.
+        """
+        if self.tokens_per_minute <= 0 or used == charged:
+            return
+        limit = self.tokens_per_minute
+        key = f"tok:{uid}"
+        extra = min(used - charged, limit)
+        wait = await self.backend.take(key, extra, limit, limit)
+        if wait and extra > 0:
+            # Refused: take() reports how far short the bucket is, so take what is there
+            available = int(extra - wait * limit / 60)
+            if available > 0:
+                await self.backend.take(key, available, limit, limit)
+
+    def stats(self) -> dict:
+        return {endpoint: dict(counts) for endpoint, counts in self._stats.items()}
+
+
+def _make_backend():
+    # RATE_LIMIT_BACKEND is "module:ClassName" for a shared store (e.g. Redis)
+    if not RATE_LIMIT_BACKEND:
+        return MemoryBackend()
+    module_name, _, class_name = RATE_LIMIT_BACKEND.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+rate_limiter = RateLimiter(
+    _make_backend(),
+    requests=parse_limits(RATE_LIMIT_REQUESTS),
+    tokens_per_minute=RATE_LIMIT_TOKENS,
+)
@@ -0,0 +1,125 @@
+# app/services/realtime.py
+# Fan-out hub that pushes new chat messages to connected clients.
+#
+# Every WebSocket / SSE connection gets a Subscription with a bounded
+# queue. Publishing goes through a broker so that several workers can
+# share events; the default broker only delivers within this process.
+
+import asyncio
+import importlib
+from app.config import REALTIME_BROKER, REALTIME_QUEUE_SIZE
+
+
+class Subscription:
+    """One connected client. Closed if it falls too far behind."""
+
+    def __init__(self, uid: str, max_queue: int):
+        self.uid = uid
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.closed = False
+
+    def offer(self, event: dict) -> bool:
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.close()
+            return False
+
+    def close(self):
+        """Drop anything queued and wake the consumer with a None sentinel."""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def next(self, timeout: float | None = None) -> dict | None:
+        """Next event, None once closed. Raises TimeoutError after `timeout`."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InProcessBroker:
+    """Delivers events to subscribers of this process only."""
+
+    async def start(self, deliver):
+        self._deliver = deliver
+
+    async def publish(self, uids: list[str], event: dict):
+        self._deliver(uids, event)
+
+    async def stop(self):
+        pass
+
+
+class Hub:
+    def __init__(self, broker, max_queue: int = 100):
+        self.broker = broker
+        self.max_queue = max_queue
+        self._subs: dict[str, set[Subscription]] = {}
+        self._started = False
+        self.delivered = 0
+        self.dropped = 0  # Slow consumers disconnected
+
+    async def _ensure_started(self):
+        if not self._started:
+            self._started = True
+            await self.broker.start(self._deliver)
+
+    async def subscribe(self, uid: str) -> Subscription:
+        await self._ensure_started()
+        sub = Subscription(uid, self.max_queue)
+        self._subs.setdefault(uid, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        subs = self._subs.get(sub.uid)
+        if subs:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.uid]
+        sub.close()
+
+    async def publish(self, uids: list[str], event: dict):
+        await self._ensure_started()
+        await self.broker.publish(uids, event)
+
+    def _deliver(self, uids: list[str], event: dict):
+        """Called by the broker with events for users connected here."""
+        for uid in uids:
+            for sub in list(self._subs.get(uid, ())):
+                if sub.offer(event):
+                    self.delivered += 1
+                else:
+                    self.dropped += 1
+                    self.unsubscribe(sub)
+
+    async def stop(self):
+        for subs in list(self._subs.values()):
+            for sub in list(subs):
+                self.unsubscribe(sub)
+        if self._started:
+            await self.broker.stop()
+            self._started = False
+
+    def stats(self) -> dict:
+        return {
+            "connections": sum(len(s) for s in self._subs.values()),
+            "users": len(self._subs),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+def _make_broker():
+    # REALTIME_BROKER is "module:ClassName" for a shared broker (e.g. Redis pub/sub)
+    if not REALTIME_BROKER:
+        return InProcessBroker()
+    module_name, _, class_name = REALTIME_BROKER.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+hub = Hub(_make_broker(), max_queue=REALTIME_QUEUE_SIZE)
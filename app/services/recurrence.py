@@ -0,0 +1,318 @@
+# app/services/recurrence.py
+# Recurrence rules for reminders.
+#
+# Occurrences are computed in the reminder's own time zone from a fixed
+# anchor (the first occurrence, as local wall-clock time), so "every month
+# on the 31st" clamps to the last day of shorter months without drifting,
+# Feb 29 yearly reminders fire on Feb 28 in common years, and a 09:00
+# reminder stays at 09:00 across DST changes. Daily/weekly/monthly/yearly
+# rules jump straight to the next occurrence after any instant; cron rules
+# skip whole months/days/hours that can't match.
+#
+# All datetimes leaving this module are naive UTC, matching triggerAt.
+# `triggerAtMs` (epoch milliseconds) is stored alongside for range queries.
+
+import calendar
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+SCHEDULE_TYPES = ("once", "daily", "weekly", "monthly", "yearly", "cron")
+CATCH_UP_POLICIES = ("once", "all", "skip")
+MAX_CATCH_UP = 100  # "all" fires at most this many missed occurrences
+CATCH_UP_GRACE = timedelta(minutes=5)  # "skip" still fires occurrences this late
+CRON_SEARCH_DAYS = 366 * 5  # Give up on cron rules that never match (e.g. Feb 30)
+
+EPOCH = datetime(1970, 1, 1)
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+_ONE_MINUTE = timedelta(minutes=1)
+
+
+# ---------- Time conversion ----------
+
+@lru_cache(maxsize=None)
+def get_zone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {name}")
+
+
+def to_ms(when: datetime) -> int:
+    return (when - EPOCH) // timedelta(milliseconds=1)
+
+
+def from_ms(ms: int) -> datetime:
+    return EPOCH + timedelta(milliseconds=ms)
+
+
+def parse_datetime(value: str, zone: tzinfo) -> datetime:
+    """ISO string as naive UTC. Strings without an offset are local to `zone`."""
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=zone)
+    return when.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_local(when: datetime, zone: tzinfo) -> datetime:
+    return when.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None)
+
+
+def to_utc(when: datetime, zone: ZoneInfo) -> datetime:
+    return when.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# ---------- Rules ----------
+
+def _cron_field(spec: str, low: int, high: int) -> tuple[int, ...]:
+    values = set()
+    for part in spec.split(","):
+        expr, _, step = part.partition("/")
+        if expr == "*":
+            start, end = low, high
+        elif "-" in expr:
+            start, end = (int(v) for v in expr.split("-", 1))
+        else:
+            start = end = int(expr)
+            if step:
+                end = high
+        step = int(step) if step else 1
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Invalid cron field: {spec}")
+        values.update(range(start, end + 1, step))
+    return tuple(sorted(values))
+
+
+class CronSpec:
+    """Standard 5-field cron: minute hour day-of-month month day-of-week."""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("Cron expressions need 5 fields: minute hour day month weekday")
+        self.minutes = _cron_field(fields[0], 0, 59)
+        self.hours = _cron_field(fields[1], 0, 23)
+        self.days = frozenset(_cron_field(fields[2], 1, 31))
+        self.months = frozenset(_cron_field(fields[3], 1, 12))
+        # Cron counts Sunday as 0 (or 7); Python's weekday() has Monday as 0
+        self.weekdays = frozenset((d - 1) % 7 for d in _cron_field(fields[4], 0, 7))
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, when: datetime) -> bool:
+        day_ok = when.day in self.days
+        weekday_ok = when.weekday() in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok  # Both restricted: cron matches either
+
+    def next_after(self, after: datetime) -> datetime | None:
+        when = after.replace(second=0, microsecond=0) + _ONE_MINUTE
+        midnight = timedelta(days=1)
+        for _ in range(CRON_SEARCH_DAYS):
+            if when.month not in self.months:
+                year, month = divmod(when.year * 12 + when.month, 12)
+                when = datetime(year, month + 1, 1)
+                continue
+            if not self._day_matches(when):
+                when = when.replace(hour=0, minute=0) + midnight
+                continue
+            i = bisect_left(self.hours, when.hour)
+            if i == len(self.hours):
+                when = when.replace(hour=0, minute=0) + midnight
+                continue
+            if self.hours[i] != when.hour:
+                when = when.replace(hour=self.hours[i], minute=0)
+            j = bisect_left(self.minutes, when.minute)
+            if j == len(self.minutes):
+                when = when.replace(minute=0) + timedelta(hours=1)
+                continue
+            return when.replace(minute=self.minutes[j])
+        return None
+
+
+class Rule:
+    def __init__(self, freq: str, interval: int = 1, by_day: tuple[int, ...] = (), cron: str | None = None):
+        if freq not in SCHEDULE_TYPES:
+            raise ValueError(f"Unknown schedule type: {freq}")
+        if interval < 1:
+            raise ValueError("interval must be at least 1")
+        if by_day and freq != "weekly":
+            raise ValueError("Weekdays can only be given for weekly reminders")
+        if (freq == "cron") != (cron is not None):
+            raise ValueError("Cron reminders need a cron expression")
+        self.freq = freq
+        self.interval = interval
+        self.by_day = tuple(sorted(set(by_day)))
+        self.cron = CronSpec(cron) if cron else None
+
+    def next_after(self, anchor: datetime, after: datetime) -> datetime | None:
+        """First occurrence strictly after `after`, in local wall-clock time."""
+        if self.freq == "once":
+            return anchor if anchor > after else None
+        if self.freq == "cron":
+            return self.cron.next_after(max(after, anchor - timedelta(microseconds=1)))
+        if self.freq in ("monthly", "yearly"):
+            return self._next_month(anchor, after)
+        if self.by_day:
+            return self._next_weekday(anchor, after)
+
+        period = timedelta(days=self.interval * (7 if self.freq == "weekly" else 1))
+        if after < anchor:
+            return anchor
+        return anchor + ((after - anchor) // period + 1) * period
+
+    def _next_month(self, anchor: datetime, after: datetime) -> datetime:
+        step = self.interval * (12 if self.freq == "yearly" else 1)
+        if after < anchor:
+            return anchor
+
+        def nth(k: int) -> datetime:
+            year, month = divmod(anchor.year * 12 + anchor.month - 1 + k * step, 12)
+            day = min(anchor.day, calendar.monthrange(year, month + 1)[1])
+            return anchor.replace(year=year, month=month + 1, day=day)
+
+        elapsed = (after.year - anchor.year) * 12 + after.month - anchor.month
+        k = elapsed // step
+        candidate = nth(k)
+        return candidate if candidate > after else nth(k + 1)
+
+    def _next_weekday(self, anchor: datetime, after: datetime) -> datetime:
+        week_start = anchor - timedelta(days=anchor.weekday())
+        period = timedelta(weeks=self.interval)
+        floor = max(after, anchor - timedelta(microseconds=1))
+        week = max(0, (floor - week_start) // period)
+        for w in (week, week + 1):
+            for day in self.by_day:
+                candidate = week_start + w * period + timedelta(days=day)
+                if candidate > floor:
+                    return candidate
+
+
+def parse_rrule(rrule: str) -> tuple[str, int, tuple[int, ...]]:
+    """Supported RRULE subset: FREQ, INTERVAL and (weekly) BYDAY. Returns (freq, interval, by_day)."""
+    parts = {}
+    for part in rrule.removeprefix("RRULE:").split(";"):
+        key, _, value = part.partition("=")
+        parts[key.upper()] = value.upper()
+    unsupported = set(parts) - {"FREQ", "INTERVAL", "BYDAY"}
+    if unsupported:
+        raise ValueError(f"Unsupported RRULE parts: {', '.join(sorted(unsupported))}")
+    freq = parts.get("FREQ", "").lower()
+    if freq not in ("daily", "weekly", "monthly", "yearly"):
+        raise ValueError(f"Unsupported RRULE frequency: {parts.get('FREQ')}")
+    try:
+        by_day = tuple(WEEKDAYS[d] for d in parts["BYDAY"].split(",")) if "BYDAY" in parts else ()
+    except KeyError:
+        raise ValueError(f"Invalid BYDAY: {parts['BYDAY']}")
+    return freq, int(parts.get("INTERVAL", "1")), by_day
+
+
+@lru_cache(maxsize=4096)
+def _rule(freq: str, interval: int, by_day: tuple[int, ...], cron: str | None) -> Rule:
+    return Rule(freq, interval, by_day, cron)
+
+
+# ---------- Reminders ----------
+
+def rule_for(reminder: dict) -> Rule:
+    return _rule(
+        reminder["scheduleType"],
+        reminder.get("interval", 1),
+        tuple(reminder.get("byDay", ())),
+        reminder.get("cron"),
+    )
+
+
+def trigger_time(reminder: dict) -> datetime:
+    """The reminder's next trigger as naive UTC."""
+    if "triggerAtMs" in reminder:
+        return from_ms(reminder["triggerAtMs"])
+    return parse_datetime(reminder["triggerAt"], timezone.utc)
+
+
+def trigger_fields(when: datetime) -> dict:
+    return {"triggerAt": when.isoformat(), "triggerAtMs": to_ms(when)}
+
+
+def occurrence_after(reminder: dict, after: datetime) -> datetime | None:
+    """Next occurrence strictly after `after` (naive UTC), or None if there isn't one."""
+    zone = get_zone(reminder.get("timezone", "UTC"))
+    anchor = (
+        datetime.fromisoformat(reminder["anchorAt"]) if "anchorAt" in reminder
+        else to_local(trigger_time(reminder), zone)
+    )
+    rule = rule_for(reminder)
+    local_after = to_local(after, zone)
+    # Wall-clock times repeat when clocks go back; step past any that map to <= after
+    for _ in range(3):
+        local = rule.next_after(anchor, local_after)
+        if local is None:
+            return None
+        when = to_utc(local, zone)
+        if when > after:
+            return when
+        local_after = local
+    return None
+
+
+def plan(reminder: dict, now: datetime) -> tuple[list[datetime], datetime | None]:
+    """
+    Apply the reminder's catch-up policy at `now`.
+    Returns (occurrences to fire, next trigger or None when it's finished).
+    """
+    trigger = trigger_time(reminder)
+    following = occurrence_after(reminder, max(now, trigger))
+    policy = reminder.get("catchUp", "once")
+
+    if policy == "skip":
+        fires = [trigger] if now - trigger <= CATCH_UP_GRACE else []
+    elif policy == "all":
+        fires = [trigger]
+        while len(fires) < MAX_CATCH_UP:
+            missed = occurrence_after(reminder, fires[-1])
+            if missed is None or missed > now:
+                break
+            fires.append(missed)
+    else:
+        fires = [trigger]  # Missed occurrences collapse into one
+    return fires, following
+
+
+def new_schedule(
+    schedule_type: str,
+    trigger_at: str,
+    zone_name: str = "UTC",
+    interval: int = 1,
+    cron: str | None = None,
+    rrule: str | None = None,
+    catch_up: str = "once",
+) -> dict:
+    """Validate a reminder's schedule and return the fields to store. Raises ValueError."""
+    zone = get_zone(zone_name)
+    by_day = ()
+    if rrule:
+        schedule_type, interval, by_day = parse_rrule(rrule)
+    if catch_up not in CATCH_UP_POLICIES:
+        raise ValueError(f"catch_up must be one of: {', '.join(CATCH_UP_POLICIES)}")
+    rule = Rule(schedule_type, interval, by_day, cron)
+
+    anchor = to_local(parse_datetime(trigger_at, zone), zone)
+    fields = {
+        "scheduleType": schedule_type,
+        "interval": interval,
+        "timezone": zone_name,
+        "anchorAt": anchor.isoformat(),
+        "catchUp": catch_up,
+    }
+    if by_day:
+        fields["byDay"] = list(by_day)
+    if cron:
+        fields["cron"] = cron
+
+    # The anchor itself may not match the rule (a cron minute, a weekday list)
+    first = rule.next_after(anchor, anchor - timedelta(microseconds=1))
+    if first is None:
+        raise ValueError("Schedule never fires")
+    return {**fields, **trigger_fields(to_utc(first, zone))}
@@ -0,0 +1,488 @@
+# app/services/repository.py
+# Non-blocking access to Firestore for the async route handlers.
+#
+# The firebase_admin client is synchronous, so every call is pushed onto a
+# bounded thread pool instead of running on the event loop. The pool size
+# caps how many Firestore round trips are in flight per worker.
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from firebase_admin import firestore
+from app.config import FIRESTORE_MAX_CONCURRENCY, SEND_MICROBATCH_MS
+from app.services import firebase, metrics
+
+_executor = ThreadPoolExecutor(
+    max_workers=FIRESTORE_MAX_CONCURRENCY,
+    thread_name_prefix="firestore",
+)
+
+BATCH_SIZE = 400  # Firestore allows at most 500 writes per batch
+
+
+def _op_name(fn) -> str:
+    # "list_notes.<locals>._query" -> "list_notes", "DocumentReference.get" as is
+    return getattr(fn, "__qualname__", "call").split(".<locals>")[0]
+
+
+async def run(fn, *args, **kwargs):
+    """Run a blocking Firestore call on the shared pool."""
+    loop = asyncio.get_running_loop()
+    with metrics.timed(metrics.FIRESTORE_SECONDS, _op_name(fn)):
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _db():
+    return firebase.db
+
+
+def _to_dicts(docs) -> list[dict]:
+    return [d.to_dict() for d in docs]
+
+
+# ---------- Users ----------
+
+async def get_user(uid: str) -> dict | None:
+    return await run(firebase.get_user, uid)
+
+
+async def save_user(uid: str, data: dict):
+    await run(firebase.create_or_update_user, uid, data)
+
+
+async def find_user_by_email(email: str) -> dict | None:
+    def _query():
+        users = _db().collection("users").where("email", "==", email).limit(1).get()
+        return users[0].to_dict() if users else None
+    return await run(_query)
+
+
+# ---------- Devices ----------
+
+async def add_device_token(uid: str, token: str):
+    await run(_db().collection("users").document(uid).set, {"fcmTokens": firestore.ArrayUnion([token])}, merge=True)
+
+
+async def remove_device_tokens(uid: str, tokens: list[str]):
+    await run(_db().collection("users").document(uid).set, {"fcmTokens": firestore.ArrayRemove(tokens)}, merge=True)
+
+
+async def get_device_tokens(uids: list[str]) -> dict[str, list[str]]:
+    """Push tokens for many users in one round trip."""
+    def _query():
+        refs = [_db().collection("users").document(uid) for uid in uids]
+        return {
+            snap.id: snap.to_dict().get("fcmTokens", [])
+            for snap in _db().get_all(refs, field_paths=["fcmTokens"])
+            if snap.exists
+        }
+    return await run(_query)
+
+
+def write_dead_letters(entries: list[dict]):
+    """Blocking version of add_dead_letters, for threads outside the event loop."""
+    collection = _db().collection("notificationDeadLetters")
+    for i in range(0, len(entries), BATCH_SIZE):
+        batch = _db().batch()
+        for entry in entries[i:i + BATCH_SIZE]:
+            batch.set(collection.document(), entry)
+        batch.commit()
+
+
+async def add_dead_letters(entries: list[dict]):
+    await run(write_dead_letters, entries)
+
+
+# ---------- Conversations ----------
+
+async def get_conversation(conv_id: str) -> dict | None:
+    def _get():
+        doc = _db().collection("conversations").document(conv_id).get()
+        return doc.to_dict() if doc.exists else None
+    return await run(_get)
+
+
+async def get_conversation_version(conv_id: str) -> str | None:
+    """Just the conversation's lastMessageAt, without the rest of the document."""
+    def _get():
+        doc = _db().collection("conversations").document(conv_id).get(field_paths=["lastMessageAt"])
+        return doc.to_dict().get("lastMessageAt") if doc.exists else None
+    return await run(_get)
+
+
+async def list_conversations(uid: str, limit: int = 50, before: str | None = None) -> list[dict]:
+    """The user's inbox, most recently active first. `before` is a lastMessageAt cursor."""
+    def _query():
+        query = _inbox(_db(), uid).order_by("lastMessageAt", direction="DESCENDING")
+        if before:
+            query = query.start_after({"lastMessageAt": before})
+        return _to_dicts(query.limit(limit).get())
+    return await run(_query)
+
+
+def pair_key(uid_a: str, uid_b: str) -> str:
+    """Order-independent key for the conversation between two users."""
+    return "_".join(sorted([uid_a, uid_b]))
+
+
+async def get_or_create_pair_conversation(key: str, conv_data: dict) -> dict:
+    """
+    Return the conversation for a pair of users, creating `conv_data` if
+    there isn't one. `conversationPairs/{key}` points at the conversation,
+    so the lookup is a point read and the create is race-free.
+    """
+    def _get_or_create():
+        db = _db()
+        pair_ref = db.collection("conversationPairs").document(key)
+
+        # Fast path, no transaction needed: the pair already has a conversation
+        pair = pair_ref.get()
+        if pair.exists:
+            conv = db.collection("conversations").document(pair.get("conversationId")).get()
+            if conv.exists:
+                return conv.to_dict()
+
+        @firestore.transactional
+        def _create(transaction):
+            pair = pair_ref.get(transaction=transaction)
+            if pair.exists:
+                conv_ref = db.collection("conversations").document(pair.get("conversationId"))
+                conv = conv_ref.get(transaction=transaction)
+                if conv.exists:
+                    return conv.to_dict()  # Someone else created it meanwhile
+
+            conv_ref = db.collection("conversations").document(conv_data["conversationId"])
+            transaction.set(conv_ref, conv_data)
+            transaction.set(pair_ref, {
+                "conversationId": conv_data["conversationId"],
+                "participants": conv_data["participants"],
+            })
+            for uid in conv_data["participants"]:
+                transaction.set(_inbox(db, uid).document(conv_data["conversationId"]), inbox_entry(conv_data))
+            return conv_data
+
+        return _create(db.transaction())
+    return await run(_get_or_create)
+
+
+async def update_conversation(conv_id: str, updates: dict):
+    await run(_db().collection("conversations").document(conv_id).update, updates)
+
+
+# ---------- Inbox ----------
+# users/{uid}/inbox/{conv_id} mirrors the conversation list fields and is
+# written in the same commit as every message (fan-out on write), so an
+# inbox load is one indexed read of the user's own small documents.
+
+INBOX_FIELDS = ["conversationId", "participants", "type", "lastMessage", "lastMessageAt"]
+
+
+def _inbox(db, uid: str):
+    return db.collection("users").document(uid).collection("inbox")
+
+
+def inbox_entry(conv: dict) -> dict:
+    """A new inbox document for a conversation, with nothing unread."""
+    entry = {field: conv[field] for field in INBOX_FIELDS if field in conv}
+    entry["participants"] = sorted(conv.get("participants", []))
+    entry["unreadCount"] = 0
+    return entry
+
+
+async def mark_conversation_read(uid: str, conv_id: str, read_at: str):
+    """Clear the user's unread count. Raises NotFound if the inbox entry doesn't exist."""
+    await run(_inbox(_db(), uid).document(conv_id).update, {"unreadCount": 0, "lastReadAt": read_at})
+
+
+# ---------- Messages ----------
+
+def _messages_in_order(conv_id: str):
+    # Messages can share a timestamp (batched sends, imports), so the
+    # document ID (the messageId) breaks ties and every position is unique
+    return (
+        _db().collection("conversations").document(conv_id)
+        .collection("messages")
+        .order_by("timestamp")
+        .order_by("__name__")
+    )
+
+
+def _position(position: tuple[str, str | None]) -> dict:
+    timestamp, message_id = position
+    return {"timestamp": timestamp, "__name__": message_id} if message_id else {"timestamp": timestamp}
+
+
+async def list_messages(conv_id: str, limit: int = 50, before: tuple[str, str | None] | None = None) -> list[dict]:
+    """
+    The newest `limit` messages, or the ones just older than `before`, a
+    (timestamp, messageId) position; without a messageId, older than the timestamp.
+    Returned oldest first.
+    """
+    def _query():
+        query = _messages_in_order(conv_id)
+        if before:
+            query = query.end_before(_position(before))
+        return _to_dicts(query.limit_to_last(limit).get())
+    return await run(_query)
+
+
+async def list_messages_after(conv_id: str, after: tuple[str, str | None] | None, limit: int) -> list[dict]:
+    """Messages after the (timestamp, messageId) position `after`, oldest first."""
+    def _query():
+        query = _messages_in_order(conv_id)
+        if after:
+            query = query.start_after(_position(after))
+        return _to_dicts(query.limit(limit).get())
+    return await run(_query)
+
+
+async def get_message(conv_id: str, msg_id: str) -> dict | None:
+    def _get():
+        doc = (
+            _db().collection("conversations").document(conv_id)
+            .collection("messages").document(msg_id).get()
+        )
+        return doc.to_dict() if doc.exists else None
+    return await run(_get)
+
+
+async def get_archive_boundary(conv_id: str) -> str | None:
+    """Timestamp of the newest archived message in a conversation, if any were archived."""
+    def _get():
+        doc = _db().collection("conversations").document(conv_id).get(field_paths=["archivedThroughAt"])
+        return doc.to_dict().get("archivedThroughAt") if doc.exists else None
+    return await run(_get)
+
+
+async def list_archive_segments(conv_id: str) -> list[dict]:
+    """The conversation's archived message segments, oldest first."""
+    def _query():
+        return _to_dicts(
+            _db().collection("conversations").document(conv_id)
+            .collection("archive")
+            .order_by("firstAt")
+            .get()
+        )
+    return await run(_query)
+
+
+def _write_messages(items: list[tuple[str, dict, dict, frozenset]]):
+    """
+    Write (conv_id, msg_data, preview, participants) items in one batched
+    commit, so messages, conversation previews and every participant's
+    inbox entry can never disagree.
+    """
+    db = _db()
+    batch = db.batch()
+    previews, senders, participants, sent = {}, {}, {}, {}
+    for conv_id, msg_data, preview, members in items:
+        conv_ref = db.collection("conversations").document(conv_id)
+        batch.set(conv_ref.collection("messages").document(msg_data["messageId"]), msg_data)
+        # Only the newest preview per conversation needs writing
+        if conv_id not in previews or preview["lastMessageAt"] >= previews[conv_id]["lastMessageAt"]:
+            previews[conv_id] = preview
+            senders[conv_id] = msg_data["senderId"]
+        participants[conv_id] = members
+        counts = sent.setdefault(conv_id, {})
+        counts[msg_data["senderId"]] = counts.get(msg_data["senderId"], 0) + 1
+    for conv_id, preview in previews.items():
+        batch.update(db.collection("conversations").document(conv_id), preview)
+        total = sum(sent[conv_id].values())
+        for uid in participants[conv_id]:
+            entry = {
+                "conversationId": conv_id,
+                "participants": sorted(participants[conv_id]),
+                "lastSenderId": senders[conv_id],
+                **preview,
+            }
+            # Everything in this commit that someone else sent is unread for this user
+            unread = total - sent[conv_id].get(uid, 0)
+            if unread:
+                entry["unreadCount"] = firestore.Increment(unread)
+            batch.set(_inbox(db, uid).document(conv_id), entry, merge=True)
+    batch.commit()
+
+
+class MessageBatcher:
+    """
+    Groups messages sent within `window_ms` of each other into a single
+    Firestore commit. Each caller still waits for its own write to land.
+    """
+
+    # Each message is one write plus at most one preview update and, for a
+    # two-person conversation, two inbox entries
+    MAX_MESSAGES = 120
+
+    def __init__(self, window_ms: float):
+        self.window = window_ms / 1000
+        self._pending: list[tuple[str, dict, dict, frozenset, asyncio.Future]] = []
+        self._timer = None
+        self._inflight: set[asyncio.Task] = set()  # Strong references until each commit lands
+        self.commits = 0
+        self.messages = 0
+
+    async def add(self, conv_id: str, msg_data: dict, preview: dict, participants: frozenset):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((conv_id, msg_data, preview, participants, future))
+        if len(self._pending) >= self.MAX_MESSAGES:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        items, self._pending = self._pending, []
+        if items:
+            task = asyncio.get_running_loop().create_task(self._commit(items))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def drain(self):
+        """Commit what is pending now and wait for every commit in flight (on shutdown)."""
+        self._flush()
+        while self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    async def _commit(self, items):
+        try:
+            await run(_write_messages, [item[:4] for item in items])
+        except Exception as exc:
+            for *_, future in items:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        self.commits += 1
+        self.messages += len(items)
+        for *_, future in items:
+            if not future.done():
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        return {"commits": self.commits, "messages": self.messages, "pending": len(self._pending),
+                "inFlight": len(self._inflight)}
+
+
+_message_batcher = MessageBatcher(SEND_MICROBATCH_MS) if SEND_MICROBATCH_MS > 0 else None
+
+
+def message_batcher_stats() -> dict:
+    return _message_batcher.stats() if _message_batcher else {}
+
+
+async def drain_messages():
+    """Land every batched message before shutdown."""
+    if _message_batcher:
+        await _message_batcher.drain()
+
+
+async def add_message(conv_id: str, msg_data: dict, preview: dict, participants: frozenset):
+    """Save a message and update the conversation preview and inboxes atomically."""
+    if _message_batcher:
+        await _message_batcher.add(conv_id, msg_data, preview, participants)
+    else:
+        await run(_write_messages, [(conv_id, msg_data, preview, participants)])
+
+
+async def add_messages(conv_id: str, messages: list[dict], preview: dict, participants: frozenset):
+    """Save several messages to one conversation in a single commit."""
+    await run(_write_messages, [(conv_id, m, preview, participants) for m in messages])
+
+
+# ---------- Notes ----------
+
+NOTE_LIST_FIELDS = ["noteId", "title", "snippet", "createdAt", "updatedAt"]
+
+
+async def list_notes(uid: str, limit: int = 50, before: str | None = None) -> list[dict]:
+    """Newest first, only the fields the list view needs. `before` is a createdAt cursor."""
+    def _query():
+        query = (
+            _db().collection("notes")
+            .select(NOTE_LIST_FIELDS)
+            .where("userId", "==", uid)
+            .order_by("createdAt", direction="DESCENDING")
+        )
+        if before:
+            query = query.start_after({"createdAt": before})
+        return _to_dicts(query.limit(limit).get())
+    return await run(_query)
+
+
+async def get_note(note_id: str) -> dict | None:
+    def _get():
+        doc = _db().collection("notes").document(note_id).get()
+        return doc.to_dict() if doc.exists else None
+    return await run(_get)
+
+
+async def create_note(note_id: str, data: dict):
+    await run(_db().collection("notes").document(note_id).set, data)
+
+
+async def update_note(note_id: str, updates: dict):
+    await run(_db().collection("notes").document(note_id).update, updates)
+
+
+async def delete_note(note_id: str):
+    await run(_db().collection("notes").document(note_id).delete)
+
+
+# ---------- Reminders ----------
+
+async def list_reminders(uid: str) -> list[dict]:
+    def _query():
+        return _to_dicts(
+            _db().collection("reminders")
+            .where("userId", "==", uid)
+            .where("isActive", "==", True)
+            .get()
+        )
+    return await run(_query)
+
+
+async def get_reminder(reminder_id: str) -> dict | None:
+    def _get():
+        doc = _db().collection("reminders").document(reminder_id).get()
+        return doc.to_dict() if doc.exists else None
+    return await run(_get)
+
+
+async def create_reminder(reminder_id: str, data: dict):
+    await run(_db().collection("reminders").document(reminder_id).set, data)
+
+
+async def create_reminders(reminders: list[dict]):
+    """Write many new reminders in as few batches as possible."""
+    def _write():
+        collection = _db().collection("reminders")
+        for i in range(0, len(reminders), BATCH_SIZE):
+            batch = _db().batch()
+            for data in reminders[i:i + BATCH_SIZE]:
+                batch.set(collection.document(data["reminderId"]), data)
+            batch.commit()
+    await run(_write)
+
+
+async def delete_reminder(reminder_id: str):
+    await run(_db().collection("reminders").document(reminder_id).delete)
+
+
+# ---------- Background jobs ----------
+
+async def create_job(job_id: str, data: dict):
+    await run(_db().collection("aiJobs").document(job_id).set, data)
+
+
+async def get_job(job_id: str) -> dict | None:
+    def _get():
+        doc = _db().collection("aiJobs").document(job_id).get()
+        return doc.to_dict() if doc.exists else None
+    return await run(_get)
+
+
+async def update_job(job_id: str, updates: dict):
+    await run(_db().collection("aiJobs").document(job_id).update, updates)
@@ -0,0 +1,358 @@
+# app/services/search_index.py
+# Full-text search over notes and chat messages.
+#
+# Documents live in a local SQLite file, kept current by the note and
+# message write paths and rebuilt from Firestore with
+# `python -m scripts.rebuild_search_index`. The index is partitioned by
+# user: every indexed term is prefixed with an opaque token for a user
+# allowed to see the document (the note owner, or each of the
+# conversation's participants), so a query only ever walks the caller's
+# own posting lists. A message is indexed once per participant.
+#
+# The FTS5 table is contentless; titles and bodies are kept in
+# search_docs, and highlights and snippets are cut from them here.
+#
+# The file is shared by workers on the same host (WAL mode). Separate hosts
+# each keep their own copy. Each process opens its own connection, in the
+# app lifespan or on first use; nothing is opened at import.
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from app.config import SEARCH_INDEX_PATH
+from app.services import repository
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_docs (
+    row INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    parent_id TEXT NOT NULL,
+    owners TEXT NOT NULL,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_terms USING fts5(
+    title, body,
+    content = '',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+# Tables from before the index was partitioned by user
+_LEGACY_TABLES = ("search", "search_keys")
+
+# Letters and digits only: the tokenizer splits on anything else, '_' included
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+MAX_TERMS = 8
+SNIPPET_WORDS = 16
+REINDEX_DELAY = 5            # Seconds before failed index writes are retried
+MAX_REINDEX_QUEUE = 10_000   # Failed writes kept for retry; beyond this, rebuild the index
+
+# bm25 column weights: a title match counts for more than a body match
+_RANK = "bm25(search_terms, 4.0, 1.0)"
+
+
+def owner_token(uid: str) -> str:
+    # uids are case-sensitive but the tokenizer folds case, so hash them
+    return "u" + hashlib.sha256(uid.encode()).hexdigest()[:24]
+
+
+def words(text: str) -> list[str]:
+    """Words as the tokenizer sees them: case and diacritics folded."""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return _WORD.findall(folded)
+
+
+def _terms(tokens: list[str], text: str) -> str:
+    # Each word once per owner, glued to the owner's token
+    found = words(text)
+    return " ".join(token + word for token in tokens for word in found)
+
+
+def build_query(uid: str, text: str) -> tuple[str, list[str]] | None:
+    """
+    User input as an FTS5 query over the caller's partition: every word
+    must match, as a prefix. Also returns the folded words, for highlighting.
+    """
+    found = words(text)[:MAX_TERMS]
+    if not found:
+        return None
+    token = owner_token(uid)
+    return " AND ".join(f'"{token}{word}"*' for word in found), found
+
+
+def _matches(word: str, prefixes: list[str]) -> bool:
+    folded = words(word)
+    return bool(folded) and any(folded[0].startswith(prefix) for prefix in prefixes)
+
+
+def highlight(text: str, prefixes: list[str]) -> str:
+    return _WORD.sub(lambda m: f"<mark>{m.group()}</mark>" if _matches(m.group(), prefixes) else m.group(), text)
+
+
+def snippet(text: str, prefixes: list[str], size: int = SNIPPET_WORDS) -> str:
+    """About `size` words of `text` around the first match, matches marked up."""
+    spans = list(_WORD.finditer(text))
+    if not spans:
+        return text
+    first = next((i for i, m in enumerate(spans) if _matches(m.group(), prefixes)), 0)
+    start = max(0, min(first - size // 4, len(spans) - size))
+    end = min(len(spans), start + size)
+    # Whole text on a side that isn't cut, so leading/trailing punctuation stays
+    left = spans[start].start() if start else 0
+    right = spans[end - 1].end() if end < len(spans) else len(text)
+    cut = highlight(text[left:right], prefixes)
+    return ("…" if start else "") + cut + ("…" if end < len(spans) else "")
+
+
+class SearchIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._reindex: list[tuple] = []
+        self._reindex_timer = None
+        self._counts = dict.fromkeys(("writeErrors", "reindexed", "reindexDropped"), 0)
+        os.register_at_fork(after_in_child=self._forget)
+
+    def _db(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # The index can always be rebuilt
+            legacy = conn.execute(
+                f"SELECT name FROM sqlite_master WHERE name IN ({', '.join('?' * len(_LEGACY_TABLES))})",
+                _LEGACY_TABLES,
+            ).fetchall()
+            if legacy:
+                print("Search index is in the old unpartitioned format; dropping it. "
+                      "Run `python -m scripts.rebuild_search_index` to repopulate.")
+                for table in _LEGACY_TABLES:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.executescript(_SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def open(self):
+        """Open this process's connection now rather than on the first query."""
+        with self._lock:
+            self._db()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _forget(self):
+        # A connection (or a held lock) inherited across fork() must not be used by the child
+        self._lock = threading.Lock()
+        self._conn = None
+
+    # ---------- Writes ----------
+
+    def _remove(self, db: sqlite3.Connection, key: str) -> tuple | None:
+        """Drop a document and its terms. Returns its (owners, title, body) if it existed."""
+        found = db.execute("SELECT row, owners, title, body FROM search_docs WHERE key = ?", (key,)).fetchone()
+        if not found:
+            return None
+        row, owners, title, body = found
+        tokens = owners.split()
+        # A contentless table deletes by being given the exact values it indexed
+        db.execute(
+            "INSERT INTO search_terms (search_terms, rowid, title, body) VALUES ('delete', ?, ?, ?)",
+            (row, _terms(tokens, title), _terms(tokens, body)),
+        )
+        db.execute("DELETE FROM search_docs WHERE row = ?", (row,))
+        return owners, title, body
+
+    def _upsert(self, kind: str, doc_id: str, parent_id: str, owners, title: str, body: str, created_at: str):
+        key = f"{kind}:{doc_id}"
+        tokens = [owner_token(uid) for uid in owners]
+        db = self._db()
+        self._remove(db, key)
+        cursor = db.execute(
+            "INSERT INTO search_docs (key, kind, doc_id, parent_id, owners, title, body, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, kind, doc_id, parent_id, " ".join(tokens), title, body, created_at),
+        )
+        db.execute(
+            "INSERT INTO search_terms (rowid, title, body) VALUES (?, ?, ?)",
+            (cursor.lastrowid, _terms(tokens, title), _terms(tokens, body)),
+        )
+
+    def upsert_many(self, docs: list[tuple]):
+        """Insert or replace (kind, doc_id, parent_id, owners, title, body, created_at) rows."""
+        with self._lock:
+            for doc in docs:
+                self._upsert(*doc)
+            self._db().commit()
+
+    def _update_note(self, note_id: str, fields: dict):
+        if fields.get("title") is None and fields.get("summary") is None:
+            return
+        key = f"note:{note_id}"
+        with self._lock:
+            db = self._db()
+            current = db.execute(
+                "SELECT row, owners, title, body, created_at FROM search_docs WHERE key = ?", (key,)
+            ).fetchone()
+            if not current:
+                return
+            row, owners, title, body, created_at = current
+            title = fields["title"] if fields.get("title") is not None else title
+            body = fields["summary"] if fields.get("summary") is not None else body
+            tokens = owners.split()
+            self._remove(db, key)
+            db.execute(
+                "INSERT INTO search_docs (row, key, kind, doc_id, parent_id, owners, title, body, created_at) "
+                "VALUES (?, ?, 'note', ?, '', ?, ?, ?, ?)",
+                (row, key, note_id, owners, title, body, created_at),
+            )
+            db.execute(
+                "INSERT INTO search_terms (rowid, title, body) VALUES (?, ?, ?)",
+                (row, _terms(tokens, title), _terms(tokens, body)),
+            )
+            db.commit()
+
+    def _delete(self, kind: str, doc_id: str):
+        with self._lock:
+            db = self._db()
+            if self._remove(db, f"{kind}:{doc_id}"):
+                db.commit()
+
+    def clear(self):
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT INTO search_terms (search_terms) VALUES ('delete-all')")
+            db.execute("DELETE FROM search_docs")
+            db.commit()
+
+    def optimize(self):
+        """Merge index segments; worth running after a bulk load."""
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT INTO search_terms (search_terms) VALUES ('optimize')")
+            db.commit()
+
+    # ---------- Queries ----------
+
+    def _search(self, uid: str, text: str, kind: str | None, limit: int) -> list[dict]:
+        query = build_query(uid, text)
+        if query is None:
+            return []
+        match, prefixes = query
+        # Every term carries the caller's token, so nothing outside their partition can match
+        sql = (
+            f"SELECT d.kind, d.doc_id, d.parent_id, d.created_at, d.title, d.body, {_RANK} AS score "
+            f"FROM search_terms JOIN search_docs d ON d.row = search_terms.rowid "
+            f"WHERE search_terms MATCH ?"
+        )
+        params: list = [match]
+        if kind:
+            sql += " AND d.kind = ?"
+            params.append(kind)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db().execute(sql, params).fetchall()
+        return [
+            {
+                "kind": kind,
+                "id": doc_id,
+                "conversationId": parent_id or None,
+                "createdAt": created_at,
+                "title": highlight(title, prefixes),
+                "snippet": snippet(body, prefixes),
+                "score": -score,
+            }
+            for kind, doc_id, parent_id, created_at, title, body, score in rows
+        ]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT count(*) FROM search_docs").fetchone()[0]
+
+    # ---------- Reindex queue ----------
+    # Index writes happen after the Firestore write has committed, so a
+    # SQLite error (locked, disk full) mustn't fail the request: a retry
+    # would duplicate the message or note. Failed writes are logged and
+    # redone later from the source of truth instead.
+
+    def _queue_reindex(self, item: tuple):
+        if len(self._reindex) >= MAX_REINDEX_QUEUE:
+            self._counts["reindexDropped"] += 1  # scripts.rebuild_search_index repairs these
+            return
+        self._reindex.append(item)
+        if self._reindex_timer is None:
+            loop = asyncio.get_running_loop()
+            self._reindex_timer = loop.call_later(REINDEX_DELAY, lambda: asyncio.ensure_future(self._run_reindex()))
+
+    async def _run_reindex(self):
+        self._reindex_timer = None
+        items, self._reindex = self._reindex, []
+        for item in items:
+            try:
+                if item[0] == "note":
+                    # Re-read the note, so a later edit isn't overwritten by a stale retry
+                    note = await repository.get_note(item[1])
+                    if note:
+                        await asyncio.to_thread(self.upsert_many, [note_row(note)])
+                    else:
+                        await asyncio.to_thread(self._delete, "note", item[1])
+                else:
+                    _, conv_id, participants, messages = item
+                    await asyncio.to_thread(self.upsert_many, [message_row(conv_id, participants, m) for m in messages])
+                self._counts["reindexed"] += 1
+            except Exception as exc:
+                print(f"Search reindex failed, retrying later: {exc}")
+                self._queue_reindex(item)
+
+    async def _write(self, fn, *args, reindex: tuple):
+        try:
+            await asyncio.to_thread(fn, *args)
+        except sqlite3.Error as exc:
+            print(f"Search index write failed, queued for reindex: {exc}")
+            self._counts["writeErrors"] += 1
+            self._queue_reindex(reindex)
+
+    def stats(self) -> dict:
+        return {**self._counts, "reindexQueued": len(self._reindex)}
+
+    # ---------- Async API for the routes ----------
+
+    async def search(self, uid: str, text: str, kind: str | None = None, limit: int = 20) -> list[dict]:
+        return await asyncio.to_thread(self._search, uid, text, kind, limit)
+
+    async def index_note(self, note: dict):
+        await self._write(self.upsert_many, [note_row(note)], reindex=("note", note["noteId"]))
+
+    async def update_note(self, note_id: str, fields: dict):
+        await self._write(self._update_note, note_id, fields, reindex=("note", note_id))
+
+    async def delete_note(self, note_id: str):
+        await self._write(self._delete, "note", note_id, reindex=("note", note_id))
+
+    async def index_messages(self, conv_id: str, participants, messages: list[dict]):
+        rows = [message_row(conv_id, participants, m) for m in messages]
+        await self._write(self.upsert_many, rows, reindex=("messages", conv_id, participants, messages))
+
+
+def note_row(note: dict) -> tuple:
+    return ("note", note["noteId"], "", [note["userId"]], note.get("title", ""), note.get("summary", ""), note["createdAt"])
+
+
+def message_row(conv_id: str, participants, message: dict) -> tuple:
+    return ("message", message["messageId"], conv_id, participants, "", message.get("text", ""), message["timestamp"])
+
+
+search_index = SearchIndex(SEARCH_INDEX_PATH)
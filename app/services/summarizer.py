@@ -0,0 +1,85 @@
+# app/services/summarizer.py
+# Incremental, rolling conversation summaries.
+#
+# Each conversation document keeps a running `summary` plus a high-water
+# mark (`summarizedThroughAt` / `summarizedThroughId`) for the last message
+# folded into it. A new request only summarizes messages after the mark,
+# so the text sent upstream stays bounded however long the chat gets.
+
+import asyncio
+from app.config import SUMMARY_CHUNK_TOKENS, SUMMARY_MERGE_FANIN
+from app.services import archive, repository
+from app.services.ai_service import summarize_conversation, merge_summaries
+
+PAGE_SIZE = 500  # Messages fetched from Firestore per fold
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text
+    return len(text) // 4 + 1
+
+
+def chunk_messages(messages: list[dict], max_tokens: int = SUMMARY_CHUNK_TOKENS) -> list[list[dict]]:
+    """Split messages into consecutive chunks of at most ~max_tokens each."""
+    chunks, current, size = [], [], 0
+    for m in messages:
+        tokens = estimate_tokens(f"{m['senderId']}: {m['text']}")
+        if current and size + tokens > max_tokens:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(m)
+        size += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _reduce(summaries: list[str]) -> str:
+    """Merge summaries hierarchically, at most SUMMARY_MERGE_FANIN at a time."""
+    fanin = max(2, SUMMARY_MERGE_FANIN)
+    while len(summaries) > 1:
+        groups = [summaries[i:i + fanin] for i in range(0, len(summaries), fanin)]
+        summaries = await asyncio.gather(*[_merge(group) for group in groups])
+    return summaries[0]
+
+
+async def _merge(group: list[str]) -> str:
+    return group[0] if len(group) == 1 else await merge_summaries(group)
+
+
+async def fold_messages(previous: str, messages: list[dict]) -> str:
+    """Map: summarize each chunk. Reduce: merge them into the previous summary."""
+    chunks = chunk_messages(messages)
+    partials = await asyncio.gather(*[summarize_conversation(chunk) for chunk in chunks])
+    if previous:
+        partials = [previous, *partials]
+    return await _reduce(list(partials))
+
+
+async def summarize_incremental(conv_id: str, conv: dict) -> str:
+    """
+    Bring the stored summary of a conversation up to date and return it.
+    Progress is saved after every page, so an interrupted run isn't wasted.
+    """
+    summary = conv.get("summary", "")
+    after = None
+    if conv.get("summarizedThroughAt"):
+        after = (conv["summarizedThroughAt"], conv.get("summarizedThroughId"))
+
+    while True:
+        messages = await archive.messages_after(conv_id, after, PAGE_SIZE)
+        if not messages:
+            break
+
+        summary = await fold_messages(summary, messages)
+        after = (messages[-1]["timestamp"], messages[-1]["messageId"])
+        await repository.update_conversation(conv_id, {
+            "summary": summary,
+            "summarizedThroughAt": after[0],
+            "summarizedThroughId": after[1],
+        })
+
+        if len(messages) < PAGE_SIZE:
+            break
+
+    return summary
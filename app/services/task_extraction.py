@@ -0,0 +1,182 @@
+# app/services/task_extraction.py
+# Batched task extraction, run as background jobs.
+#
+# A job takes many messages, packs them into as few model calls as the
+# token budget allows and stores per-message results on `aiJobs/{jobId}`,
+# which clients poll. A call whose reply can't be read is split in half and
+# retried, so one bad message costs a couple of extra calls instead of the
+# whole batch. Dated tasks can be turned into reminders in one batched write.
+#
+# Jobs run on the worker that accepted them; a job whose worker dies stays
+# "running" and has to be resubmitted.
+
+import asyncio
+import uuid
+from datetime import datetime
+from app.config import (
+    EXTRACT_BATCH_TOKENS,
+    EXTRACT_BATCH_ITEMS,
+    EXTRACT_CONCURRENCY,
+    EXTRACT_REMINDER_TIME,
+    REMINDER_SHARDS,
+)
+from app.scheduler import dispatcher
+from app.services import recurrence, repository
+from app.services.acl_cache import acl_cache
+from app.services.ai_service import extract_tasks_batch
+from app.services.coordination import shard_for
+from app.services.summarizer import estimate_tokens
+
+# Extracted "repeat" values and the reminder schedule each one becomes
+REPEAT_SCHEDULES = {"none": "once", "daily": "daily", "weekly": "weekly", "monthly": "monthly", "yearly": "yearly"}
+
+_jobs: set[asyncio.Task] = set()  # Strong references so running jobs aren't collected
+
+
+def pack(items: list[tuple[str, str]], max_tokens: int = EXTRACT_BATCH_TOKENS,
+         max_items: int = EXTRACT_BATCH_ITEMS) -> list[list[tuple[str, str]]]:
+    """Split (id, text) items into consecutive chunks that fit one call each."""
+    chunks, current, size = [], [], 0
+    for item in items:
+        tokens = estimate_tokens(item[1])
+        if current and (size + tokens > max_tokens or len(current) >= max_items):
+            chunks.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _extract(chunk: list[tuple[str, str]], today: str) -> dict[str, list[dict] | str]:
+    """Tasks per id, or an error string for ids that couldn't be extracted."""
+    try:
+        results: dict = await extract_tasks_batch(chunk, today)
+    except ValueError:
+        results = {}
+    except Exception as exc:
+        print(f"Task extraction call failed: {exc}")
+        return {item_id: "AI service unavailable" for item_id, _ in chunk}
+
+    missing = [item for item in chunk if item[0] not in results]
+    if len(missing) == 1 and len(chunk) == 1:
+        return {missing[0][0]: "Unreadable AI response"}
+    if missing:
+        mid = (len(missing) + 1) // 2
+        for half in (missing[:mid], missing[mid:]):
+            if half:
+                results.update(await _extract(half, today))
+    return results
+
+
+def _reminders_for(uid: str, zone: str, results: list[dict], now: datetime) -> list[dict]:
+    """New reminders for dated tasks; recorded on each result as `reminderIds`."""
+    reminders = []
+    for result in results:
+        for task in result.get("tasks", []):
+            if not task.get("date"):
+                continue
+            try:
+                schedule = recurrence.new_schedule(
+                    REPEAT_SCHEDULES.get(task.get("repeat"), "once"),
+                    f"{task['date']}T{EXTRACT_REMINDER_TIME}",
+                    zone,
+                    catch_up="skip",
+                )
+            except ValueError:
+                continue  # Not a real date
+            if schedule["scheduleType"] == "once" and schedule["triggerAtMs"] < recurrence.to_ms(now):
+                continue  # Already past
+            rem_id = str(uuid.uuid4())
+            reminders.append({
+                "reminderId": rem_id,
+                "userId": uid,
+                "title": task["task"],
+                "body": "",
+                **schedule,
+                "isActive": True,
+                "shard": shard_for(uid, REMINDER_SHARDS),
+                "sourceConversationId": result.get("conversationId"),
+                "createdAt": now.isoformat(),
+            })
+            result.setdefault("reminderIds", []).append(rem_id)
+    return reminders
+
+
+async def _run(job: dict, items: list[dict], zone: str):
+    job_id = job["jobId"]
+    await repository.update_job(job_id, {"status": "running", "updatedAt": datetime.utcnow().isoformat()})
+
+    today = recurrence.to_local(datetime.utcnow(), recurrence.get_zone(zone)).date().isoformat()
+    semaphore = asyncio.Semaphore(EXTRACT_CONCURRENCY)
+    extracted: dict[str, list[dict] | str] = {}
+
+    async def _chunk(chunk):
+        async with semaphore:
+            extracted.update(await _extract(chunk, today))
+        await repository.update_job(job_id, {"processed": len(extracted), "updatedAt": datetime.utcnow().isoformat()})
+
+    chunks = pack([(item["id"], item["text"]) for item in items])
+    await asyncio.gather(*(_chunk(chunk) for chunk in chunks))
+
+    results = []
+    for item in items:
+        outcome = extracted.get(item["id"], "Unreadable AI response")
+        result = {"id": item["id"], "conversationId": item.get("conversationId")}
+        if isinstance(outcome, str):
+            result["error"] = outcome
+        else:
+            result["tasks"] = outcome
+        results.append(result)
+
+    now = datetime.utcnow()
+    updates = {"status": "done", "calls": len(chunks), "results": results}
+    if job["createReminders"]:
+        reminders = _reminders_for(job["userId"], zone, results, now)
+        if reminders:
+            await repository.create_reminders(reminders)
+            for data in reminders:
+                acl_cache.put("reminder", data["reminderId"], [job["userId"]])
+                dispatcher.schedule(data)
+        updates["remindersCreated"] = len(reminders)
+    await repository.update_job(job_id, {**updates, "updatedAt": now.isoformat()})
+
+
+async def _run_guarded(job: dict, items: list[dict], zone: str):
+    try:
+        await _run(job, items, zone)
+    except Exception as exc:
+        print(f"Task extraction job {job['jobId']} failed: {exc}")
+        try:
+            await repository.update_job(job["jobId"], {
+                "status": "failed",
+                "error": "Job failed",
+                "updatedAt": datetime.utcnow().isoformat(),
+            })
+        except Exception:
+            pass
+
+
+async def start_job(uid: str, items: list[dict], zone: str, create_reminders: bool = False) -> dict:
+    """
+    Queue extraction of [{"id", "text", "conversationId"?}] items for `uid`.
+    Returns the job document; progress and results are written back to it.
+    """
+    now = datetime.utcnow().isoformat()
+    job = {
+        "jobId": str(uuid.uuid4()),
+        "userId": uid,
+        "kind": "extract-tasks",
+        "status": "queued",
+        "total": len(items),
+        "processed": 0,
+        "createReminders": create_reminders,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+    await repository.create_job(job["jobId"], job)
+    task = asyncio.create_task(_run_guarded(job, items, zone))
+    _jobs.add(task)
+    task.add_done_callback(_jobs.discard)
+    return job
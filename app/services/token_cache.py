@@ -0,0 +1,81 @@
+# app/services/token_cache.py
+# In-process cache of verified Firebase ID tokens
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from app.config import TOKEN_CACHE_SIZE
+
+
+class TokenCache:
+    """
+    Bounded LRU of decoded ID tokens keyed by a hash of the raw token.
+    Entries expire at the token's own `exp` claim, so a cached token is
+    never accepted for longer than Firebase itself would accept it.
+    """
+
+    def __init__(self, max_size: int = 10_000, clock=time.time):
+        self.max_size = max_size
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Never keep raw bearer tokens around in memory as dict keys
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> dict | None:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, decoded = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return decoded
+
+    def put(self, token: str, decoded: dict):
+        expires_at = decoded.get("exp")
+        if self.max_size <= 0 or not expires_at or expires_at <= self.clock():
+            return  # Nothing to gain from caching a token that is already dead
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (float(expires_at), decoded)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxSize": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+token_cache = TokenCache(max_size=TOKEN_CACHE_SIZE)
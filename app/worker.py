@@ -0,0 +1,33 @@
+# app/worker.py
+# Standalone reminder worker: the scheduler and push notifications without the API.
+#
+# Run with SCHEDULER_IN_API=false on the API processes so they start fast and
+# skip the shard leases; run one or more of these next to them instead.
+#
+# Usage: python -m app.worker
+
+import asyncio
+import signal
+from app.scheduler import start_scheduler, stop_scheduler
+from app.services import firebase
+from app.services.notification import notifications
+
+
+async def main():
+    firebase.init_app()
+    await notifications.start()
+    await asyncio.to_thread(start_scheduler)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+
+    print("⏰ Reminder worker stopping")
+    await asyncio.to_thread(stop_scheduler)
+    await notifications.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+# bench/app_client.py
+# The API in-process against the fakes, for the single-feature benchmarks.
+#
+# Like bench/run.py, but without the mock OpenAI server: embeddings use the
+# deterministic "fake" provider and the scheduler isn't started. Call
+# configure() before anything imports `app`.
+
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+
+def configure(**overrides: str):
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    defaults = {
+        "FIREBASE_BACKEND": "bench.fake_firestore",
+        "OPENAI_API_KEY": "sk-bench",
+        "EMBEDDINGS_PROVIDER": "fake",
+        "NOTIFY_PROVIDER": "log",
+        "SCHEDULER_IN_API": "false",
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search.sqlite3"),
+        "EMBEDDINGS_PATH": os.path.join(workdir, "embeddings.sqlite3"),
+        "AI_CACHE_PATH": os.path.join(workdir, "ai_cache.sqlite3"),
+        **overrides,
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def auth(uid: str) -> dict:
+    return {"Authorization": f"Bearer t:{uid}"}
+
+
+@asynccontextmanager
+async def client():
+    """An httpx client talking to the app through ASGI, inside its lifespan."""
+    import httpx
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as http:
+            yield http
+
+
+async def login(http, *uids: str):
+    for uid in uids:
+        await http.post("/v1/auth/login", json={"id_token": f"t:{uid}"})
@@ -0,0 +1,116 @@
+# bench/conversations.py
+# Finding the existing chat between two users, by how many chats one has.
+#
+# "before" is the lookup start_conversation did before pair keys: every
+# conversation containing the caller (array_contains, no limit), scanned in
+# Python for the recipient. "after" is repository.get_or_create_pair_conversation,
+# a point read of conversationPairs/{pairKey} and then of the conversation.
+# The Firestore fake sleeps `--latency-ms` per call; document reads are what
+# Firestore bills, and bytes what it sends back.
+#
+# Usage: python -m bench.conversations --sizes 1,100,10000 --repeats 20 --latency-ms 10
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+
+
+def _seed(db, uid: str, count: int):
+    from app.services.repository import pair_key
+
+    batch = db.batch()
+    for i in range(count):
+        partner = f"{uid}-friend-{i}"
+        key = pair_key(uid, partner)
+        conv_id = f"{uid}-conv-{i}"
+        conv = {
+            "conversationId": conv_id,
+            "participants": [uid, partner],
+            "pairKey": key,
+            "type": "known",
+            "lastMessage": "see you tomorrow",
+            "lastMessageAt": datetime(2026, 1, 1).isoformat(),
+            "createdAt": datetime(2026, 1, 1).isoformat(),
+        }
+        batch.set(db.collection("conversations").document(conv_id), conv)
+        batch.set(db.collection("conversationPairs").document(key), {"conversationId": conv_id, "participants": conv["participants"]})
+        if len(batch) >= 400:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+
+
+async def _measure(db, repeats: int, lookup) -> dict:
+    timings, sizes = [], []
+    db.stats.reset()
+    for _ in range(repeats):
+        started = time.perf_counter()
+        documents = await lookup()
+        timings.append(time.perf_counter() - started)
+        sizes.append(len(json.dumps(documents)))
+    stats = db.stats.snapshot()
+    return {
+        "medianMs": round(statistics.median(timings) * 1000, 2),
+        "maxMs": round(max(timings) * 1000, 2),
+        "readsPerLookup": stats["reads"] / repeats,
+        "rpcsPerLookup": stats["rpcs"] / repeats,
+        "conversationBytes": sizes[0],
+    }
+
+
+async def run(db, sizes: list[int], repeats: int) -> dict:
+    from app.services import repository
+
+    report = {}
+    for count in sizes:
+        uid = f"user{count}"
+        partner = f"{uid}-friend-{count // 2}"
+
+        async def before():
+            # What start_conversation did before pair keys
+            def _scan():
+                docs = db.collection("conversations").where("participants", "array_contains", uid).get()
+                return [doc.to_dict() for doc in docs]
+            existing = await repository.run(_scan)
+            assert any(partner in c["participants"] for c in existing)
+            return existing
+
+        async def after():
+            # The conversation is found, so conv_data is never written
+            return [await repository.get_or_create_pair_conversation(repository.pair_key(uid, partner), {})]
+
+        report[str(count)] = {
+            "before": await _measure(db, repeats, before),
+            "after": await _measure(db, repeats, after),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the conversation scan with the pair-key point read.")
+    parser.add_argument("--sizes", default="1,100,10000", help="Conversations per user, comma-separated")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=10, help="Simulated Firestore round trip")
+    args = parser.parse_args()
+
+    os.environ.setdefault("FIREBASE_BACKEND", "bench.fake_firestore")
+    from app.services import firebase
+    from bench.fake_firestore import FakeFirestore
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    db = FakeFirestore()
+    firebase.set_db(db)
+    for count in sizes:
+        _seed(db, f"user{count}", count)
+    db.latency = args.latency_ms / 1000
+
+    report = {"firestoreLatencyMs": args.latency_ms, **asyncio.run(run(db, sizes, args.repeats))}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
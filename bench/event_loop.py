@@ -0,0 +1,104 @@
+# bench/event_loop.py
+# Firestore calls made on the event loop against the repository's thread pool.
+#
+# `--clients` concurrent clients each read a conversation document every
+# `--interval-ms` while the Firestore fake sleeps `--latency-ms` per call,
+# like a network round trip. "before" makes the blocking call straight from
+# the coroutine, as the routes did before app/services/repository.py;
+# "after" awaits the repository, which runs it on the
+# FIRESTORE_MAX_CONCURRENCY pool. Latency counts from when each request was
+# due, so time queued behind a blocked loop is included, and a ticker
+# coroutine records how late the loop wakes it.
+#
+# The same load through the whole API:
+#   python -m bench.run --scenarios mixed --concurrency 100 --firestore-latency-ms 10
+#
+# Usage: python -m bench.event_loop --clients 100 --requests 20 --interval-ms 100 --latency-ms 10
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+TICK = 0.005  # Ticker period in seconds
+
+
+async def _measure(clients: int, requests: int, interval: float, read) -> dict:
+    from bench.run import summarize
+
+    timings: list[float] = []
+    lags: list[float] = []
+    running = True
+
+    async def ticker():
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - started - TICK)
+
+    async def client(i: int):
+        # Clients are spread evenly over the interval
+        due = started + interval * i / clients
+        for n in range(requests):
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await read(f"conv-{(i * requests + n) % 1000}")
+            timings.append(time.perf_counter() - due)
+            due += interval
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    running = False
+    await tick
+    return {
+        "requests": len(timings),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(timings) / elapsed, 1),
+        "latencyMs": summarize(timings),
+        "loopLagMs": summarize(lags),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare blocking Firestore calls on the loop with the repository pool.")
+    parser.add_argument("--clients", type=int, default=100, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=20, help="Reads per client")
+    parser.add_argument("--interval-ms", type=float, default=100, help="Time between one client's reads")
+    parser.add_argument("--latency-ms", type=float, default=10, help="Simulated Firestore round trip")
+    args = parser.parse_args()
+
+    os.environ.setdefault("FIREBASE_BACKEND", "bench.fake_firestore")
+    from app.config import FIRESTORE_MAX_CONCURRENCY
+    from app.services import firebase, repository
+    from bench.fake_firestore import FakeFirestore
+
+    db = FakeFirestore(latency=args.latency_ms / 1000)
+    firebase.set_db(db)
+    for i in range(1000):
+        db.collection("conversations").document(f"conv-{i}").set({"conversationId": f"conv-{i}", "participants": ["a", "b"]})
+
+    async def blocking(conv_id: str):
+        # What the routes did before the repository: a sync round trip on the loop
+        snapshot = db.collection("conversations").document(conv_id).get()
+        return snapshot.to_dict()
+
+    async def compare():
+        return {
+            "before": await _measure(args.clients, args.requests, args.interval_ms / 1000, blocking),
+            "after": await _measure(args.clients, args.requests, args.interval_ms / 1000, repository.get_conversation),
+        }
+
+    report = {
+        "clients": args.clients,
+        "offeredRps": round(args.clients / (args.interval_ms / 1000), 1),
+        "firestoreLatencyMs": args.latency_ms,
+        "pool": FIRESTORE_MAX_CONCURRENCY,
+        **asyncio.run(compare()),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
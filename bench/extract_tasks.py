@@ -0,0 +1,127 @@
+# bench/extract_tasks.py
+# Throughput of batched task extraction, end to end.
+#
+# Serves bench/mock_openai.py on a local port with `--openai-latency-ms`
+# per call, then submits POST /ai/extract-tasks:batch jobs through the app
+# and polls GET /ai/jobs/{id} until each is done, the way a client would.
+# For every job size in `--sizes`, `--jobs` jobs run `--parallel` at a
+# time, each with that many messages drawn from a mix of task-like and
+# chit-chat lines of varying length.
+#
+# Reports messages per second, job latency, model calls per job (both the
+# job's own `calls` count and the calls the mock actually served, which
+# include halves retried after an unreadable reply) and messages per call,
+# against one call per message without batching.
+#
+# Usage: python -m bench.extract_tasks --sizes 1,20,100,500 --jobs 20 --parallel 4 --openai-latency-ms 400
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from bench import app_client
+
+POLL_SECONDS = 0.02
+LINES = [
+    "remind me to call the dentist on 2030-03-15",
+    "call mum on 2030-01-02 weekly",
+    "Please remind me to renew the passport on 2031-07-01 yearly",
+    "remind me to pay rent on 2030-02-01 monthly",
+    "Lunch was great, thanks!",
+    "ok 👍",
+    "Did you see the match last night? The second half was something else, I still can't believe the score.",
+    "Can you call me back when you're free",
+    "I'll send the slides over tonight, let me know if anything in the budget section looks off to you.",
+    "haha yes",
+]
+
+
+def _messages(count: int, rng: random.Random) -> list[dict]:
+    return [{"id": f"m{i}", "text": rng.choice(LINES), "conversation_id": f"conv-{i % 5}"} for i in range(count)]
+
+
+async def _job(http, uid: str, size: int, create_reminders: bool, rng: random.Random) -> dict:
+    started = time.perf_counter()
+    response = await http.post("/v1/ai/extract-tasks:batch", headers=app_client.auth(uid), json={
+        "messages": _messages(size, rng), "create_reminders": create_reminders, "timezone": "UTC",
+    })
+    response.raise_for_status()
+    job_id = response.json()["jobId"]
+    while True:
+        job = (await http.get(f"/v1/ai/jobs/{job_id}", headers=app_client.auth(uid))).json()
+        if job["status"] in ("done", "failed"):
+            break
+        await asyncio.sleep(POLL_SECONDS)
+    return {
+        "seconds": time.perf_counter() - started,
+        "calls": job.get("calls", 0),
+        "failed": job["status"] == "failed" or any("error" in r for r in job.get("results", [])),
+    }
+
+
+async def run(args, mock) -> dict:
+    from bench.run import summarize
+
+    rng = random.Random(args.seed)
+    report = {}
+    async with app_client.client() as http:
+        users = [f"user-{i}" for i in range(args.parallel)]
+        await app_client.login(http, *users)
+        await _job(http, users[0], 1, False, rng)  # Warm-up: the OpenAI client is made on first use
+        for size in args.sizes:
+            served = mock.calls["chat"]
+            semaphore = asyncio.Semaphore(args.parallel)
+
+            async def one(i: int) -> dict:
+                async with semaphore:
+                    return await _job(http, users[i % len(users)], size, args.create_reminders, rng)
+
+            started = time.perf_counter()
+            jobs = await asyncio.gather(*(one(i) for i in range(args.jobs)))
+            elapsed = time.perf_counter() - started
+            served = mock.calls["chat"] - served
+            messages = size * args.jobs
+            report[str(size)] = {
+                "jobs": args.jobs,
+                "messages": messages,
+                "messagesPerSecond": round(messages / elapsed, 1),
+                "jobMs": summarize([job["seconds"] for job in jobs]),
+                "callsPerJob": round(sum(job["calls"] for job in jobs) / args.jobs, 2),
+                "servedCallsPerJob": round(served / args.jobs, 2),
+                "messagesPerCall": round(messages / served, 1) if served else None,
+                "unbatchedCallsPerJob": size,
+                "failedJobs": sum(job["failed"] for job in jobs),
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure extract-tasks:batch throughput against the mock OpenAI server.")
+    parser.add_argument("--sizes", default="1,20,100,500", help="Messages per job, comma-separated")
+    parser.add_argument("--jobs", type=int, default=20, help="Jobs per size")
+    parser.add_argument("--parallel", type=int, default=4, help="Jobs in flight at once")
+    parser.add_argument("--openai-latency-ms", type=float, default=400, help="Mock latency per model call")
+    parser.add_argument("--create-reminders", action="store_true", help="Also turn dated tasks into reminders")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+
+    from bench.run import _free_port, _start_mock_openai
+
+    port = _free_port()
+    app_client.configure(
+        OPENAI_BASE_URL=f"http://127.0.0.1:{port}/v1",
+        MOCK_OPENAI_LATENCY=str(args.openai_latency_ms / 1000),
+        AI_CACHE_BACKEND="none",  # Repeated lines would otherwise be served from the cache
+        RATE_LIMIT_REQUESTS="default=0",
+        RATE_LIMIT_TOKENS="0",
+    )
+    mock = _start_mock_openai(port)
+    report = asyncio.run(run(args, mock))
+    print(json.dumps({"openaiLatencyMs": args.openai_latency_ms, "parallel": args.parallel, "sizes": report},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,646 @@
+# bench/fake_firestore.py
+# In-memory stand-in for the firebase_admin Firestore client.
+#
+# Implements the subset of the API this app uses (documents, subcollections,
+# where/order_by/limit/cursors/select, batches, transactions, get_all) with
+# optional latency injection and read/write counters, so the API can be
+# exercised and benchmarked without credentials or the emulator.
+#
+# With FIREBASE_BACKEND=bench.fake_firestore the app uses `client()` as its
+# database and accepts ID tokens of the form "t:<uid>".
+
+import copy
+import functools
+import itertools
+import os
+import random
+import threading
+import time
+import uuid
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+DOCUMENT_ID = "__name__"
+MAX_BATCH_WRITES = 500
+
+
+class Stats:
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.rpcs = 0
+        self._lock = threading.Lock()
+
+    def add(self, reads=0, writes=0, deletes=0):
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+            self.deletes += deletes
+            self.rpcs += 1
+
+    def snapshot(self) -> dict:
+        return {"reads": self.reads, "writes": self.writes, "deletes": self.deletes, "rpcs": self.rpcs}
+
+    def reset(self):
+        with self._lock:
+            self.reads = self.writes = self.deletes = self.rpcs = 0
+
+
+def _get_field(data: dict, path: str):
+    value = data
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_field(data: dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    data[parts[-1]] = value
+
+
+def _delete_field(data: dict, path: str):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+class _Missing:
+    pass
+
+
+_MISSING = _Missing()
+
+
+def _rank(value):
+    # Firestore orders values by type first
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, str(value))
+
+
+def _apply_transforms(current, value):
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        base = list(current) if isinstance(current, list) else []
+        return base + [v for v in value.values if v not in base]
+    if isinstance(value, transforms.ArrayRemove):
+        base = list(current) if isinstance(current, list) else []
+        return [v for v in base if v not in value.values]
+    if value is transforms.SERVER_TIMESTAMP:
+        return time.time()
+    return value
+
+
+def _resolve(current: dict, data: dict, merge: bool) -> dict:
+    result = copy.deepcopy(current) if merge and current is not None else {}
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            _delete_field(result, key)
+            continue
+        if isinstance(value, dict) and merge:
+            existing = result.get(key)
+            result[key] = _resolve(existing if isinstance(existing, dict) else {}, value, True)
+            continue
+        result[key] = _apply_transforms(result.get(key), copy.deepcopy(value))
+    return result
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, update_time=None, field_paths=None):
+        self.reference = reference
+        self._data = data
+        self.update_time = update_time
+        if data is not None and field_paths is not None:
+            projected = {}
+            for path in field_paths:
+                value = _get_field(data, path)
+                if value is not _MISSING:
+                    _set_field(projected, path, value)
+            self._data = projected
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class DocumentReference:
+    def __init__(self, client, path: tuple):
+        self._client = client
+        self._path = path
+
+    @property
+    def id(self):
+        return self._path[-1]
+
+    @property
+    def path(self):
+        return "/".join(self._path)
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self._path[:-1])
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other._path == self._path
+
+    def __hash__(self):
+        return hash(self._path)
+
+    def collection(self, name):
+        return CollectionReference(self._client, self._path + (name,))
+
+    def collections(self):
+        return self._client._subcollections(self._path)
+
+    def get(self, field_paths=None, transaction=None):
+        self._client._latency()
+        snap = self._client._snapshot(self, field_paths)
+        self._client.stats.add(reads=1)
+        return snap
+
+    def set(self, document_data, merge=False):
+        self._client._commit([("set", self, document_data, merge)])
+
+    def create(self, document_data):
+        self._client._commit([("create", self, document_data, False)])
+
+    def update(self, field_updates):
+        self._client._commit([("update", self, field_updates, False)])
+
+    def delete(self):
+        self._client._commit([("delete", self, None, False)])
+
+
+class Query:
+    def __init__(self, client, path, collection_group=False, filters=(), orders=(),
+                 limit=None, limit_to_last=False, offset=0, start=None, end=None, projection=None):
+        self._client = client
+        self._path = path
+        self._group = collection_group
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._limit_to_last = limit_to_last
+        self._offset = offset
+        self._start = start
+        self._end = end
+        self._projection = projection
+
+    def _copy(self, **changes):
+        fields = dict(
+            filters=self._filters, orders=self._orders, limit=self._limit,
+            limit_to_last=self._limit_to_last, offset=self._offset, start=self._start,
+            end=self._end, projection=self._projection,
+        )
+        fields.update(changes)
+        return Query(self._client, self._path, self._group, **fields)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count, limit_to_last=False)
+
+    def limit_to_last(self, count):
+        return self._copy(limit=count, limit_to_last=True)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def start_at(self, values):
+        return self._copy(start=(values, True))
+
+    def start_after(self, values):
+        return self._copy(start=(values, False))
+
+    def end_at(self, values):
+        return self._copy(end=(values, True))
+
+    def end_before(self, values):
+        return self._copy(end=(values, False))
+
+    # ---- evaluation ----
+
+    def _matches(self, doc_id, data):
+        for field, op, value in self._filters:
+            actual = doc_id if field == DOCUMENT_ID else _get_field(data, field)
+            if op == "array_contains":
+                if not isinstance(actual, list) or value not in actual:
+                    return False
+                continue
+            if op == "array_contains_any":
+                if not isinstance(actual, list) or not any(v in actual for v in value):
+                    return False
+                continue
+            if op == "in":
+                if actual is _MISSING or actual not in value:
+                    return False
+                continue
+            if op == "not-in":
+                if actual is _MISSING or actual in value:
+                    return False
+                continue
+            if actual is _MISSING:
+                return False
+            if op == "==":
+                if actual != value:
+                    return False
+                continue
+            if op == "!=":
+                if actual == value:
+                    return False
+                continue
+            if _rank(actual)[0] != _rank(value)[0]:
+                return False  # Range filters only match values of the same type
+            if op == "<" and not actual < value:
+                return False
+            if op == "<=" and not actual <= value:
+                return False
+            if op == ">" and not actual > value:
+                return False
+            if op == ">=" and not actual >= value:
+                return False
+        return True
+
+    def _effective_orders(self):
+        orders = list(self._orders)
+        # Inequality filters imply an ordering on that field first
+        if not orders:
+            for field, op, _ in self._filters:
+                if op in ("<", "<=", ">", ">=", "!=", "not-in"):
+                    orders.append((field, ASCENDING))
+                    break
+        if not orders or orders[-1][0] != DOCUMENT_ID:
+            last = orders[-1][1] if orders else ASCENDING
+            orders.append((DOCUMENT_ID, last))
+        return orders
+
+    @staticmethod
+    def _sort_values(doc_id, data, orders):
+        values = []
+        for field, _ in orders:
+            values.append(doc_id if field == DOCUMENT_ID else _get_field(data, field))
+        return values
+
+    def _cursor_values(self, cursor, orders):
+        if isinstance(cursor, DocumentSnapshot):
+            return self._sort_values(cursor.id, cursor._data or {}, orders)
+        if isinstance(cursor, dict):
+            values = []
+            for field, _ in orders:
+                if field == DOCUMENT_ID:
+                    value = cursor.get(DOCUMENT_ID, _MISSING)
+                    if isinstance(value, DocumentReference):
+                        value = value.id
+                    values.append(value)
+                else:
+                    values.append(_get_field(cursor, field))
+            return values
+        return list(cursor) + [_MISSING] * (len(orders) - len(cursor))
+
+    @staticmethod
+    def _compare(a, b, orders):
+        for x, y, (_, direction) in zip(a, b, orders):
+            if x is _MISSING or y is _MISSING:
+                return 0
+            rx, ry = _rank(x), _rank(y)
+            if rx == ry:
+                continue
+            result = -1 if rx < ry else 1
+            return -result if direction == DESCENDING else result
+        return 0
+
+    def _run(self):
+        orders = self._effective_orders()
+        rows = []
+        for path, (data, update_time) in self._client._documents_in(self._path, self._group):
+            doc_id = path[-1]
+            if not self._matches(doc_id, data):
+                continue
+            # Documents missing an order_by field are excluded, like Firestore
+            if any(f != DOCUMENT_ID and _get_field(data, f) is _MISSING for f, _ in self._orders):
+                continue
+            rows.append((path, data, update_time))
+
+        key = functools.cmp_to_key(
+            lambda a, b: self._compare(
+                self._sort_values(a[0][-1], a[1], orders),
+                self._sort_values(b[0][-1], b[1], orders),
+                orders,
+            )
+        )
+        rows.sort(key=key)
+
+        if self._start is not None:
+            values, inclusive = self._start
+            cursor = self._cursor_values(values, orders)
+            rows = [
+                r for r in rows
+                if (c := self._compare(self._sort_values(r[0][-1], r[1], orders), cursor, orders)) > 0
+                or (inclusive and c == 0)
+            ]
+        if self._end is not None:
+            values, inclusive = self._end
+            cursor = self._cursor_values(values, orders)
+            rows = [
+                r for r in rows
+                if (c := self._compare(self._sort_values(r[0][-1], r[1], orders), cursor, orders)) < 0
+                or (inclusive and c == 0)
+            ]
+
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[-self._limit:] if self._limit_to_last else rows[:self._limit]
+        return [
+            DocumentSnapshot(DocumentReference(self._client, path), copy.deepcopy(data), update_time, self._projection)
+            for path, data, update_time in rows
+        ]
+
+    def get(self, transaction=None):
+        self._client._latency()
+        with self._client._lock:
+            docs = self._run()
+        self._client.stats.add(reads=max(1, len(docs)))
+        return docs
+
+    def stream(self, transaction=None):
+        return iter(self.get(transaction=transaction))
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path: tuple):
+        super().__init__(client, path)
+
+    @property
+    def id(self):
+        return self._path[-1]
+
+    @property
+    def parent(self):
+        return DocumentReference(self._client, self._path[:-1]) if len(self._path) > 1 else None
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, self._path + (document_id or uuid.uuid4().hex,))
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return time.time(), ref
+
+    def list_documents(self):
+        return [self.document(i) for i in self._client._list_ids(self._path)]
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def _add(self, op):
+        if len(self._writes) >= MAX_BATCH_WRITES:
+            raise exceptions.InvalidArgument("maximum 500 writes allowed per request")
+        self._writes.append(op)
+
+    def set(self, reference, document_data, merge=False):
+        self._add(("set", reference, document_data, merge))
+
+    def create(self, reference, document_data):
+        self._add(("create", reference, document_data, False))
+
+    def update(self, reference, field_updates):
+        self._add(("update", reference, field_updates, False))
+
+    def delete(self, reference):
+        self._add(("delete", reference, None, False))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        if writes:
+            self._client._commit(writes)
+        return writes
+
+
+class Transaction(WriteBatch):
+    _ids = itertools.count(1)
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _clean_up(self):
+        self._writes = []
+        if self._id is not None:
+            self._id = None
+            self._client._lock.release()
+
+    def _begin(self, retry_id=None):
+        # Transactions are serialized on the client lock, which is simpler
+        # than optimistic concurrency and just as correct for a fake.
+        self._client._lock.acquire()
+        self._id = next(self._ids)
+
+    def _commit(self):
+        writes, self._writes = self._writes, []
+        try:
+            if writes:
+                self._client._commit(writes)
+        finally:
+            self._clean_up()
+        return writes
+
+    def _rollback(self):
+        self._clean_up()
+
+    def get(self, ref_or_query, field_paths=None):
+        if isinstance(ref_or_query, DocumentReference):
+            return ref_or_query.get(field_paths=field_paths)
+        return ref_or_query.stream()
+
+    def get_all(self, references, field_paths=None):
+        return self._client.get_all(references, field_paths=field_paths)
+
+
+class FakeFirestore:
+    """Thread-safe in-memory Firestore with latency injection and counters."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.stats = Stats()
+        self._collections: dict[tuple, dict[str, tuple[dict, float]]] = {}
+        self._lock = threading.RLock()
+        self._rng = random.Random(0)
+
+    def _latency(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._rng.random() * self.jitter)
+
+    # ---- public client API ----
+
+    def collection(self, name, *more):
+        path = (name,) + more
+        return CollectionReference(self, path)
+
+    def collection_group(self, collection_id):
+        return Query(self, (collection_id,), collection_group=True)
+
+    def document(self, *path):
+        if len(path) == 1:
+            path = tuple(path[0].split("/"))
+        return DocumentReference(self, tuple(path))
+
+    def collections(self):
+        return self._subcollections(())
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        self._latency()
+        with self._lock:
+            snaps = [self._snapshot(ref, field_paths) for ref in references]
+        self.stats.add(reads=len(references))
+        return iter(snaps)
+
+    def close(self):
+        pass
+
+    # ---- internals ----
+
+    def _get_doc(self, path):
+        return self._collections.get(path[:-1], {}).get(path[-1])
+
+    def _snapshot(self, ref, field_paths=None):
+        with self._lock:
+            entry = self._get_doc(ref._path)
+        if entry is None:
+            return DocumentSnapshot(ref, None)
+        data, update_time = entry
+        return DocumentSnapshot(ref, copy.deepcopy(data), update_time, field_paths)
+
+    def _documents_in(self, path, group):
+        if group:
+            return [
+                (parent + (doc_id,), entry)
+                for parent, docs in self._collections.items() if parent[-1] == path[0]
+                for doc_id, entry in docs.items()
+            ]
+        return [(path + (doc_id,), entry) for doc_id, entry in self._collections.get(path, {}).items()]
+
+    def _list_ids(self, path):
+        with self._lock:
+            return sorted(self._collections.get(path, {}))
+
+    def _subcollections(self, path):
+        depth = len(path) + 1
+        with self._lock:
+            names = sorted({p[len(path)] for p, docs in self._collections.items() if docs and len(p) == depth and p[:-1] == path})
+        return [CollectionReference(self, path + (n,)) for n in names]
+
+    def _commit(self, writes):
+        self._latency()
+        deletes = 0
+        with self._lock:
+            staged = {}
+            now = time.time()
+            for op, ref, data, merge in writes:
+                path = ref._path
+                current = staged[path] if path in staged else self._get_doc(path)
+                if op == "create":
+                    if current is not None:
+                        raise exceptions.AlreadyExists(f"Document already exists: {ref.path}")
+                    staged[path] = (_resolve(None, data, False), now)
+                elif op == "set":
+                    base = current[0] if current is not None else None
+                    staged[path] = (_resolve(base, data, merge), now)
+                elif op == "update":
+                    if current is None:
+                        raise exceptions.NotFound(f"No document to update: {ref.path}")
+                    result = copy.deepcopy(current[0])
+                    for key, value in data.items():
+                        if value is transforms.DELETE_FIELD:
+                            _delete_field(result, key)
+                        else:
+                            existing = _get_field(result, key)
+                            existing = None if existing is _MISSING else existing
+                            _set_field(result, key, _apply_transforms(existing, copy.deepcopy(value)))
+                    staged[path] = (result, now)
+                elif op == "delete":
+                    staged[path] = None
+                    deletes += 1
+            # Apply atomically once every write has been validated
+            for path, entry in staged.items():
+                docs = self._collections.setdefault(path[:-1], {})
+                if entry is None:
+                    docs.pop(path[-1], None)
+                else:
+                    docs[path[-1]] = entry
+        self.stats.add(writes=len(writes) - deletes, deletes=deletes)
+
+
+def client() -> FakeFirestore:
+    # Per-call latency in milliseconds, e.g. to approximate a Firestore region round trip
+    return FakeFirestore(
+        latency=float(os.getenv("FAKE_FIRESTORE_LATENCY_MS", "0")) / 1000,
+        jitter=float(os.getenv("FAKE_FIRESTORE_JITTER_MS", "0")) / 1000,
+    )
+
+
+def verify_id_token(id_token: str) -> dict:
+    """Accept "t:<uid>" tokens, like a decoded Firebase ID token for that user."""
+    if not id_token.startswith("t:"):
+        raise ValueError("Invalid token")
+    uid = id_token[2:]
+    return {"uid": uid, "email": f"{uid}@bench.local", "name": uid, "exp": time.time() + 3600}
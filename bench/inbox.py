@@ -0,0 +1,105 @@
+# bench/inbox.py
+# Inbox load cost: the old global conversations query against the per-user inbox.
+#
+# Seeds the Firestore fake with `--users` users in `--conversations` two-person
+# conversations each, then loads every user's first page both ways. The old
+# query filters the whole `conversations` collection (array_contains plus
+# order_by, which also needs a composite index); the inbox is a plain ordered
+# read of the user's own documents and carries unread counts. The fake scans
+# a collection linearly, so its timings show how each query scales with the
+# size of the collection it runs against, not Firestore's absolute latency.
+#
+# Usage: python -m bench.inbox --users 2000 --conversations 20
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+
+def _seed(db, users: int, per_user: int):
+    from app.services.repository import inbox_entry
+
+    start = datetime(2026, 1, 1)
+    batch, pending = db.batch(), 0
+    for i in range(users):
+        for step in range(1, per_user // 2 + 1):
+            a, b = f"user-{i}", f"user-{(i + step) % users}"
+            conv_id = f"{a}-{b}"
+            conv = {
+                "conversationId": conv_id,
+                "participants": [a, b],
+                "type": "known",
+                "lastMessage": "see you then",
+                "lastMessageAt": (start + timedelta(seconds=i * per_user + step)).isoformat(),
+            }
+            batch.set(db.collection("conversations").document(conv_id), conv)
+            for uid in (a, b):
+                batch.set(db.collection("users").document(uid).collection("inbox").document(conv_id), inbox_entry(conv))
+            pending += 3
+            if pending >= 400:
+                batch.commit()
+                batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+
+
+def _old_query(db, uid: str, limit: int) -> list[dict]:
+    # list_conversations before the inbox
+    return [
+        d.to_dict() for d in
+        db.collection("conversations")
+        .where("participants", "array_contains", uid)
+        .order_by("lastMessageAt", direction="DESCENDING")
+        .limit(limit)
+        .get()
+    ]
+
+
+async def _measure(db, uids: list[str], load) -> dict:
+    db.stats.reset()
+    timings = []
+    for uid in uids:
+        started = time.perf_counter()
+        await load(uid)
+        timings.append(time.perf_counter() - started)
+    reads = db.stats.snapshot()["reads"]
+    return {
+        "loads": len(uids),
+        "readsPerLoad": round(reads / len(uids), 2),
+        "medianMs": round(statistics.median(timings) * 1000, 3),
+        "p95Ms": round(sorted(timings)[int(0.95 * len(timings))] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inbox load cost before and after the per-user inbox.")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--conversations", type=int, default=20, help="Conversations per user")
+    parser.add_argument("--limit", type=int, default=50, help="Page size")
+    parser.add_argument("--samples", type=int, default=200, help="Users whose inbox is loaded")
+    args = parser.parse_args()
+
+    from app.services import firebase, repository
+    from bench.fake_firestore import FakeFirestore
+
+    db = FakeFirestore()
+    firebase.set_db(db)
+    _seed(db, args.users, args.conversations)
+    uids = [f"user-{i}" for i in range(0, args.users, max(1, args.users // args.samples))]
+
+    async def compare():
+        # Both go through the same thread pool, so only the query differs
+        return {
+            "before": await _measure(db, uids, lambda uid: repository.run(_old_query, db, uid, args.limit)),
+            "after": await _measure(db, uids, lambda uid: repository.list_conversations(uid, args.limit)),
+        }
+
+    report = {"conversations": len(db.collection("conversations").get()), **asyncio.run(compare())}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
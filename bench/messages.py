@@ -0,0 +1,122 @@
+# bench/messages.py
+# Bytes and latency of reading a long conversation, by access pattern.
+#
+# Seeds one conversation with `--messages` messages through the batch
+# endpoint, then reads it through the API with gzip on, counting bytes as
+# they come off the wire:
+#   fullSync         every message, 200 a page from the oldest: what a
+#                    client that re-downloads the conversation pays
+#   newestPage       the default first page (newest 50)
+#   olderPage        one page back from there, via X-Prev-Cursor
+#   pollDelta        since=<last seen messageId> after 5 new messages
+#   pollNotModified  If-None-Match with the current ETag, answered 304
+#
+# Usage: python -m bench.messages --messages 10000 --repeats 20
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from bench import app_client
+
+PAGE = 200
+
+
+async def _seed(http, count: int) -> str:
+    await app_client.login(http, "alice", "bob")
+    response = await http.post("/v1/chat/conversations", json={"recipient_email": "bob@bench.local"}, headers=app_client.auth("alice"))
+    conv_id = response.json()["conversationId"]
+    for start in range(0, count, PAGE):
+        texts = [{"text": f"message {i}: are we still on for the trip next week?"} for i in range(start, min(count, start + PAGE))]
+        sender = "alice" if start // PAGE % 2 else "bob"
+        await http.post(f"/v1/chat/conversations/{conv_id}/messages:batch", json={"messages": texts}, headers=app_client.auth(sender))
+    return conv_id
+
+
+async def _measure(repeats: int, op) -> dict:
+    timings, sizes, statuses = [], [], set()
+    for _ in range(repeats):
+        started = time.perf_counter()
+        size, status = await op()
+        timings.append(time.perf_counter() - started)
+        sizes.append(size)
+        statuses.add(status)
+    return {
+        "medianMs": round(statistics.median(timings) * 1000, 2),
+        "maxMs": round(max(timings) * 1000, 2),
+        "bytes": round(statistics.median(sizes)),
+        "status": sorted(statuses),
+    }
+
+
+async def run(count: int, repeats: int) -> dict:
+    async with app_client.client() as http:
+        conv_id = await _seed(http, count)
+        url = f"/v1/chat/conversations/{conv_id}/messages"
+        headers = app_client.auth("alice")
+
+        async def full_sync():
+            # From the start of time, then forward with X-Next-Cursor
+            params = {"limit": PAGE, "since": "1970-01-01T00:00:00Z"}
+            size = seen = 0
+            while True:
+                response = await http.get(url, params=params, headers=headers)
+                size += response.num_bytes_downloaded
+                page = response.json()
+                seen += len(page)
+                if len(page) < PAGE:
+                    assert seen >= count, f"synced {seen} of {count} messages"
+                    return size, response.status_code
+                params = {"limit": PAGE, "after": response.headers["X-Next-Cursor"]}
+
+        async def newest_page():
+            response = await http.get(url, headers=headers)
+            return response.num_bytes_downloaded, response.status_code
+
+        first = await http.get(url, headers=headers)
+        prev_cursor = first.headers["X-Prev-Cursor"]
+
+        async def older_page():
+            response = await http.get(url, params={"before": prev_cursor}, headers=headers)
+            return response.num_bytes_downloaded, response.status_code
+
+        last_seen = first.json()[-1]["messageId"]
+
+        async def poll_delta():
+            nonlocal last_seen
+            # Not timed separately: the other participant sends while we're away
+            await http.post(f"{url}:batch", json={"messages": [{"text": "new one"}] * 5}, headers=app_client.auth("bob"))
+            response = await http.get(url, params={"since": last_seen}, headers=headers)
+            last_seen = response.json()[-1]["messageId"]
+            return response.num_bytes_downloaded, response.status_code
+
+        async def poll_not_modified():
+            response = await http.get(url, headers={**headers, "If-None-Match": etag})
+            return response.num_bytes_downloaded, response.status_code
+
+        report = {
+            "fullSync": await _measure(max(1, repeats // 10), full_sync),
+            "newestPage": await _measure(repeats, newest_page),
+            "olderPage": await _measure(repeats, older_page),
+            "pollDelta": await _measure(repeats, poll_delta),
+        }
+        # Nothing is sent from here on, so one ETag stays current
+        etag = (await http.get(url, headers=headers)).headers["ETag"]
+        report["pollNotModified"] = await _measure(repeats, poll_not_modified)
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bytes and latency of reading a long conversation.")
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    app_client.configure()
+    report = {"messages": args.messages, **asyncio.run(run(args.messages, args.repeats))}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
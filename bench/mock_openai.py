@@ -0,0 +1,116 @@
+# bench/mock_openai.py
+# Minimal OpenAI-compatible server for local testing and benchmarks.
+#
+# Serves /v1/chat/completions (plain, streamed and JSON-schema task
+# extraction) and /v1/embeddings with fixed latency and deterministic
+# answers. Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1.
+#
+# Usage: python -m uvicorn bench.mock_openai:app --port 8765
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+LATENCY = float(os.getenv("MOCK_OPENAI_LATENCY", "0.05"))           # Seconds before the first byte
+TOKEN_DELAY = float(os.getenv("MOCK_OPENAI_TOKEN_DELAY", "0.005"))  # Seconds between streamed words
+ERROR_RATE = float(os.getenv("MOCK_OPENAI_ERROR_RATE", "0"))        # Share of calls answered with a 503
+EMBED_DIM = int(os.getenv("MOCK_OPENAI_EMBED_DIM", "64"))
+
+calls = {"chat": 0, "embeddings": 0, "errors": 0, "prompt_chars": 0}
+_rng = random.Random(0)
+
+
+def _tasks(text: str) -> list[dict]:
+    # "remind me to X on 2030-01-02 weekly" style messages yield one task
+    words = text.lower().split()
+    if "remind" not in words and "call" not in words:
+        return []
+    date = next((w for w in words if len(w) == 10 and w[4] == "-"), None)
+    repeat = next((w for w in words if w in ("daily", "weekly", "monthly", "yearly")), "none")
+    return [{"task": text.split(" on ")[0][:60], "date": date, "repeat": repeat}]
+
+
+def _reply(body: dict) -> str:
+    system = body["messages"][0]["content"]
+    user = body["messages"][-1]["content"]
+    schema = (body.get("response_format") or {}).get("json_schema", {})
+    if schema.get("name") == "task_batch":
+        return json.dumps({"results": [{"id": item["id"], "tasks": _tasks(item["text"])} for item in json.loads(user)]})
+    if "ummar" in system:
+        return "- They talked.\n- Plans were made."
+    if "question" in user.lower():
+        return "According to your notes [1], yes."
+    return "Sounds great, see you then!"
+
+
+def _usage(prompt_chars: int, text: str) -> dict:
+    prompt_tokens, completion_tokens = prompt_chars // 4, len(text) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+async def chat(request: Request):
+    body = await request.json()
+    calls["chat"] += 1
+    prompt_chars = sum(len(m["content"]) for m in body["messages"])
+    calls["prompt_chars"] += prompt_chars
+    await asyncio.sleep(LATENCY)
+    if ERROR_RATE and _rng.random() < ERROR_RATE:
+        calls["errors"] += 1
+        return JSONResponse({"error": {"message": "Mock overload", "type": "server_error"}}, status_code=503)
+
+    text = _reply(body)
+    usage = _usage(prompt_chars, text)
+    base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": body["model"]}
+    if not body.get("stream"):
+        return JSONResponse({
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            "usage": usage,
+        })
+
+    async def events():
+        for word in text.split(" "):
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "finish_reason": None, "delta": {"content": word + " "}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(TOKEN_DELAY)
+        final = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]}
+        yield f"data: {json.dumps(final)}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def embeddings(request: Request):
+    body = await request.json()
+    calls["embeddings"] += 1
+    await asyncio.sleep(LATENCY / 2)
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    data = []
+    for i, text in enumerate(inputs):
+        digest = hashlib.sha256(text.encode()).digest()
+        vector = [((digest[j % 32] + j) % 17 - 8) / 8 for j in range(EMBED_DIM)]
+        data.append({"object": "embedding", "index": i, "embedding": vector})
+    tokens = sum(len(t) for t in inputs) // 4
+    return JSONResponse({
+        "object": "list",
+        "data": data,
+        "model": body["model"],
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    })
+
+
+app = Starlette(routes=[
+    Route("/v1/chat/completions", chat, methods=["POST"]),
+    Route("/v1/embeddings", embeddings, methods=["POST"]),
+])
@@ -0,0 +1,121 @@
+# bench/notes.py
+# Payload size and latency of the note list, by notebook size.
+#
+# "before" is GET /notepad/ as it was before pagination: every note the
+# user has, full summaries included, encoded the way JSONResponse does and
+# gzipped as GZipMiddleware would. "after" is the current GET /notepad/
+# through the app, first page and the default limit, counting bytes off the
+# wire, plus GET /notepad/{id} for the one note the user opens.
+#
+# Usage: python -m bench.notes --sizes 10,1000,10000 --repeats 10
+
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from bench import app_client
+
+WORDS = ("meeting budget call dentist trip flights hotel invoice friday launch review draft "
+         "notes agenda follow up kids school groceries plan ideas design bug release").split()
+SUMMARY_WORDS = 300  # About 2 KB, a summarised conversation
+
+
+def _seed(db, uid: str, count: int):
+    from app.routes.notepad import make_snippet
+
+    rng = random.Random(count)
+    start = datetime(2024, 1, 1)
+    batch = db.batch()
+    for i in range(count):
+        summary = " ".join(rng.choice(WORDS) for _ in range(SUMMARY_WORDS))
+        at = (start + timedelta(minutes=i)).isoformat()
+        note_id = f"{uid}-note-{i}"
+        batch.set(db.collection("notes").document(note_id), {
+            "noteId": note_id, "userId": uid, "title": f"Note {i}", "summary": summary,
+            "snippet": make_snippet(summary), "sourceConversationId": None, "createdAt": at, "updatedAt": at,
+        })
+        if len(batch) >= 400:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+
+
+async def _measure(repeats: int, op) -> dict:
+    timings, sizes = [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        sizes.append(await op())
+        timings.append(time.perf_counter() - started)
+    return {
+        "medianMs": round(statistics.median(timings) * 1000, 2),
+        "maxMs": round(max(timings) * 1000, 2),
+        "bytes": sizes[0],
+    }
+
+
+async def run(db, sizes: list[int], repeats: int) -> dict:
+    from app.services import repository
+
+    report = {}
+    async with app_client.client() as http:
+        for count in sizes:
+            uid = f"user{count}"
+            _seed(db, uid, count)
+            await app_client.login(http, uid)
+            headers = app_client.auth(uid)
+            raw = {}
+
+            async def before():
+                # The old query and response: everything, newest first
+                def _query():
+                    docs = db.collection("notes").where("userId", "==", uid).order_by("createdAt", direction="DESCENDING").get()
+                    return [doc.to_dict() for doc in docs]
+                notes = await repository.run(_query)
+                body = json.dumps(notes, ensure_ascii=False, separators=(",", ":")).encode()
+                raw["before"] = len(body)
+                return len(gzip.compress(body, compresslevel=9))
+
+            async def first_page():
+                response = await http.get("/v1/notepad/", headers=headers)
+                assert response.status_code == 200 and len(response.json()) == min(count, 50)
+                raw["firstPage"] = len(response.content)
+                return response.num_bytes_downloaded
+
+            async def open_note():
+                response = await http.get(f"/v1/notepad/{uid}-note-{count - 1}", headers=headers)
+                assert response.status_code == 200
+                raw["openNote"] = len(response.content)
+                return response.num_bytes_downloaded
+
+            report[str(count)] = {
+                "before": await _measure(repeats, before),
+                "firstPage": await _measure(repeats, first_page),
+                "openNote": await _measure(repeats, open_note),
+            }
+            for name, size in raw.items():
+                report[str(count)][name]["uncompressedBytes"] = size
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the full note list with the paginated, projected one.")
+    parser.add_argument("--sizes", default="10,1000,10000", help="Notes per user, comma-separated")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    app_client.configure()
+    from app.services import firebase
+    from bench.fake_firestore import FakeFirestore
+
+    db = FakeFirestore()
+    firebase.set_db(db)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(json.dumps(asyncio.run(run(db, sizes, args.repeats)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
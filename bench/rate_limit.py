@@ -0,0 +1,120 @@
+# bench/rate_limit.py
+# Overhead of the AI admission control itself.
+#
+#   admit     RateLimiter.admit() on the in-memory backend, charging a
+#             request and an estimate of tokens, spread over `--users`
+#             users; past MemoryBackend.MAX_KEYS buckets this includes
+#             pruning. "limited" is the refused path, which also refunds.
+#   governor  LLMGovernor slot acquire/release with a free slot, and the
+#             cost per call when every call queues for a single slot
+#             (including the task switch to hand the slot over).
+#   priority  `--calls` calls holding a slot for `--hold-ms` each through a
+#             governor of `--limit` slots, half interactive and half
+#             background: how long each kind waits for a slot.
+#
+# bench.run switches the rate limits off unless asked; to see them under load:
+#   python -m bench.run --scenarios ai --rate-limits
+#
+# Usage: python -m bench.rate_limit --users 1,10000,200000 --calls 200 --limit 4 --hold-ms 10
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+ADMITS = 200_000
+
+
+async def _per_call_us(count: int, call) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        await call(i)
+    return round((time.perf_counter() - started) / count * 1e6, 2)
+
+
+async def admit(users: list[int]) -> dict:
+    from app.services.rate_limit import MemoryBackend, RateLimiter
+
+    async def nothing(i):
+        pass
+
+    report = {"baselineUs": await _per_call_us(ADMITS, nothing), "allowedUs": {}}
+    for count in users:
+        limiter = RateLimiter(MemoryBackend(), {"default": 1e9}, tokens_per_minute=1e12)
+        report["allowedUs"][str(count)] = await _per_call_us(
+            ADMITS, lambda i: limiter.admit(f"user-{i % count}", "suggest", 500))
+    # Refused on the token bucket, so the request slot is handed back too
+    limiter = RateLimiter(MemoryBackend(), {"default": 1e9}, tokens_per_minute=1)
+    report["limitedUs"] = await _per_call_us(ADMITS, lambda i: limiter.admit("user-0", "suggest", 500))
+    return report
+
+
+async def governor(calls: int, limit: int, hold: float) -> dict:
+    from app.services.ai_service import BACKGROUND, INTERACTIVE, LLMGovernor
+
+    free = LLMGovernor(limit, max_waiting=calls)
+
+    async def uncontended(i):
+        async with free.slot(INTERACTIVE):
+            pass
+
+    # One slot and every caller started at once: all but the first queue
+    queued = LLMGovernor(1, max_waiting=ADMITS)
+
+    async def holder():
+        async with queued.slot():
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(holder() for _ in range(ADMITS // 10)))
+    handoff = (time.perf_counter() - started) / (ADMITS // 10)
+
+    busy = LLMGovernor(limit, max_waiting=calls)
+    waits = {INTERACTIVE: [], BACKGROUND: []}
+
+    async def call(priority: int):
+        started = time.perf_counter()
+        async with busy.slot(priority):
+            waits[priority].append(time.perf_counter() - started)
+            await asyncio.sleep(hold)
+
+    # Background work arrives first, as when a batch job is already running
+    await asyncio.gather(*(call(BACKGROUND) for _ in range(calls // 2)), *(call(INTERACTIVE) for _ in range(calls // 2)))
+    return {
+        "slotUs": await _per_call_us(ADMITS, uncontended),
+        "queuedHandoffUs": round(handoff * 1e6, 2),
+        "priority": {
+            "limit": limit,
+            "holdMs": hold * 1000,
+            "interactiveWaitMs": {"median": round(statistics.median(waits[INTERACTIVE]) * 1000, 1),
+                                  "max": round(max(waits[INTERACTIVE]) * 1000, 1)},
+            "backgroundWaitMs": {"median": round(statistics.median(waits[BACKGROUND]) * 1000, 1),
+                                 "max": round(max(waits[BACKGROUND]) * 1000, 1)},
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure rate limiter and LLM governor overhead.")
+    parser.add_argument("--users", default="1,10000,200000", help="Distinct users, comma-separated")
+    parser.add_argument("--calls", type=int, default=200, help="Calls in the priority run")
+    parser.add_argument("--limit", type=int, default=4, help="Governor slots in the priority run")
+    parser.add_argument("--hold-ms", type=float, default=10, help="How long each call holds its slot")
+    args = parser.parse_args()
+
+    os.environ.setdefault("FIREBASE_BACKEND", "bench.fake_firestore")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+    async def measure():
+        return {
+            "admit": await admit([int(count) for count in args.users.split(",")]),
+            "governor": await governor(args.calls, args.limit, args.hold_ms / 1000),
+        }
+
+    print(json.dumps(asyncio.run(measure()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
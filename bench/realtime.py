@@ -0,0 +1,158 @@
+# bench/realtime.py
+# Fan-out latency of the realtime hub with a thousand live subscribers.
+#
+# Serves the app with uvicorn on a local port and opens `--connections`
+# SSE streams to /v1/chat/stream, spread over `--users` users (several
+# devices each), paired into two-person conversations. Messages are then
+# sent through POST /messages one after another, each to a random
+# conversation, and every stream records when it sees them: fan-out
+# latency counts from just before the send to the event arriving over the
+# socket.
+#
+# The second phase adds one deliberately slow consumer, subscribed through
+# `hub` directly and taking `--slow-ms` per event, then sends `--burst`
+# messages to its conversation. It should be the only connection dropped;
+# hub.stats() shows the delivered/dropped counts for the phase.
+#
+# SSE only: the WebSocket route needs a websockets/wsproto install that
+# the bench environment doesn't have, and both routes read the same
+# Subscription queue.
+#
+# Usage: python -m bench.realtime --connections 1000 --users 200 --messages 200 --burst 150 --slow-ms 50
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from bench import app_client
+
+SETTLE_SECONDS = 10  # How long to wait for stragglers after the last send
+
+
+async def _subscriber(http, uid: str, latencies: list[float], seen: dict):
+    async with http.stream("GET", "/v1/chat/stream", headers=app_client.auth(uid)) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event.get("type") == "message":
+                latencies.append(time.perf_counter() - float(event["message"]["text"].split()[1]))
+                seen["events"] += 1
+
+
+async def _wait_for(condition, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def run(args) -> dict:
+    import httpx
+    import uvicorn
+    from app.config import REALTIME_QUEUE_SIZE
+    from app.main import app
+    from app.services.realtime import hub
+    from bench.run import _free_port, summarize
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           timeout_graceful_shutdown=1))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=None) as http:
+        users = [f"user-{i}" for i in range(args.users)]
+        await app_client.login(http, *users)
+        conversations = []
+        for a, b in zip(users[::2], users[1::2]):
+            response = await http.post("/v1/chat/conversations", json={"recipient_email": f"{b}@bench.local"},
+                                       headers=app_client.auth(a))
+            conversations.append((response.json()["conversationId"], a, b))
+
+        latencies: list[float] = []
+        seen = {"events": 0}
+        streams = [asyncio.create_task(_subscriber(http, users[i % args.users], latencies, seen))
+                   for i in range(args.connections)]
+        await _wait_for(lambda: hub.stats()["connections"] >= args.connections, SETTLE_SECONDS)
+        connected = hub.stats()["connections"]
+
+        async def send(conv_id: str, uid: str) -> float:
+            started = time.perf_counter()
+            await http.post(f"/v1/chat/conversations/{conv_id}/messages", json={"text": f"sent {started}"},
+                            headers=app_client.auth(uid))
+            return time.perf_counter() - started
+
+        # Every connection of both participants should see each message
+        per_user = args.connections / args.users
+        rng = random.Random(0)
+        sends = []
+        for _ in range(args.messages):
+            conv_id, a, b = rng.choice(conversations)
+            sends.append(await send(conv_id, rng.choice((a, b))))
+        expected = round(args.messages * 2 * per_user)
+        await _wait_for(lambda: seen["events"] >= expected, SETTLE_SECONDS)
+        fan_out = {
+            "connections": connected,
+            "messages": args.messages,
+            "expectedEvents": expected,
+            "receivedEvents": seen["events"],
+            "sendMs": summarize(sends),
+            "fanOutMs": summarize(latencies),
+        }
+
+        # Slow consumer: one extra connection that can't keep up
+        conv_id, a, b = conversations[0]
+        slow = await hub.subscribe(b)
+        slow_read = 0
+
+        async def read_slowly():
+            nonlocal slow_read
+            while await slow.next() is not None:
+                slow_read += 1
+                await asyncio.sleep(args.slow_ms / 1000)
+
+        reader = asyncio.create_task(read_slowly())
+        before = hub.stats()
+        for _ in range(args.burst):
+            await send(conv_id, a)
+        await _wait_for(lambda: reader.done(), SETTLE_SECONDS)
+        after = hub.stats()
+        reader.cancel()
+        slow_consumer = {
+            "queueSize": REALTIME_QUEUE_SIZE,
+            "burst": args.burst,
+            "slowMsPerEvent": args.slow_ms,
+            "slowConsumerRead": slow_read,
+            "slowConsumerClosed": slow.closed,
+            "delivered": after["delivered"] - before["delivered"],
+            "dropped": after["dropped"] - before["dropped"],
+            "connectionsAfter": after["connections"],
+        }
+
+        for stream in streams:
+            stream.cancel()
+        await asyncio.gather(*streams, return_exceptions=True)
+
+    server.should_exit = True
+    await serving
+    return {"fanOut": fan_out, "slowConsumer": slow_consumer}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure realtime fan-out latency and slow-consumer drops.")
+    parser.add_argument("--connections", type=int, default=1000, help="SSE streams to open")
+    parser.add_argument("--users", type=int, default=200, help="Users the streams belong to (even)")
+    parser.add_argument("--messages", type=int, default=200, help="Messages sent in the fan-out phase")
+    parser.add_argument("--burst", type=int, default=150, help="Messages sent at the slow consumer")
+    parser.add_argument("--slow-ms", type=float, default=50, help="Slow consumer's time per event")
+    args = parser.parse_args()
+
+    app_client.configure()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
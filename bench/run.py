@@ -0,0 +1,286 @@
+# bench/run.py
+# Load test the whole API in-process against the Firestore and OpenAI fakes.
+#
+# The app is driven through an ASGI transport (no sockets), Firestore is
+# bench/fake_firestore.py with optional injected latency, and OpenAI is
+# bench/mock_openai.py served on a local port. Each scenario runs with N
+# concurrent virtual users for a fixed time; results are printed and can
+# be written as JSON and compared against an earlier run.
+#
+# Usage:
+#   python -m bench.run --scenarios mixed,notes --concurrency 20 --duration 10 --out bench/results/head.json
+#   python -m bench.run --baseline bench/results/main.json --out bench/results/head.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _configure(args) -> int:
+    """Point the app at the fakes. Must run before anything imports `app`."""
+    port = _free_port()
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    defaults = {
+        "FIREBASE_BACKEND": "bench.fake_firestore",
+        "FAKE_FIRESTORE_LATENCY_MS": str(args.firestore_latency_ms),
+        "FAKE_FIRESTORE_JITTER_MS": str(args.firestore_jitter_ms),
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "MOCK_OPENAI_LATENCY": str(args.openai_latency_ms / 1000),
+        "NOTIFY_PROVIDER": "log",
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search.sqlite3"),
+        "EMBEDDINGS_PATH": os.path.join(workdir, "embeddings.sqlite3"),
+        "AI_CACHE_PATH": os.path.join(workdir, "ai_cache.sqlite3"),
+    }
+    if not args.rate_limits:
+        defaults["RATE_LIMIT_REQUESTS"] = "default=0"
+        defaults["RATE_LIMIT_TOKENS"] = "0"
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+    return port
+
+
+def _start_mock_openai(port: int):
+    import uvicorn
+    from bench import mock_openai
+
+    server = uvicorn.Server(uvicorn.Config(mock_openai.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="mock-openai", daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return mock_openai
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def summarize(latencies: list[float]) -> dict:
+    return {
+        f"p{int(p * 100)}": round(percentile(latencies, p) * 1000, 2) if latencies else None
+        for p in (0.5, 0.95, 0.99, 1.0)
+    }
+
+
+class Session:
+    """One virtual user: an authenticated client plus per-user state."""
+
+    def __init__(self, client, uid: str, conversations: list[str], recorder: dict, seed: int):
+        self.client = client
+        self.uid = uid
+        self.conversations = conversations
+        self.rng = random.Random(seed)
+        self.etags: dict[str, str] = {}
+        self._recorder = recorder
+
+    async def call(self, name: str, method: str, url: str, auth: bool = True, headers: dict | None = None, **kwargs):
+        headers = dict(headers or {})
+        if auth:
+            headers["Authorization"] = f"Bearer t:{self.uid}"
+        started = time.perf_counter()
+        response = await self.client.request(method, url, headers=headers, **kwargs)
+        elapsed = time.perf_counter() - started
+        stats = self._recorder.setdefault(name, {"latencies": [], "errors": 0})
+        stats["latencies"].append(elapsed)
+        if response.status_code >= 400:
+            stats["errors"] += 1
+            if response.status_code >= 500 or response.status_code == 429:
+                raise RuntimeError(f"{name}: HTTP {response.status_code}")
+        return response
+
+
+async def _setup(client, users: int) -> dict[str, list[str]]:
+    """Log every user in and give each a few conversations with seeded history."""
+    uids = [f"bench-user-{i}" for i in range(users)]
+    for uid in uids:
+        await client.post("/v1/auth/login", json={"id_token": f"t:{uid}"})
+    conversations: dict[str, list[str]] = {uid: [] for uid in uids}
+    for i, uid in enumerate(uids):
+        for step in (1, 2):
+            other = uids[(i + step) % len(uids)]
+            if other == uid:
+                continue
+            response = await client.post(
+                "/v1/chat/conversations",
+                json={"recipient_email": f"{other}@bench.local"},
+                headers={"Authorization": f"Bearer t:{uid}"},
+            )
+            conv_id = response.json()["conversationId"]
+            if conv_id in conversations[uid]:
+                continue
+            conversations[uid].append(conv_id)
+            conversations[other].append(conv_id)
+            await client.post(
+                f"/v1/chat/conversations/{conv_id}/messages:batch",
+                json={"messages": [{"text": f"seed message {n}"} for n in range(20)]},
+                headers={"Authorization": f"Bearer t:{uid}"},
+            )
+    return conversations
+
+
+async def _run_scenario(client, scenario, conversations: dict, concurrency: int, duration: float, seed: int) -> dict:
+    from app.services import firebase
+
+    db = firebase.get_db()
+    recorder: dict[str, dict] = {}
+    uids = list(conversations)
+    sessions = [
+        Session(client, uids[i % len(uids)], conversations[uids[i % len(uids)]], recorder, seed + i)
+        for i in range(concurrency)
+    ]
+    failures = 0
+    deadline = time.perf_counter() + duration
+
+    async def user(session):
+        nonlocal failures
+        while time.perf_counter() < deadline:
+            try:
+                await scenario(session)
+            except Exception:
+                failures += 1
+
+    db.stats.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(user(s) for s in sessions))
+    elapsed = time.perf_counter() - started
+    firestore = db.stats.snapshot()
+
+    latencies = [l for stats in recorder.values() for l in stats["latencies"]]
+    requests = len(latencies)
+    return {
+        "requests": requests,
+        "errors": sum(stats["errors"] for stats in recorder.values()),
+        "failedIterations": failures,
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1) if elapsed else 0,
+        "latencyMs": summarize(latencies),
+        "firestore": {
+            "readsPerRequest": round(firestore["reads"] / requests, 2) if requests else 0,
+            "writesPerRequest": round((firestore["writes"] + firestore["deletes"]) / requests, 2) if requests else 0,
+            "rpcsPerRequest": round(firestore["rpcs"] / requests, 2) if requests else 0,
+        },
+        "operations": {
+            name: {"requests": len(stats["latencies"]), "errors": stats["errors"], "latencyMs": summarize(stats["latencies"])}
+            for name, stats in sorted(recorder.items())
+        },
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Lines describing scenarios whose p95 or throughput got worse by more than `threshold`."""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        old_p95, new_p95 = before["latencyMs"]["p95"], result["latencyMs"]["p95"]
+        if old_p95 and new_p95 and new_p95 > old_p95 * (1 + threshold):
+            regressions.append(f"{name}: p95 {old_p95}ms -> {new_p95}ms")
+        if before["rps"] and result["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['rps']} -> {result['rps']} req/s")
+        if result["firestore"]["readsPerRequest"] > before["firestore"]["readsPerRequest"] * (1 + threshold):
+            regressions.append(
+                f"{name}: Firestore reads/request {before['firestore']['readsPerRequest']} -> {result['firestore']['readsPerRequest']}"
+            )
+    return regressions
+
+
+async def main(args) -> dict:
+    import httpx
+    from app.main import app
+    from bench.scenarios import SCENARIOS
+
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)} (have: {', '.join(SCENARIOS)})")
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            conversations = await _setup(client, args.users)
+            for name in names:
+                result = await _run_scenario(client, SCENARIOS[name], conversations, args.concurrency, args.duration, args.seed)
+                results[name] = result
+                latency = result["latencyMs"]
+                print(
+                    f"{name:<10} {result['requests']:>7} req  {result['rps']:>8} req/s  "
+                    f"p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  "
+                    f"reads/req {result['firestore']['readsPerRequest']}  errors {result['errors']}"
+                )
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API against in-memory fakes.")
+    parser.add_argument("--scenarios", default="mixed", help="Comma-separated scenario names, or 'all'")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario")
+    parser.add_argument("--users", type=int, default=50, help="Distinct user accounts to spread load over")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--firestore-latency-ms", type=float, default=0)
+    parser.add_argument("--firestore-jitter-ms", type=float, default=0)
+    parser.add_argument("--openai-latency-ms", type=float, default=50)
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the AI rate limits on")
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed regression before failing (0.10 = 10%%)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    port = _configure(args)
+    mock = _start_mock_openai(port)
+    started_at = datetime.utcnow().isoformat()
+    scenarios = asyncio.run(main(args))
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "startedAt": started_at,
+            "python": platform.python_version(),
+            "args": vars(args),
+            "openaiCalls": dict(mock.calls),
+        },
+        "scenarios": scenarios,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
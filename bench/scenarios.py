@@ -0,0 +1,99 @@
+# bench/scenarios.py
+# Scripted user journeys for the benchmark runner.
+#
+# Each scenario is an async function run over and over by every virtual
+# user. It talks to the API through `session.call(name, method, url, ...)`,
+# which times the request and records it under `name`.
+
+import random
+from datetime import datetime, timedelta
+
+WORDS = (
+    "lunch tomorrow project meeting dentist groceries weekend trip budget call mom "
+    "remind deadline report gym birthday dinner flight notes review plan coffee"
+).split()
+
+
+def sentence(rng: random.Random, words: int = 8) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+async def login(session):
+    await session.call("login", "POST", "/v1/auth/login", json={"id_token": f"t:{session.uid}"}, auth=False)
+
+
+async def chat_poll(session):
+    conv_id = session.rng.choice(session.conversations)
+    headers = {}
+    etag = session.etags.get(conv_id)
+    if etag:
+        headers["If-None-Match"] = etag
+    response = await session.call("poll", "GET", f"/v1/chat/conversations/{conv_id}/messages?limit=20", headers=headers)
+    if response.headers.get("ETag"):
+        session.etags[conv_id] = response.headers["ETag"]
+
+
+async def chat_send(session):
+    conv_id = session.rng.choice(session.conversations)
+    await session.call("send", "POST", f"/v1/chat/conversations/{conv_id}/messages", json={"text": sentence(session.rng)})
+
+
+async def inbox(session):
+    response = await session.call("inbox", "GET", "/v1/chat/conversations?limit=20")
+    unread = [c["conversationId"] for c in response.json() if c.get("unreadCount")]
+    if unread:
+        await session.call("mark_read", "POST", f"/v1/chat/conversations/{session.rng.choice(unread)}/read")
+
+
+async def notes(session):
+    response = await session.call("note_create", "POST", "/v1/notepad/", json={
+        "title": sentence(session.rng, 3),
+        "summary": sentence(session.rng, 30),
+    })
+    note_id = response.json()["noteId"]
+    await session.call("note_get", "GET", f"/v1/notepad/{note_id}")
+    await session.call("note_update", "PATCH", f"/v1/notepad/{note_id}", json={"summary": sentence(session.rng, 30)})
+    await session.call("note_list", "GET", "/v1/notepad/?limit=20")
+    await session.call("note_delete", "DELETE", f"/v1/notepad/{note_id}")
+
+
+async def reminders(session):
+    when = (datetime.utcnow() + timedelta(days=session.rng.randint(1, 30))).replace(microsecond=0)
+    response = await session.call("reminder_create", "POST", "/v1/reminders/", json={
+        "title": sentence(session.rng, 4),
+        "schedule_type": session.rng.choice(["once", "daily", "weekly"]),
+        "trigger_at": when.isoformat(),
+        "timezone": "Europe/Paris",
+    })
+    await session.call("reminder_list", "GET", "/v1/reminders/")
+    await session.call("reminder_delete", "DELETE", f"/v1/reminders/{response.json()['reminderId']}")
+
+
+async def ai(session):
+    messages = [{"isOwn": i % 2 == 0, "text": sentence(session.rng)} for i in range(6)]
+    await session.call("ai_suggest", "POST", "/v1/ai/suggest", json={"messages": messages})
+    await session.call("ai_summarize", "POST", "/v1/ai/summarize", json={
+        "messages": [{"senderId": session.uid, "text": m["text"]} for m in messages],
+    })
+    await session.call("ai_ask", "POST", "/v1/ai/ask", json={"question": f"question about {sentence(session.rng, 3)}"})
+
+
+# Rough production mix: mostly polling, some sending, the rest occasional
+MIX = [(chat_poll, 50), (chat_send, 20), (notes, 10), (ai, 10), (reminders, 5), (login, 5)]
+
+
+async def mixed(session):
+    scenario = session.rng.choices([s for s, _ in MIX], weights=[w for _, w in MIX])[0]
+    await scenario(session)
+
+
+SCENARIOS = {
+    "login": login,
+    "chat_poll": chat_poll,
+    "chat_send": chat_send,
+    "inbox": inbox,
+    "notes": notes,
+    "reminders": reminders,
+    "ai": ai,
+    "mixed": mixed,
+}
@@ -0,0 +1,119 @@
+# bench/search.py
+# Query latency of the full-text search index at a million documents.
+#
+# Bulk-loads `--docs` synthetic notes and messages into a fresh
+# SearchIndex in a temp directory, the way scripts/rebuild_search_index.py
+# does (upsert_many pages, then optimize), spread over `--users` owners.
+# Words are drawn from a Zipf-distributed vocabulary so some terms are
+# common and most are rare. It then runs `--queries` searches from random
+# users, one or two words each, some cut short to exercise prefix matching,
+# and reports latency, hits and the size of the index on disk.
+#
+# Usage: python -m bench.search --docs 1000000 --users 10000 --queries 2000
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+
+PAGE = 5000  # Rows per upsert_many call
+SYLLABLES = "ka lo mi ne ru sa ti vo ze bar den fil gor hum jin kel mor pat".split()
+
+
+def _vocabulary(size: int) -> tuple[list[str], list[float]]:
+    words = ["".join(parts) for n in (2, 3) for parts in itertools.product(SYLLABLES, repeat=n)][:size]
+    cumulative = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    return words, cumulative
+
+
+def _docs(count: int, users: int, words: list[str], cumulative: list[float], rng: random.Random):
+    for i in range(count):
+        text = " ".join(rng.choices(words, cum_weights=cumulative, k=rng.randint(5, 40)))
+        if i % 10 == 0:
+            owner = f"user-{rng.randrange(users)}"
+            yield ("note", f"n{i}", "", [owner], f"Note {text.split()[0]}", text, f"2026-01-01T00:00:{i:07d}")
+        else:
+            a, b = rng.sample(range(users), 2)
+            yield ("message", f"m{i}", f"conv-{min(a, b)}-{max(a, b)}", [f"user-{a}", f"user-{b}"], "", text,
+                   f"2026-01-01T00:00:{i:07d}")
+
+
+def _load(index, count: int, users: int, words, cumulative, rng) -> dict:
+    started = time.perf_counter()
+    page = []
+    for doc in _docs(count, users, words, cumulative, rng):
+        page.append(doc)
+        if len(page) == PAGE:
+            index.upsert_many(page)
+            page = []
+    if page:
+        index.upsert_many(page)
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    index.optimize()
+    return {
+        "loadSeconds": round(loaded, 1),
+        "docsPerSecond": round(count / loaded),
+        "optimizeSeconds": round(time.perf_counter() - started, 1),
+    }
+
+
+async def _queries(index, queries: int, users: int, words, cumulative, rng) -> dict:
+    from bench.run import summarize
+
+    timings, hits = {"words": [], "prefixes": []}, []
+    for _ in range(queries):
+        terms = rng.choices(words, cum_weights=cumulative, k=rng.choice((1, 2)))
+        # A third of the queries are typed-ahead prefixes
+        prefix = rng.random() < 1 / 3
+        text = " ".join(term[:3] if prefix else term for term in terms)
+        uid = f"user-{rng.randrange(users)}"
+        started = time.perf_counter()
+        results = await index.search(uid, text)
+        timings["prefixes" if prefix else "words"].append(time.perf_counter() - started)
+        hits.append(len(results))
+    return {
+        "queries": queries,
+        "latencyMs": summarize(timings["words"] + timings["prefixes"]),
+        "wordLatencyMs": summarize(timings["words"]),
+        "prefixLatencyMs": summarize(timings["prefixes"]),
+        "meanHits": round(sum(hits) / len(hits), 1),
+        "emptyResults": sum(1 for h in hits if h == 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure search query latency over a large index.")
+    parser.add_argument("--docs", type=int, default=1_000_000, help="Documents to index")
+    parser.add_argument("--users", type=int, default=10_000, help="Distinct owners")
+    parser.add_argument("--vocabulary", type=int, default=5000, help="Distinct words")
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("FIREBASE_BACKEND", "bench.fake_firestore")
+    from app.services.search_index import SearchIndex
+
+    rng = random.Random(0)
+    words, cumulative = _vocabulary(args.vocabulary)
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "search.sqlite3")
+    index = SearchIndex(path)
+    try:
+        report = {
+            "docs": args.docs,
+            "users": args.users,
+            "vocabulary": len(words),
+            **_load(index, args.docs, args.users, words, cumulative, rng),
+            "diskMB": round(sum(os.path.getsize(f) for f in (path, path + "-wal") if os.path.exists(f)) / 1e6, 1),
+            **asyncio.run(_queries(index, args.queries, args.users, words, cumulative, rng)),
+        }
+    finally:
+        index.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# bench/send.py
+# Message send throughput for each Firestore write path.
+#
+# `--senders` concurrent senders each send `--messages` messages, spread
+# over `--conversations` conversations (fewer conversations = hotter ones),
+# while the Firestore fake sleeps `--latency-ms` per call:
+#   before      what send_message did before batched writes: read the
+#               conversation, set the message, update the preview, in three
+#               sequential round trips
+#   batched     repository.add_message: message, preview and inbox entries
+#               in one commit
+#   microbatch  the same through MessageBatcher(`--window-ms`), as with
+#               SEND_MICROBATCH_MS, so messages arriving together share a commit
+#   bulk        repository.add_messages, as POST /messages:batch does with
+#               a client's offline queue of up to 200 messages
+#
+# Usage: python -m bench.send --senders 100 --messages 20 --conversations 10 --latency-ms 10 --window-ms 5
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+QUEUE = 200  # Messages per bulk request, as MAX_BATCH_MESSAGES
+
+
+def _message(uid: str, i: int) -> tuple[dict, dict]:
+    now = datetime.utcnow().isoformat()
+    msg = {"messageId": str(uuid.uuid4()), "senderId": uid, "text": f"message {i}", "aiSuggested": False,
+           "timestamp": now, "readBy": [uid]}
+    return msg, {"lastMessage": msg["text"], "lastMessageAt": now}
+
+
+async def _measure(db, senders: int, messages: int, conversations: int, send) -> dict:
+    from bench.run import summarize
+
+    timings: list[float] = []
+
+    async def sender(s: int):
+        conv_id = f"conv-{s % conversations}"
+        members = frozenset([f"user-{s % conversations}", f"friend-{s % conversations}"])
+        uid = sorted(members)[s // conversations % 2]
+        await send(conv_id, members, uid, messages, timings)
+
+    db.stats.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(sender(s) for s in range(senders)))
+    elapsed = time.perf_counter() - started
+    stats = db.stats.snapshot()
+    total = senders * messages
+    return {
+        "messages": total,
+        "messagesPerSecond": round(total / elapsed, 1),
+        "rpcsPerMessage": round(stats["rpcs"] / total, 3),
+        "writesPerMessage": round(stats["writes"] / total, 3),
+        "latencyMs": summarize(timings),
+    }
+
+
+async def run(db, args) -> dict:
+    from app.services import repository
+
+    async def before(conv_id, members, uid, count, timings):
+        conv_ref = db.collection("conversations").document(conv_id)
+        for i in range(count):
+            started = time.perf_counter()
+            msg, preview = _message(uid, i)
+            await repository.run(conv_ref.get)
+            await repository.run(conv_ref.collection("messages").document(msg["messageId"]).set, msg)
+            await repository.run(conv_ref.update, preview)
+            timings.append(time.perf_counter() - started)
+
+    async def batched(conv_id, members, uid, count, timings):
+        for i in range(count):
+            started = time.perf_counter()
+            msg, preview = _message(uid, i)
+            await repository.add_message(conv_id, msg, preview, members)
+            timings.append(time.perf_counter() - started)
+
+    batcher = repository.MessageBatcher(args.window_ms)
+
+    async def microbatch(conv_id, members, uid, count, timings):
+        for i in range(count):
+            started = time.perf_counter()
+            msg, preview = _message(uid, i)
+            await batcher.add(conv_id, msg, preview, members)
+            timings.append(time.perf_counter() - started)
+
+    async def bulk(conv_id, members, uid, count, timings):
+        # Latency is per request here, not per message
+        for start in range(0, count, QUEUE):
+            started = time.perf_counter()
+            queue = [_message(uid, i) for i in range(start, min(count, start + QUEUE))]
+            await repository.add_messages(conv_id, [msg for msg, _ in queue], queue[-1][1], members)
+            timings.append(time.perf_counter() - started)
+
+    load = (args.senders, args.messages, args.conversations)
+    report = {}
+    for name, send in [("before", before), ("batched", batched), ("microbatch", microbatch), ("bulk", bulk)]:
+        report[name] = await _measure(db, *load, send)
+    report["microbatch"]["commits"] = batcher.stats()["commits"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare message send throughput across write paths.")
+    parser.add_argument("--senders", type=int, default=100, help="Concurrent senders")
+    parser.add_argument("--messages", type=int, default=20, help="Messages per sender")
+    parser.add_argument("--conversations", type=int, default=10, help="Conversations the senders share")
+    parser.add_argument("--latency-ms", type=float, default=10, help="Simulated Firestore round trip")
+    parser.add_argument("--window-ms", type=float, default=5, help="Micro-batching window")
+    args = parser.parse_args()
+
+    os.environ.setdefault("FIREBASE_BACKEND", "bench.fake_firestore")
+    from app.config import FIRESTORE_MAX_CONCURRENCY
+    from app.services import firebase
+    from bench.fake_firestore import FakeFirestore
+
+    db = FakeFirestore()
+    firebase.set_db(db)
+    for c in range(args.conversations):
+        db.collection("conversations").document(f"conv-{c}").set({
+            "conversationId": f"conv-{c}", "participants": [f"user-{c}", f"friend-{c}"],
+            "lastMessage": "", "lastMessageAt": datetime.utcnow().isoformat(),
+        })
+    db.latency = args.latency_ms / 1000
+
+    report = {
+        "senders": args.senders,
+        "conversations": args.conversations,
+        "firestoreLatencyMs": args.latency_ms,
+        "windowMs": args.window_ms,
+        "pool": FIRESTORE_MAX_CONCURRENCY,
+        **asyncio.run(run(db, args)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# bench/startup.py
+# Cold-start benchmark: import cost of app.main and time to first served request.
+#
+# Each run starts a fresh interpreter, so nothing is warm except the OS page
+# cache. `python -X importtime` gives the per-module import breakdown; the
+# slowest modules are listed so regressions can be traced to a dependency.
+#
+# Usage: python -m bench.startup --runs 5 --out bench/results/startup.json
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("FIREBASE_BACKEND", "bench.fake_firestore")
+    env.setdefault("OPENAI_API_KEY", "sk-bench")
+    env.setdefault("NOTIFY_PROVIDER", "log")
+    return env
+
+
+def import_times(top: int) -> dict:
+    """Total `import app.main` time and the slowest modules (cumulative, ms)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=_env(), capture_output=True, text=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:       123 |        456 |   package.module"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    app_main = next((cumulative for name, _, cumulative in modules if name == "app.main"), None)
+    slowest = sorted(modules, key=lambda m: m[1], reverse=True)[:top]
+    return {
+        "appMainMs": round(app_main / 1000, 1) if app_main else None,
+        "slowestSelfMs": {name: round(self_us / 1000, 1) for name, self_us, _ in slowest},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_request(timeout: float = 60) -> float:
+    """Seconds from spawning uvicorn to the first 200 from GET /."""
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+        raise TimeoutError("Server did not answer")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import and cold-start time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    imports = [import_times(args.top) for _ in range(args.runs)]
+    starts = [time_to_first_request() for _ in range(args.runs)]
+    report = {
+        "importMs": {
+            "median": statistics.median(i["appMainMs"] for i in imports),
+            "runs": [i["appMainMs"] for i in imports],
+        },
+        "firstRequestMs": {
+            "median": round(statistics.median(starts) * 1000, 1),
+            "runs": [round(s * 1000, 1) for s in starts],
+        },
+        "slowestModulesMs": imports[-1]["slowestSelfMs"],
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# scripts/archive_cold_data.py
+# Move old messages and inactive reminders out of Firestore into the archive.
+#
+# Messages older than ARCHIVE_AFTER_DAYS are written to gzip JSONL segments
+# (ARCHIVE_PATH / ARCHIVE_STORE) and then deleted; get_messages keeps serving
+# them from the segments. Inactive reminders whose last trigger is that old
+# go to per-user segments. Safe to rerun, including after an interrupted run.
+#
+# Usage: python -m scripts.archive_cold_data [--dry-run] [--messages-only | --reminders-only]
+
+import sys
+import time
+from app.services import archive
+
+
+def main(dry_run: bool = False, messages: bool = True, reminders: bool = True):
+    cutoff = archive.horizon()
+    started = time.perf_counter()
+    suffix = " (dry run)" if dry_run else ""
+
+    if messages:
+        scanned, moved = archive.archive_messages(cutoff, dry_run)
+        print(f"Scanned {scanned} conversations, archived {moved} messages older than {cutoff}{suffix}")
+    if reminders:
+        moved = archive.archive_reminders(cutoff, dry_run)
+        print(f"Archived {moved} inactive reminders older than {cutoff}{suffix}")
+
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main(
+        dry_run="--dry-run" in sys.argv,
+        messages="--reminders-only" not in sys.argv,
+        reminders="--messages-only" not in sys.argv,
+    )
@@ -0,0 +1,58 @@
+# scripts/backfill_inbox.py
+# One-off migration: create users/{uid}/inbox/{conv_id} for existing conversations.
+#
+# Copies the list fields of every conversation into each participant's
+# inbox. Existing history counts as read; unread counts already kept by
+# live traffic are left alone. Safe to run more than once.
+#
+# Usage: python -m scripts.backfill_inbox [--dry-run]
+
+import sys
+from firebase_admin import firestore
+from app.services.firebase import db
+from app.services.repository import inbox_entry
+
+PAGE_SIZE = 500
+BATCH_SIZE = 400  # Firestore allows at most 500 writes per batch
+
+
+def _pages():
+    query = db.collection("conversations").order_by("__name__").limit(PAGE_SIZE)
+    last = None
+    while True:
+        page = (query.start_after(last) if last else query).get()
+        if not page:
+            return
+        yield page
+        last = page[-1]
+
+
+def main(dry_run: bool = False):
+    batch, pending, scanned, written = db.batch(), 0, 0, 0
+
+    for page in _pages():
+        for doc in page:
+            scanned += 1
+            conv = doc.to_dict()
+            entry = inbox_entry(conv)
+            # Increment(0) creates the counter at 0 but keeps one a newer message already bumped
+            entry["unreadCount"] = firestore.Increment(0)
+            for uid in entry["participants"]:
+                ref = db.collection("users").document(uid).collection("inbox").document(doc.id)
+                batch.set(ref, entry, merge=True)
+                pending += 1
+                written += 1
+            if pending >= BATCH_SIZE:
+                if not dry_run:
+                    batch.commit()
+                batch, pending = db.batch(), 0
+
+    if pending and not dry_run:
+        batch.commit()
+
+    print(f"Scanned {scanned} conversations, wrote {written} inbox entries"
+          + (" (dry run)" if dry_run else ""))
+
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv)
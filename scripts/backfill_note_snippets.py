@@ -0,0 +1,53 @@
+# scripts/backfill_note_snippets.py
+# Migration: add `snippet` to notes created before the list view was projected.
+#
+# GET /notepad/ only reads noteId, title, snippet and timestamps, so older
+# notes show an empty preview until this has run. Safe to run more than once.
+#
+# Usage: python -m scripts.backfill_note_snippets [--dry-run]
+
+import sys
+from app.routes.notepad import make_snippet
+from app.services.firebase import db
+
+PAGE_SIZE = 500
+BATCH_SIZE = 400  # Firestore allows at most 500 writes per batch
+
+
+def _pages():
+    query = db.collection("notes").order_by("__name__").limit(PAGE_SIZE)
+    last = None
+    while True:
+        page = (query.start_after(last) if last else query).get()
+        if not page:
+            return
+        yield page
+        last = page[-1]
+
+
+def main(dry_run: bool = False):
+    batch, pending, scanned, updated = db.batch(), 0, 0, 0
+
+    for page in _pages():
+        for doc in page:
+            scanned += 1
+            note = doc.to_dict()
+            snippet = make_snippet(note.get("summary", ""))
+            if note.get("snippet") == snippet:
+                continue
+            batch.update(doc.reference, {"snippet": snippet})
+            pending += 1
+            updated += 1
+            if pending >= BATCH_SIZE:
+                if not dry_run:
+                    batch.commit()
+                batch, pending = db.batch(), 0
+
+    if pending and not dry_run:
+        batch.commit()
+
+    print(f"Scanned {scanned} notes, set snippet on {updated}" + (" (dry run)" if dry_run else ""))
+
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv)
@@ -0,0 +1,75 @@
+# scripts/backfill_pair_keys.py
+# One-off migration: give existing conversations a pair key.
+#
+# Sets `pairKey` on every two-person conversation and creates the
+# `conversationPairs/{pairKey}` lookup documents used by start_conversation.
+# If a pair already has duplicate conversations, the most recently active
+# one becomes canonical. Safe to run more than once.
+#
+# Usage: python -m scripts.backfill_pair_keys [--dry-run]
+
+import sys
+from app.services.firebase import db
+from app.services.repository import pair_key
+
+PAGE_SIZE = 500
+BATCH_SIZE = 400  # Firestore allows at most 500 writes per batch
+
+
+def _pages():
+    query = db.collection("conversations").order_by("__name__").limit(PAGE_SIZE)
+    last = None
+    while True:
+        page = (query.start_after(last) if last else query).get()
+        if not page:
+            return
+        yield page
+        last = page[-1]
+
+
+def main(dry_run: bool = False):
+    canonical = {}  # pairKey -> (lastMessageAt, conversationId, participants)
+    batch, pending, scanned, updated = db.batch(), 0, 0, 0
+
+    for page in _pages():
+        for doc in page:
+            scanned += 1
+            conv = doc.to_dict()
+            participants = conv.get("participants", [])
+            if len(participants) != 2:
+                continue
+
+            key = pair_key(*participants)
+            candidate = (conv.get("lastMessageAt", ""), doc.id, participants)
+            if key not in canonical or candidate > canonical[key]:
+                canonical[key] = candidate
+
+            if conv.get("pairKey") != key:
+                batch.update(doc.reference, {"pairKey": key})
+                pending += 1
+                updated += 1
+            if pending >= BATCH_SIZE:
+                if not dry_run:
+                    batch.commit()
+                batch, pending = db.batch(), 0
+
+    for key, (_, conv_id, participants) in canonical.items():
+        batch.set(db.collection("conversationPairs").document(key), {
+            "conversationId": conv_id,
+            "participants": participants,
+        })
+        pending += 1
+        if pending >= BATCH_SIZE:
+            if not dry_run:
+                batch.commit()
+            batch, pending = db.batch(), 0
+
+    if pending and not dry_run:
+        batch.commit()
+
+    print(f"Scanned {scanned} conversations, set pairKey on {updated}, wrote {len(canonical)} pair documents"
+          + (" (dry run)" if dry_run else ""))
+
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv)
@@ -0,0 +1,55 @@
+# scripts/backfill_reminder_shards.py
+# Migration: (re)assign every reminder to its shard.
+#
+# Run after first enabling sharding or after changing REMINDER_SHARDS, so
+# `shard` matches crc32(userId) % REMINDER_SHARDS everywhere. Safe to run
+# more than once; only reminders whose shard changes are written.
+#
+# Usage: REMINDER_SHARDS=8 python -m scripts.backfill_reminder_shards [--dry-run]
+
+import sys
+from app.config import REMINDER_SHARDS
+from app.services.coordination import shard_for
+from app.services.firebase import db
+
+PAGE_SIZE = 500
+BATCH_SIZE = 400  # Firestore allows at most 500 writes per batch
+
+
+def _pages():
+    query = db.collection("reminders").order_by("__name__").limit(PAGE_SIZE)
+    last = None
+    while True:
+        page = (query.start_after(last) if last else query).get()
+        if not page:
+            return
+        yield page
+        last = page[-1]
+
+
+def main(dry_run: bool = False):
+    batch, pending, scanned, updated = db.batch(), 0, 0, 0
+
+    for page in _pages():
+        for doc in page:
+            scanned += 1
+            shard = shard_for(doc.to_dict()["userId"], REMINDER_SHARDS)
+            if doc.to_dict().get("shard") == shard:
+                continue
+            batch.update(doc.reference, {"shard": shard})
+            pending += 1
+            updated += 1
+            if pending >= BATCH_SIZE:
+                if not dry_run:
+                    batch.commit()
+                batch, pending = db.batch(), 0
+
+    if pending and not dry_run:
+        batch.commit()
+
+    print(f"Scanned {scanned} reminders, set shard on {updated} ({REMINDER_SHARDS} shards)"
+          + (" (dry run)" if dry_run else ""))
+
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv)
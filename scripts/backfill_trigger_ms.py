@@ -0,0 +1,56 @@
+# scripts/backfill_trigger_ms.py
+# Migration: normalize reminder trigger times.
+#
+# Rewrites `triggerAt` as naive UTC (older reminders may carry an offset)
+# and adds `triggerAtMs`, the epoch-millisecond field the dispatcher's range
+# queries use. Reminders without it are invisible to the dispatcher, so run
+# this once before deploying. Safe to run more than once.
+#
+# Usage: python -m scripts.backfill_trigger_ms [--dry-run]
+
+import sys
+from app.services.firebase import db
+from app.services.recurrence import parse_datetime, trigger_fields
+from datetime import timezone
+
+PAGE_SIZE = 500
+BATCH_SIZE = 400  # Firestore allows at most 500 writes per batch
+
+
+def _pages():
+    query = db.collection("reminders").order_by("__name__").limit(PAGE_SIZE)
+    last = None
+    while True:
+        page = (query.start_after(last) if last else query).get()
+        if not page:
+            return
+        yield page
+        last = page[-1]
+
+
+def main(dry_run: bool = False):
+    batch, pending, scanned, updated = db.batch(), 0, 0, 0
+
+    for page in _pages():
+        for doc in page:
+            scanned += 1
+            reminder = doc.to_dict()
+            fields = trigger_fields(parse_datetime(reminder["triggerAt"], timezone.utc))
+            if all(reminder.get(k) == v for k, v in fields.items()):
+                continue
+            batch.update(doc.reference, fields)
+            pending += 1
+            updated += 1
+            if pending >= BATCH_SIZE:
+                if not dry_run:
+                    batch.commit()
+                batch, pending = db.batch(), 0
+
+    if pending and not dry_run:
+        batch.commit()
+
+    print(f"Scanned {scanned} reminders, normalized {updated}" + (" (dry run)" if dry_run else ""))
+
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv)
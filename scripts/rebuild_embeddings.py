@@ -0,0 +1,71 @@
+# scripts/rebuild_embeddings.py
+# Rebuild the embedding store from Firestore.
+#
+# Re-creates every user's entries from all notes and chat messages. Texts
+# already in the vector cache (same model, same text) aren't embedded
+# again, so re-running this is cheap; only new or changed text costs
+# provider calls. Use it after switching EMBEDDINGS_MODEL or to fill gaps
+# left by failed background batches. Afterwards, cached vectors no entry
+# uses any more (deleted or edited text) are pruned.
+#
+# Usage: python -m scripts.rebuild_embeddings [--keep]
+#   --keep  add to the existing entries instead of clearing them first
+
+import asyncio
+import sys
+import time
+from app.services.embeddings import embedding_store, entries_for
+from app.services.firebase import db
+
+PAGE_SIZE = 1000
+
+
+def _pages(query):
+    query = query.order_by("__name__").limit(PAGE_SIZE)
+    last = None
+    while True:
+        page = (query.start_after(last) if last else query).get()
+        if not page:
+            return
+        yield page
+        last = page[-1]
+
+
+async def main(keep: bool = False):
+    started = time.perf_counter()
+    if not keep:
+        embedding_store.clear_entries()
+
+    notes = 0
+    for page in _pages(db.collection("notes")):
+        entries = []
+        for doc in page:
+            note = doc.to_dict()
+            entries += entries_for([note["userId"]], "note", note["noteId"], f"{note.get('title', '')}\n{note.get('summary', '')}")
+        await embedding_store.index(entries)
+        notes += len(page)
+
+    messages, participants = 0, {}
+    for page in _pages(db.collection_group("messages")):
+        missing = {doc.reference.parent.parent.id for doc in page} - participants.keys()
+        if missing:
+            refs = [db.collection("conversations").document(conv_id) for conv_id in missing]
+            for snap in db.get_all(refs, field_paths=["participants"]):
+                participants[snap.id] = snap.to_dict().get("participants", []) if snap.exists else []
+        entries = []
+        for doc in page:
+            conv_id = doc.reference.parent.parent.id
+            message = doc.to_dict()
+            entries += entries_for(participants.get(conv_id, []), "message", message["messageId"], message.get("text", ""), conv_id)
+        await embedding_store.index(entries)
+        messages += len(page)
+        print(f"  {messages} messages processed", end="\r")
+
+    pruned = embedding_store.prune_vectors()
+    stats = embedding_store.stats()
+    print(f"Processed {notes} notes and {messages} messages in {time.perf_counter() - started:.1f}s: "
+          f"{stats['embedded']} embedded, {stats['cacheHits']} from cache, {pruned} unused vectors pruned")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(keep="--keep" in sys.argv))
@@ -0,0 +1,68 @@
+# scripts/rebuild_search_index.py
+# Rebuild the local full-text search index from Firestore.
+#
+# Streams every note and every chat message (via a collection group query)
+# into SEARCH_INDEX_PATH. Conversation participants are fetched in bulk
+# for each page of messages. Writes made by the API while this runs are
+# upserts too, so nothing is lost; run it on each host that serves search.
+#
+# Usage: python -m scripts.rebuild_search_index [--keep]
+#   --keep  upsert into the existing index instead of clearing it first
+
+import sys
+import time
+from app.services.firebase import db
+from app.services.search_index import message_row, note_row, search_index
+
+PAGE_SIZE = 1000
+
+
+def _pages(query):
+    query = query.order_by("__name__").limit(PAGE_SIZE)
+    last = None
+    while True:
+        page = (query.start_after(last) if last else query).get()
+        if not page:
+            return
+        yield page
+        last = page[-1]
+
+
+def _participants(conv_ids, known: dict) -> dict:
+    missing = [conv_id for conv_id in conv_ids if conv_id not in known]
+    if missing:
+        refs = [db.collection("conversations").document(conv_id) for conv_id in missing]
+        for snap in db.get_all(refs, field_paths=["participants"]):
+            known[snap.id] = snap.to_dict().get("participants", []) if snap.exists else []
+    return known
+
+
+def main(keep: bool = False):
+    started = time.perf_counter()
+    if not keep:
+        search_index.clear()
+
+    notes = 0
+    for page in _pages(db.collection("notes")):
+        search_index.upsert_many([note_row(doc.to_dict()) for doc in page])
+        notes += len(page)
+
+    messages, participants = 0, {}
+    for page in _pages(db.collection_group("messages")):
+        conv_ids = {doc.reference.parent.parent.id for doc in page}
+        _participants(conv_ids, participants)
+        rows = []
+        for doc in page:
+            conv_id = doc.reference.parent.parent.id
+            if participants.get(conv_id):
+                rows.append(message_row(conv_id, participants[conv_id], doc.to_dict()))
+        search_index.upsert_many(rows)
+        messages += len(rows)
+        print(f"  {messages} messages indexed", end="\r")
+
+    search_index.optimize()
+    print(f"Indexed {notes} notes and {messages} messages in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main(keep="--keep" in sys.argv)
@@ -0,0 +1,39 @@
+# scripts/user_data.py
+# Export one user's data to a file, or import such a file (GDPR requests, account moves).
+#
+# The file is gzip-compressed JSONL as produced by app/services/export.py,
+# the same records GET /v1/auth/export streams. Both directions stream, so
+# they work for accounts of any size.
+#
+# Usage:
+#   python -m scripts.user_data export <uid> <file.jsonl.gz>
+#   python -m scripts.user_data import <file.jsonl.gz>
+
+import gzip
+import sys
+from app.services import export
+
+
+def export_to(uid: str, path: str):
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for line in export.to_jsonl(export.export_user(uid)):
+            f.write(line)
+            count += 1
+    print(f"Exported {count} records for {uid} to {path}")
+
+
+def import_from(path: str):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        counts = export.import_records(export.from_jsonl(f))
+    print(f"Imported {sum(counts.values())} records: "
+          + ", ".join(f"{n} {kind}" for kind, n in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "export":
+        export_to(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 3 and sys.argv[1] == "import":
+        import_from(sys.argv[2])
+    else:
+        sys.exit("Usage: python -m scripts.user_data export <uid> <file.jsonl.gz> | import <file.jsonl.gz>")
@@ -0,0 +1,88 @@
+# tests/conftest.py
+# Shared fixtures. The app runs against the fakes in bench/: Firestore in
+# memory (ID tokens of the form "t:<uid>") and the mock OpenAI server on a
+# local port. Settings are read at import, so they're set here before
+# anything imports `app`.
+
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+import pytest
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+_PORT = _free_port()
+_WORKDIR = tempfile.mkdtemp(prefix="tests-")
+
+os.environ.update({
+    "FIREBASE_BACKEND": "bench.fake_firestore",
+    "OPENAI_API_KEY": "sk-test",
+    "OPENAI_BASE_URL": f"http://127.0.0.1:{_PORT}/v1",
+    "OPENAI_MAX_RETRIES": "0",
+    "MOCK_OPENAI_LATENCY": "0",
+    "MOCK_OPENAI_TOKEN_DELAY": "0",
+    "AI_CACHE_BACKEND": "none",  # Every test sees its own upstream calls
+    "EMBEDDINGS_PROVIDER": "fake",
+    "NOTIFY_PROVIDER": "log",
+    "SCHEDULER_IN_API": "false",
+    "RATE_LIMIT_REQUESTS": "default=0",
+    "RATE_LIMIT_TOKENS": "0",
+    "SEARCH_INDEX_PATH": os.path.join(_WORKDIR, "search.sqlite3"),
+    "EMBEDDINGS_PATH": os.path.join(_WORKDIR, "embeddings.sqlite3"),
+    "AI_CACHE_PATH": os.path.join(_WORKDIR, "ai_cache.sqlite3"),
+    "ARCHIVE_PATH": os.path.join(_WORKDIR, "archive"),
+})
+
+
+@pytest.fixture(scope="session")
+def run():
+    """Run a coroutine to completion. One loop for the session: the OpenAI client is bound to it."""
+    from app.services import ai_service
+
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.run_until_complete(ai_service.close_client())
+    loop.close()
+
+
+@pytest.fixture
+def db():
+    """A fresh, empty Firestore fake behind `firebase.db`."""
+    from app.services import firebase
+    from bench.fake_firestore import FakeFirestore
+
+    fake = FakeFirestore()
+    firebase.set_db(fake)
+    yield fake
+    firebase.set_db(None)
+
+
+@pytest.fixture(scope="session")
+def _mock_openai_server():
+    import uvicorn
+    from bench import mock_openai
+
+    server = uvicorn.Server(uvicorn.Config(mock_openai.app, host="127.0.0.1", port=_PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="mock-openai", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield mock_openai
+    server.should_exit = True
+    thread.join(5)
+
+
+@pytest.fixture
+def mock_openai(_mock_openai_server):
+    """The mock OpenAI module, with its call counters zeroed."""
+    for key in _mock_openai_server.calls:
+        _mock_openai_server.calls[key] = 0
+    return _mock_openai_server
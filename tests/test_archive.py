@@ -0,0 +1,209 @@
+# tests/test_archive.py
+# Cold storage against the Firestore fake and a local segment store:
+# messages move into segments in order, an interrupted run resumes without
+# losing or repeating anything (even inside a run of equal timestamps),
+# paging reads through the archive boundary seamlessly, reminders are
+# segmented per user, and a user's export imports back as it was.
+
+from datetime import datetime, timedelta
+import pytest
+from app.services import archive, export, firebase
+from app.services.archive import LocalStore, archive_conversation, archive_reminders
+from bench.fake_firestore import FakeFirestore
+
+CONV_ID = "conv-archive"
+OLD = datetime(2020, 1, 1)
+CUTOFF = "2021-01-01T00:00:00"
+TIES = 7  # Messages per timestamp, so segment and page boundaries fall inside ties
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalStore(str(tmp_path / "archive"))
+    monkeypatch.setattr(archive, "archive_store", store)
+    monkeypatch.setattr(export, "archive_store", store)
+    archive._read_segment.cache_clear()
+    yield store
+    archive._read_segment.cache_clear()
+
+
+@pytest.fixture
+def small_segments(monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_SEGMENT_SIZE", 40)
+    monkeypatch.setattr(archive, "PAGE_SIZE", 15)
+
+
+def _message(i: int, recent: bool = False) -> dict:
+    at = datetime.utcnow() - timedelta(days=1) if recent else OLD
+    message_id = f"{'r' if recent else 'm'}{(i * 37) % 1000:03d}-{i}"  # IDs out of step with arrival order
+    return {"messageId": message_id, "senderId": "alice", "text": f"Message {i}",
+            "timestamp": (at + timedelta(seconds=i // TIES)).isoformat()}
+
+
+def _conversation(db, old: int, recent: int = 0) -> list[str]:
+    """Seed a conversation; returns every messageId in (timestamp, ID) order."""
+    conv_ref = db.collection("conversations").document(CONV_ID)
+    conv_ref.set({"conversationId": CONV_ID, "participants": ["alice", "bob"], "createdAt": OLD.isoformat()})
+    messages = [_message(i) for i in range(old)] + [_message(i, recent=True) for i in range(recent)]
+    for i in range(0, len(messages), 400):
+        batch = db.batch()
+        for message in messages[i:i + 400]:
+            batch.set(conv_ref.collection("messages").document(message["messageId"]), message)
+        batch.commit()
+    return [m["messageId"] for m in sorted(messages, key=lambda m: (m["timestamp"], m["messageId"]))]
+
+
+def _conv_ref(db):
+    return db.collection("conversations").document(CONV_ID)
+
+
+def _live(db) -> list[str]:
+    docs = _conv_ref(db).collection("messages").order_by("timestamp").order_by("__name__").get()
+    return [doc.id for doc in docs]
+
+
+def _segments(db, store) -> list[list[str]]:
+    segments = _conv_ref(db).collection("archive").order_by("firstAt").get()
+    return [[m["messageId"] for m in store.read(segment.get("key"))] for segment in segments]
+
+
+def test_messages_move_into_segments_in_order(db, store, small_segments):
+    ordered = _conversation(db, old=200, recent=5)
+
+    # A dry run counts without writing or deleting anything
+    assert archive_conversation(_conv_ref(db), CUTOFF, dry_run=True) == 200
+    assert _live(db) == ordered and _segments(db, store) == []
+
+    assert archive_conversation(_conv_ref(db), CUTOFF) == 200
+    segments = _segments(db, store)
+    assert [len(segment) for segment in segments] == [40] * 5
+    assert [m for segment in segments for m in segment] == ordered[:200]
+    assert _live(db) == ordered[200:]
+
+    conv = _conv_ref(db).get().to_dict()
+    assert (conv["archivedThroughAt"], conv["archivedThroughId"]) == (_message(199)["timestamp"], ordered[199])
+    # Nothing left to do
+    assert archive_conversation(_conv_ref(db), CUTOFF) == 0
+    assert len(_segments(db, store)) == 5
+
+
+@pytest.mark.parametrize("legacy", [False, True], ids=["boundary-id", "legacy-boundary"])
+def test_interrupted_run_resumes_without_losing_ties(db, store, small_segments, monkeypatch, legacy):
+    ordered = _conversation(db, old=100)
+    delete = archive._delete
+
+    def crash(refs):
+        raise RuntimeError("killed")
+
+    # Killed after recording the first segment, before deleting its messages
+    monkeypatch.setattr(archive, "_delete", crash)
+    with pytest.raises(RuntimeError):
+        archive_conversation(_conv_ref(db), CUTOFF)
+    assert _segments(db, store) == [ordered[:40]] and _live(db) == ordered
+    # The segment ended inside a run of equal timestamps
+    assert _message(39)["timestamp"] == _message(40)["timestamp"]
+    if legacy:
+        _conv_ref(db).update({"archivedThroughId": None})  # Written before the ID was recorded
+
+    monkeypatch.setattr(archive, "_delete", delete)
+    assert archive_conversation(_conv_ref(db), CUTOFF) == 60
+    segments = _segments(db, store)
+    assert [m for segment in segments for m in segment] == ordered
+    assert _live(db) == []
+
+
+@pytest.mark.parametrize("interrupted", [False, True], ids=["clean", "interrupted"])
+def test_paging_crosses_the_archive_boundary(run, db, store, monkeypatch, interrupted):
+    monkeypatch.setattr(archive, "ARCHIVE_SEGMENT_SIZE", 400)
+    ordered = _conversation(db, old=1500, recent=105)
+    if interrupted:
+        # The last segment is recorded but its messages are still in Firestore
+        delete = archive._delete
+        calls = []
+        monkeypatch.setattr(archive, "_delete", lambda refs: calls.append(refs) or (len(calls) < 4 and delete(refs)))
+    assert archive_conversation(_conv_ref(db), CUTOFF) == 1500
+    assert len(_live(db)) == (405 if interrupted else 105)
+
+    async def back(limit: int) -> list[str]:
+        seen, before = [], None
+        while True:
+            page = await archive.messages_before(CONV_ID, limit, before=before)
+            seen = [m["messageId"] for m in page] + seen
+            if len(page) < limit:
+                return seen
+            before = (page[0]["timestamp"], page[0]["messageId"])
+
+    async def forward(limit: int) -> list[str]:
+        seen, after = [], None
+        while True:
+            page = await archive.messages_after(CONV_ID, after, limit)
+            seen += [m["messageId"] for m in page]
+            if len(page) < limit:
+                return seen
+            after = (page[-1]["timestamp"], page[-1]["messageId"])
+
+    for limit in (50, 33):
+        assert run(back(limit)) == ordered
+        assert run(forward(limit)) == ordered
+
+
+def _reminder(i: int, uid: str, **fields) -> dict:
+    return {"reminderId": f"rem{i}", "userId": uid, "title": f"Reminder {i}", "isActive": False,
+            "triggerAtMs": 1_500_000_000_000 + i, **fields}
+
+
+def test_reminders_are_segmented_per_user(db, store, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_SEGMENT_SIZE", 4)
+    users = ["alice", "bob", "carol"]
+    reminders = [_reminder(i, users[i % 3]) for i in range(30)]
+    reminders += [_reminder(100, "alice", isActive=True), _reminder(101, "bob", triggerAtMs=4_000_000_000_000)]
+    batch = db.batch()
+    for reminder in reminders:
+        batch.set(db.collection("reminders").document(reminder["reminderId"]), reminder)
+    batch.commit()
+
+    assert archive_reminders(CUTOFF, dry_run=True) == 30
+    assert len(db.collection("reminders").get()) == 32
+    assert store.list("reminders/alice") == []
+
+    assert archive_reminders(CUTOFF) == 30
+    assert sorted(doc.id for doc in db.collection("reminders").get()) == ["rem100", "rem101"]
+    for uid in users:
+        keys = store.list(f"reminders/{uid}")
+        archived = [r for key in keys for r in store.read(key)]
+        assert {r["userId"] for r in archived} == {uid}
+        assert sorted(r["reminderId"] for r in archived) == sorted(
+            r["reminderId"] for r in reminders[:30] if r["userId"] == uid)
+        assert all(len(list(store.read(key))) <= 4 for key in keys)
+
+
+def test_export_round_trips_through_import(db, store, tmp_path, monkeypatch, small_segments):
+    _conversation(db, old=100, recent=10)
+    db.collection("users").document("alice").set({"uid": "alice", "email": "alice@example.com"})
+    db.collection("users").document("alice").collection("inbox").document(CONV_ID).set({"unreadCount": 2})
+    db.collection("notes").document("n1").set({"noteId": "n1", "userId": "alice", "title": "Trip"})
+    db.collection("aiJobs").document("j1").set({"jobId": "j1", "userId": "alice", "status": "done"})
+    for reminder in [_reminder(1, "alice"), _reminder(2, "alice", isActive=True), _reminder(3, "bob")]:
+        db.collection("reminders").document(reminder["reminderId"]).set(reminder)
+    archive_conversation(_conv_ref(db), CUTOFF)
+    archive_reminders(CUTOFF)
+
+    exported = list(export.from_jsonl(export.to_jsonl(export.export_user("alice"))))
+    kinds = {}
+    for record in exported:
+        kinds[record["kind"]] = kinds.get(record["kind"], 0) + 1
+    assert kinds == {"user": 1, "inbox": 1, "note": 1, "job": 1, "reminder": 2, "conversation": 1, "message": 110}
+
+    # Into an empty project with an empty archive
+    firebase.set_db(FakeFirestore())
+    fresh = LocalStore(str(tmp_path / "fresh"))
+    monkeypatch.setattr(archive, "archive_store", fresh)
+    monkeypatch.setattr(export, "archive_store", fresh)
+    assert export.import_records(exported) == kinds
+
+    def by_path(records):
+        return sorted((r["kind"], r["path"], r["data"]) for r in records)
+
+    assert by_path(export.export_user("alice")) == by_path(exported)
+    conv = firebase.db.collection("conversations").document(CONV_ID).get().to_dict()
+    assert "archivedThroughAt" not in conv and "archivedThroughId" not in conv
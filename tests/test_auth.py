@@ -0,0 +1,157 @@
+# tests/test_auth.py
+# ID token verification and the verified-token cache, against a local
+# stand-in for Firebase's token issuer: RS256 tokens with Firebase's claims,
+# signed with a key generated here and checked the way firebase_admin does.
+
+import time
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from app.middleware import auth
+from app.services.token_cache import TokenCache
+
+PROJECT = "notepad-test"
+ISSUER = f"https://securetoken.google.com/{PROJECT}"
+
+
+class LocalIssuer:
+    """Signs Firebase-shaped ID tokens and verifies them, counting verifications."""
+
+    def __init__(self):
+        self.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.verified = 0
+
+    def issue(self, uid: str, expires_in: float = 3600, key=None) -> str:
+        now = int(time.time())
+        claims = {
+            "iss": ISSUER,
+            "aud": PROJECT,
+            "sub": uid,
+            "user_id": uid,
+            "email": f"{uid}@example.com",
+            "iat": now,
+            "auth_time": now,
+            "exp": now + expires_in,
+        }
+        return jwt.encode(claims, key or self.key, algorithm="RS256", headers={"kid": "local"})
+
+    def verify(self, token: str) -> dict | None:
+        # Same contract as firebase.verify_firebase_token: decoded claims plus uid, or None
+        self.verified += 1
+        try:
+            claims = jwt.decode(token, self.key.public_key(), algorithms=["RS256"], audience=PROJECT, issuer=ISSUER)
+        except jwt.InvalidTokenError:
+            return None
+        return {**claims, "uid": claims["sub"]}
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def issuer(monkeypatch):
+    issuer = LocalIssuer()
+    monkeypatch.setattr(auth, "verify_firebase_token", issuer.verify)
+    return issuer
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def cache(monkeypatch, clock):
+    cache = TokenCache(max_size=3, clock=clock)
+    monkeypatch.setattr(auth, "token_cache", cache)
+    return cache
+
+
+def test_valid_token_is_verified_once(issuer, cache):
+    token = issuer.issue("alice")
+    for _ in range(3):
+        assert auth.authenticate(token) == {"uid": "alice", "email": "alice@example.com"}
+    assert issuer.verified == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_forged_token_is_rejected_and_not_cached(issuer, cache):
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    forged = issuer.issue("alice", key=other_key)
+    assert auth.authenticate(forged) is None
+    assert auth.authenticate(forged) is None
+    assert issuer.verified == 2
+    assert cache.stats()["size"] == 0
+
+
+def test_expired_token_is_rejected(issuer, cache):
+    assert auth.authenticate(issuer.issue("alice", expires_in=-60)) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_cached_token_is_reverified_at_its_expiry(issuer, cache, clock):
+    token = issuer.issue("alice", expires_in=600)
+    assert auth.authenticate(token)
+    clock.now += 601
+    # The cache drops it at the token's own exp; the issuer is asked again
+    auth.authenticate(token)
+    assert issuer.verified == 2
+    assert cache.stats()["expirations"] == 1
+
+
+def test_tokens_are_cached_per_token_not_per_user(issuer, cache):
+    first, second = issuer.issue("alice"), issuer.issue("alice", expires_in=1800)
+    auth.authenticate(first)
+    auth.authenticate(second)
+    assert issuer.verified == 2
+
+
+def test_cache_is_bounded(issuer, cache):
+    tokens = [issuer.issue(f"user-{i}") for i in range(5)]
+    for token in tokens:
+        auth.authenticate(token)
+    stats = cache.stats()
+    assert stats["size"] == 3
+    assert stats["evictions"] == 2
+    # The oldest were evicted, so they're verified again
+    auth.authenticate(tokens[0])
+    assert issuer.verified == 6
+
+
+def test_protected_route_uses_the_issuer(run, db, issuer, cache):
+    from app.main import app
+
+    async def call(token: str) -> int:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/v1/auth/profile", headers={"Authorization": f"Bearer {token}"})
+            return response.status_code
+
+    db.collection("users").document("alice").set({"uid": "alice"})
+    assert run(call(issuer.issue("alice"))) == 200
+    assert run(call(issuer.issue("alice", expires_in=-60))) == 401
+    assert run(call("not-a-jwt")) == 401
+
+
+def test_profile_time_zone_is_the_reminder_default(run, db):
+    from app.main import app
+
+    async def calls():
+        headers = {"Authorization": "Bearer t:alice"}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            bad = await client.patch("/v1/auth/profile", json={"timezone": "Mars/Olympus"}, headers=headers)
+            good = await client.patch("/v1/auth/profile", json={"timezone": "Europe/Berlin"}, headers=headers)
+            reminder = await client.post("/v1/reminders/", headers=headers, json={
+                "title": "Stand-up", "schedule_type": "daily", "trigger_at": "2030-01-07T09:00:00"})
+            return bad.status_code, good.status_code, reminder.json()
+
+    db.collection("users").document("alice").set({"uid": "alice"})
+    bad, good, reminder = run(calls())
+    assert (bad, good) == (400, 200)
+    assert reminder["timezone"] == "Europe/Berlin"
+    assert reminder["triggerAt"].startswith("2030-01-07T08:00")  # 09:00 CET in UTC
@@ -0,0 +1,90 @@
+# tests/test_chat.py
+# Paging through a conversation with the message cursors: pages meet
+# exactly even where many messages share a timestamp, in both directions,
+# and older timestamp-only cursors are still accepted.
+
+import base64
+import httpx
+import pytest
+
+CONV_ID = "conv-chat"
+HEADERS = {"Authorization": "Bearer t:alice"}
+
+
+@pytest.fixture
+def conversation(db):
+    db.collection("users").document("alice").set({"uid": "alice"})
+    db.collection("conversations").document(CONV_ID).set({
+        "conversationId": CONV_ID, "participants": ["alice", "bob"], "lastMessageAt": "2026-01-01T00:00:09",
+    })
+    messages = db.collection("conversations").document(CONV_ID).collection("messages")
+    batch = db.batch()
+    # 100 messages over ten timestamps: every page boundary falls inside a tie
+    for i in range(100):
+        message_id = f"m{(i * 37) % 100:02d}"  # IDs out of step with arrival order
+        batch.set(messages.document(message_id), {
+            "messageId": message_id, "senderId": "bob", "text": f"Message {i}",
+            "timestamp": f"2026-01-01T00:00:0{i // 10}",
+        })
+    batch.commit()
+    return db
+
+
+def _page_through(run, params: dict, cursor_header: str, direction: str) -> list[str]:
+    async def go():
+        seen = []
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://test") as client:
+            query = dict(params)
+            while True:
+                response = await client.get(f"/v1/chat/conversations/{CONV_ID}/messages", params=query,
+                                            headers=HEADERS)
+                assert response.status_code == 200
+                page = [m["messageId"] for m in response.json()]
+                if not page:
+                    return seen
+                seen = page + seen if direction == "before" else seen + page
+                if cursor_header not in response.headers or len(page) < query["limit"]:
+                    return seen
+                query = {"limit": query["limit"], direction: response.headers[cursor_header]}
+    return run(go())
+
+
+def _app():
+    from app.main import app
+    return app
+
+
+def _in_order(db) -> list[str]:
+    messages = db.collection("conversations").document(CONV_ID).collection("messages").stream()
+    return [m["messageId"] for m in sorted((doc.to_dict() for doc in messages),
+                                           key=lambda m: (m["timestamp"], m["messageId"]))]
+
+
+def test_paging_back_has_no_gaps_or_duplicates(run, conversation):
+    assert _page_through(run, {"limit": 7}, "X-Prev-Cursor", "before") == _in_order(conversation)
+
+
+def test_paging_forward_has_no_gaps_or_duplicates(run, conversation):
+    ordered = _in_order(conversation)
+    # Start just after the first message, mid-tie
+    first = base64.urlsafe_b64encode(f"2026-01-01T00:00:00|{ordered[0]}".encode()).decode()
+    assert _page_through(run, {"limit": 7, "after": first}, "X-Next-Cursor", "after") == ordered[1:]
+    # `since` a message resumes right after it, not after its whole timestamp
+    assert _page_through(run, {"limit": 7, "since": ordered[45]}, "X-Next-Cursor", "after") == ordered[46:]
+
+
+def test_timestamp_only_cursors_still_work(run, conversation):
+    legacy = base64.urlsafe_b64encode(b"2026-01-01T00:00:05").decode()
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://test") as client:
+            url = f"/v1/chat/conversations/{CONV_ID}/messages"
+            before = await client.get(url, params={"limit": 200, "before": legacy}, headers=HEADERS)
+            after = await client.get(url, params={"limit": 200, "after": legacy}, headers=HEADERS)
+            bad = await client.get(url, params={"before": "bm90LWEtdGltZQ=="}, headers=HEADERS)
+            return before.json(), after.json(), bad.status_code
+
+    before, after, bad = run(go())
+    assert {m["timestamp"] for m in before} == {f"2026-01-01T00:00:0{i}" for i in range(5)}
+    assert {m["timestamp"] for m in after} == {f"2026-01-01T00:00:0{i}" for i in range(6, 10)}
+    assert bad == 400
@@ -0,0 +1,172 @@
+# tests/test_embeddings.py
+# The embedding store with the deterministic fake provider: vectors are
+# cached by content hash, search ranks by cosine similarity, the IVF index
+# keeps its recall as rows change, workers sharing the file see each
+# other's writes, and retrieval reaches the suggest and ask prompts.
+
+import httpx
+import numpy as np
+import pytest
+from app.routes import ai
+from app.services.embeddings import EmbeddingStore, FakeEmbeddings, IVFIndex, UserVectors, entries_for
+
+WORDS = "dentist invoice passport garden recipe flight meeting birthday budget concert".split()
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.texts: list[str] = []
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        self.texts += texts
+        return await super().embed(texts)
+
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / "embeddings.sqlite3")
+
+
+@pytest.fixture
+def store(path):
+    store = EmbeddingStore(CountingEmbeddings(), path)
+    yield store
+    store.close()
+
+
+def _notes(uid: str, count: int) -> list[tuple]:
+    rng = np.random.default_rng(0)
+    return [entry for i in range(count)
+            for entry in entries_for([uid], "note", f"n{i}", " ".join(rng.choice(WORDS, 6)) + f" note {i}")]
+
+
+def test_identical_text_is_embedded_once(run, store, path):
+    text = "Dinner at the usual place on Friday"
+    run(store.index(entries_for(["alice", "bob"], "message", "m1", text, "c1")))
+    run(store.index(entries_for(["alice"], "note", "n1", text)))
+    assert store.provider.texts == [text]
+
+    # A rebuild, or another worker, finds it in the table
+    other = EmbeddingStore(CountingEmbeddings(), path)
+    run(other.index(entries_for(["carol"], "note", "n2", text)))
+    assert other.provider.texts == []
+    other.close()
+
+    # Queries are embedded once per process and never persisted
+    run(store.search("alice", "where is dinner"))
+    run(store.search("alice", "where is dinner"))
+    assert store.provider.texts == [text, "where is dinner"]
+    assert store._db().execute("SELECT COUNT(*) FROM vectors").fetchone() == (1,)
+
+
+def test_search_ranks_by_cosine_similarity(run, store):
+    entries = _notes("alice", 60) + entries_for(["alice"], "message", "m1", "passport flight passport flight", "c1")
+    run(store.index(entries))
+    query = "passport flight"
+    hits = run(store.search("alice", query, k=5))
+
+    texts = [entry[5] for entry in entries]
+    matrix = np.asarray(run(store.provider.embed(texts)))
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    [q] = run(store.provider.embed([query]))
+    expected = sorted(matrix @ (q / np.linalg.norm(q)), reverse=True)[:5]
+    assert [h["score"] for h in hits] == [round(float(s), 4) for s in expected]
+    assert hits[0]["id"] == "m1" and hits[0]["conversationId"] == "c1"
+
+    assert {h["kind"] for h in run(store.search("alice", query, k=5, kinds={"note"}))} == {"note"}
+    assert run(store.search("bob", query)) == []
+
+
+def _clustered(rng, count: int, centers: np.ndarray) -> np.ndarray:
+    points = centers[rng.integers(len(centers), size=count)] + rng.normal(scale=0.15, size=(count, centers.shape[1]))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_ivf_recall_survives_removes_and_puts():
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(100, 32))
+    user = UserVectors(32)
+    for i, vector in enumerate(_clustered(rng, 6000, centers)):
+        user.put(f"k{i}", {"key": f"k{i}", "kind": "note"}, vector)
+    user.finish_index(IVFIndex(user.start_index()))
+
+    # Churn after the build: rows move into the gaps, some keys are rewritten, others are new
+    removed = {f"k{i}" for i in rng.choice(6000, 1000, replace=False)}
+    for key in removed:
+        user.remove(key)
+    for i, vector in enumerate(_clustered(rng, 800, centers)):
+        key = f"k{i}" if i < 300 and f"k{i}" not in removed else f"new{i}"
+        user.put(key, {"key": key, "kind": "note"}, vector)
+
+    recall = []
+    for row in rng.choice(user.size, 50, replace=False):
+        query = user.matrix[row]
+        exact = {meta["key"] for _, meta in user.search(query, 10, ivf_threshold=10**9)}
+        approx = [meta["key"] for _, meta in user.search(query, 10, ivf_threshold=1000)]
+        assert not removed.intersection(approx)
+        assert approx[0] == user.meta[row]["key"]  # Moved and rewritten rows are still found
+        recall.append(len(exact.intersection(approx)) / 10)
+    assert np.mean(recall) >= 0.9
+
+
+def test_workers_see_each_others_writes(run, store, path):
+    run(store.index(entries_for(["alice"], "note", "n1", "Renew the passport before the flight")))
+    assert [h["id"] for h in run(store.search("alice", "passport"))] == ["n1"]
+
+    # Another worker on the same file
+    other = EmbeddingStore(CountingEmbeddings(), path)
+    run(other.index(entries_for(["alice"], "note", "n2", "Passport photos from the booth")))
+    run(other.remove(["alice"], "note", "n1"))
+    other.close()
+
+    assert [h["id"] for h in run(store.search("alice", "passport"))] == ["n2"]
+    # Its own writes keep the in-memory copy current instead of reloading it
+    run(store.index(entries_for(["alice"], "note", "n3", "Passport renewal form")))
+    loaded = store._users["alice"]
+    assert {h["id"] for h in run(store.search("alice", "passport"))} == {"n2", "n3"}
+    assert store._users["alice"] is loaded
+
+
+def test_retrieval_feeds_suggest_and_ask(run, db, store, monkeypatch):
+    from app.main import app
+
+    run(store.index(
+        entries_for(["alice"], "note", "n1", "Dentist appointment moved to Thursday at 3pm")
+        + entries_for(["alice", "bob"], "message", "m1", "Can we move the dentist to next week?", "c1")
+        + entries_for(["alice"], "note", "n2", "Garden: plant tomatoes and basil")
+        + entries_for(["bob"], "note", "n3", "Bob's dentist is on Main Street")
+    ))
+    monkeypatch.setattr(ai, "embedding_store", store)
+    prompts = {}
+
+    async def suggest_reply(messages, context):
+        prompts["suggest"] = context
+        return "ok"
+
+    async def answer_question(question, sources):
+        prompts["ask"] = sources
+        return "Thursday"
+
+    monkeypatch.setattr(ai, "suggest_reply", suggest_reply)
+    monkeypatch.setattr(ai, "answer_question", answer_question)
+    db.collection("users").document("alice").set({"uid": "alice"})
+
+    async def calls():
+        headers = {"Authorization": "Bearer t:alice"}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            suggest = await client.post("/v1/ai/suggest", headers=headers, json={"messages": [
+                {"isOwn": False, "text": "Can we move the dentist to next week?"},
+            ]})
+            ask = await client.post("/v1/ai/ask", headers=headers, json={"question": "Dentist appointment on Thursday?"})
+            return suggest.json(), ask.json()
+
+    suggest, ask_response = run(calls())
+    assert suggest == {"suggestion": "ok"}
+    # The message already on screen isn't repeated as context; other users' notes never appear
+    assert prompts["suggest"] == ["Dentist appointment moved to Thursday at 3pm"]
+    assert "Dentist appointment moved to Thursday at 3pm" in prompts["ask"]
+    assert "Bob's dentist is on Main Street" not in prompts["ask"]
+    assert ask_response["answer"] == "Thursday"
+    assert [s["text"] for s in ask_response["sources"]] == prompts["ask"]
+    assert {s["id"] for s in ask_response["sources"]} <= {"n1", "m1"}
@@ -0,0 +1,193 @@
+# tests/test_notification.py
+# The push pipeline against a scripted provider: batching, retries into
+# dead letters, token cleanup, the per-user rate limit, and what happens
+# to undelivered reminders on shutdown.
+
+import asyncio
+import time
+import pytest
+from app.services import notification, repository
+from app.services.notification import FAILED, INVALID_TOKEN, RETRY, SENT, NotificationPipeline
+
+
+class Provider:
+    """Records every send; outcomes are scripted per token, SENT by default."""
+
+    max_batch = 500
+
+    def __init__(self, outcomes: dict | None = None, block: bool = False):
+        self.outcomes = outcomes or {}
+        self.block = block
+        self.batches: list[list[tuple[str, str]]] = []
+
+    async def send(self, messages: list[dict]) -> list[tuple[str, str | None]]:
+        self.batches.append([(m["data"]["reminderId"], m["token"]) for m in messages])
+        if self.block:
+            await asyncio.Event().wait()
+        return [self.outcomes.get(m["token"], (SENT, None)) for m in messages]
+
+    def sent(self) -> list[str]:
+        return [reminder_id for batch in self.batches for reminder_id, _ in batch]
+
+
+def _reminders(count: int, users: int = 1) -> list[dict]:
+    return [{"reminderId": f"r{i}", "userId": f"user-{i % users}", "title": f"Reminder {i}",
+             "triggerAt": "2026-03-01T08:00:00"} for i in range(count)]
+
+
+def _devices(db, tokens: dict[str, list[str]]):
+    for uid, user_tokens in tokens.items():
+        db.collection("users").document(uid).set({"fcmTokens": user_tokens})
+
+
+def _dead_letters(db) -> list[dict]:
+    return [doc.to_dict() for doc in db.collection("notificationDeadLetters").stream()]
+
+
+async def _until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def _pipeline(provider, **options) -> NotificationPipeline:
+    return NotificationPipeline(provider, **{"batch_wait_ms": 5, "user_rate": 0, **options})
+
+
+def test_sends_in_batches_of_at_most_500(run, db):
+    _devices(db, {f"user-{i}": [f"t{i}"] for i in range(1200)})
+    _devices(db, {"crowd": [f"c{i}" for i in range(700)]})
+    provider = Provider()
+    pipeline = _pipeline(provider, workers=1)
+
+    async def scenario():
+        await pipeline.start()
+        await asyncio.to_thread(pipeline.submit, _reminders(1200, users=1200))
+        await _until(lambda: pipeline.stats()["sent"] == 1200)
+        # One reminder fanning out to more devices than fit in a call
+        await asyncio.to_thread(pipeline.submit, [{**_reminders(1)[0], "userId": "crowd"}])
+        await _until(lambda: pipeline.stats()["sent"] == 1900)
+        await pipeline.stop()
+
+    run(scenario())
+    sizes = [len(batch) for batch in provider.batches]
+    assert max(sizes) == 500 and sum(sizes) == 1900
+    assert sizes[-2:] == [500, 200]
+    assert sorted(provider.sent()[:1200], key=lambda r: int(r[1:])) == [f"r{i}" for i in range(1200)]
+
+
+def test_transient_failures_retry_then_dead_letter(run, db, monkeypatch):
+    monkeypatch.setattr(notification, "BACKOFF_BASE", 0.001)
+    _devices(db, {"user-0": ["good", "flaky"], "user-1": ["broken"]})
+    provider = Provider({"flaky": (RETRY, "unavailable"), "broken": (FAILED, "bad payload")})
+    pipeline = _pipeline(provider, max_attempts=3)
+
+    async def scenario():
+        await pipeline.start()
+        await asyncio.to_thread(pipeline.submit, _reminders(2, users=2))
+        await _until(lambda: len(_dead_letters(db)) == 2)
+        await pipeline.stop()
+
+    run(scenario())
+    tokens = [token for batch in provider.batches for _, token in batch]
+    # Only the failing device is retried, up to max_attempts in all
+    assert tokens.count("flaky") == 3 and tokens.count("good") == 1 and tokens.count("broken") == 1
+    dead = {entry["token"]: entry for entry in _dead_letters(db)}
+    assert dead["flaky"]["attempts"] == 3 and dead["flaky"]["error"] == "unavailable"
+    assert dead["broken"]["attempts"] == 1
+    assert pipeline.stats()["retried"] == 2
+
+
+def test_unregistered_tokens_are_removed(run, db):
+    _devices(db, {"user-0": ["keep", "gone"]})
+    pipeline = _pipeline(Provider({"gone": (INVALID_TOKEN, "unregistered")}))
+
+    async def scenario():
+        await pipeline.start()
+        await asyncio.to_thread(pipeline.submit, _reminders(1))
+        await _until(lambda: pipeline.stats()["invalidTokens"] == 1)
+        await pipeline.stop()
+        return await repository.get_device_tokens(["user-0"])
+
+    assert run(scenario()) == {"user-0": ["keep"]}
+    assert _dead_letters(db) == []
+
+
+def test_rate_limited_items_are_deferred_once(run, db, monkeypatch):
+    # Regression: a failed batch used to retry the items the limiter had
+    # already deferred, so they were delivered twice
+    _devices(db, {"user-0": ["t0"]})
+    lookups = {"calls": 0}
+    get_device_tokens = repository.get_device_tokens
+
+    async def fail_first(uids):
+        lookups["calls"] += 1
+        if lookups["calls"] == 1:
+            raise RuntimeError("Firestore unavailable")
+        return await get_device_tokens(uids)
+
+    monkeypatch.setattr(notification, "BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(repository, "get_device_tokens", fail_first)
+    provider = Provider()
+    provider.max_batch = 1000  # So the failing batch holds the deferred items too
+    # 600 a minute: a burst of 600, then one every 100 ms
+    pipeline = _pipeline(provider, user_rate=600, workers=1)
+
+    async def scenario():
+        await pipeline.start()
+        await asyncio.to_thread(pipeline.submit, _reminders(603))
+        await _until(lambda: pipeline.stats()["sent"] == 603)
+        await asyncio.sleep(0.3)  # Room for a duplicate to show up
+        stats = pipeline.stats()
+        await pipeline.stop()
+        return stats
+
+    stats = run(scenario())
+    assert stats["rateLimited"] >= 3 and stats["sent"] == 603
+    assert sorted(provider.sent()) == sorted(f"r{i}" for i in range(603))
+
+
+def test_stop_delivers_deferred_items(run, db):
+    _devices(db, {"user-0": ["t0"]})
+    provider = Provider()
+    # One a second after a burst of 60: the last few would wait seconds
+    pipeline = _pipeline(provider, user_rate=60)
+
+    async def scenario():
+        await pipeline.start()
+        await asyncio.to_thread(pipeline.submit, _reminders(65))
+        await _until(lambda: pipeline.stats()["deferred"] == 5)
+        started = time.monotonic()
+        await pipeline.stop()
+        return time.monotonic() - started
+
+    assert run(scenario()) < 1
+    assert sorted(provider.sent()) == sorted(f"r{i}" for i in range(65))
+    assert _dead_letters(db) == []
+
+
+def test_stop_dead_letters_what_it_cannot_deliver(run, db):
+    _devices(db, {"user-0": ["a", "b"]})
+    provider = Provider(block=True)
+    provider.max_batch = 5
+    pipeline = _pipeline(provider, workers=1, queue_size=10, drain_seconds=0.2)
+
+    async def scenario():
+        await pipeline.start()
+        # The worker hangs on the first batch; the rest fill the queue and block intake
+        submitting = asyncio.create_task(asyncio.to_thread(pipeline.submit, _reminders(30)))
+        await _until(lambda: provider.batches and pipeline.stats()["queued"] == 10)
+        await pipeline.stop()
+        await submitting
+
+    run(scenario())
+    dead = _dead_letters(db)
+    assert {entry["error"] for entry in dead} == {"Not delivered before shutdown"}
+    assert sorted({entry["reminderId"] for entry in dead}, key=lambda r: int(r[1:])) == [f"r{i}" for i in range(30)]
+    assert all(entry["attempts"] == 0 for entry in dead)
+
+    # Reminders arriving after shutdown are recorded, not dropped
+    pipeline.submit([{**_reminders(1)[0], "reminderId": "late"}])
+    late = [entry for entry in _dead_letters(db) if entry["reminderId"] == "late"]
+    assert [(entry["error"], entry["attempts"]) for entry in late] == [("Notifications not running", 0)]
@@ -0,0 +1,235 @@
+# tests/test_recurrence.py
+# Property-based tests for the recurrence engine: occurrences are strictly
+# increasing and never skipped, wall-clock times survive DST, month ends
+# and leap days clamp without drifting, and catch-up policies fire what
+# they promise.
+
+import calendar
+from datetime import date, datetime, time, timedelta
+from hypothesis import given, settings, strategies as st
+import pytest
+from app.services import recurrence
+
+ZONES = [
+    "UTC",
+    "America/New_York",
+    "Europe/London",
+    "Australia/Sydney",   # DST in the southern summer
+    "Asia/Kolkata",       # Half-hour offset, no DST
+    "Pacific/Chatham",    # 45-minute offset with DST
+    "Australia/Lord_Howe",  # 30-minute DST shift
+]
+
+zones = st.sampled_from(ZONES)
+local_times = st.datetimes(min_value=datetime(2000, 1, 1), max_value=datetime(2090, 12, 31)).map(
+    lambda when: when.replace(second=0, microsecond=0))
+# Outside the hours where clocks jump, so the wall-clock time exists every day
+safe_local_times = local_times.filter(lambda when: 4 <= when.hour <= 22)
+intervals = st.integers(min_value=1, max_value=4)
+offsets = st.timedeltas(min_value=timedelta(0), max_value=timedelta(days=3 * 366))
+
+
+def reminder(schedule: str, local: datetime, zone: str, interval: int = 1, catch_up: str = "once", **extra) -> dict:
+    return {"reminderId": "r", **recurrence.new_schedule(schedule, local.isoformat(), zone, interval, catch_up=catch_up, **extra)}
+
+
+def occurrences(item: dict, count: int) -> list[datetime]:
+    found = [recurrence.trigger_time(item)]
+    while len(found) < count:
+        following = recurrence.occurrence_after(item, found[-1])
+        if following is None:
+            break
+        found.append(following)
+    return found
+
+
+def local_dates(item: dict, whens: list[datetime]) -> list[date]:
+    zone = recurrence.get_zone(item["timezone"])
+    return [recurrence.to_local(when, zone).date() for when in whens]
+
+
+# ---------- General properties ----------
+
+@settings(deadline=None)
+@given(
+    schedule=st.sampled_from(["daily", "weekly", "monthly", "yearly"]),
+    local=local_times, zone=zones, interval=intervals, offset=offsets, fraction=st.floats(0, 1),
+)
+def test_next_occurrence_is_the_first_after(schedule, local, zone, interval, offset, fraction):
+    item = reminder(schedule, local, zone, interval)
+    after = recurrence.trigger_time(item) - timedelta(days=1) + offset
+    following = recurrence.occurrence_after(item, after)
+    assert following > after
+    # Nothing in between: asking from any earlier point in the gap gives the same answer
+    between = after + (following - after) * fraction
+    if between < following:
+        assert recurrence.occurrence_after(item, between) == following
+
+
+@settings(deadline=None)
+@given(schedule=st.sampled_from(["daily", "weekly", "monthly", "yearly"]),
+       local=local_times, zone=zones, interval=intervals)
+def test_occurrences_strictly_increase(schedule, local, zone, interval):
+    whens = occurrences(reminder(schedule, local, zone, interval), 30)
+    assert len(whens) == 30
+    assert all(a < b for a, b in zip(whens, whens[1:]))
+
+
+@settings(deadline=None)
+@given(local=local_times, zone=zones, interval=intervals)
+def test_daily_fires_once_per_local_day_even_across_dst(local, zone, interval):
+    item = reminder("daily", local, zone, interval)
+    # Long enough to cross at least one DST change in every zone
+    dates = local_dates(item, occurrences(item, 400 // interval))
+    assert all((b - a).days == interval for a, b in zip(dates, dates[1:]))
+
+
+@settings(deadline=None)
+@given(local=safe_local_times, zone=zones, schedule=st.sampled_from(["daily", "weekly", "monthly", "yearly"]))
+def test_wall_clock_time_is_kept_across_dst(local, zone, schedule):
+    item = reminder(schedule, local, zone)
+    tz = recurrence.get_zone(zone)
+    for when in occurrences(item, 60):
+        assert recurrence.to_local(when, tz).time() == local.time()
+
+
+@settings(deadline=None)
+@given(local=local_times, zone=zones, days=st.sets(st.integers(0, 6), min_size=1), interval=intervals)
+def test_weekly_by_day_only_fires_on_chosen_weekdays(local, zone, days, interval):
+    byday = ",".join(list(recurrence.WEEKDAYS)[d] for d in sorted(days))
+    item = reminder("weekly", local, zone, rrule=f"FREQ=WEEKLY;INTERVAL={interval};BYDAY={byday}")
+    dates = local_dates(item, occurrences(item, 50))
+    # Reference: the chosen weekdays of every `interval`-th week from the anchor's week
+    week_start = local.date() - timedelta(days=local.weekday())
+    expected = [week_start + timedelta(weeks=w, days=d) for w in range(0, 60 * interval, interval) for d in sorted(days)]
+    assert dates == [d for d in expected if d >= local.date()][:50]
+
+
+# ---------- Month ends and leap days ----------
+
+@settings(deadline=None)
+@given(local=safe_local_times, zone=zones, interval=intervals, day=st.integers(28, 31))
+def test_monthly_clamps_to_short_months_without_drifting(local, zone, interval, day):
+    year, month = local.year, local.month
+    anchor = local.replace(day=min(day, calendar.monthrange(year, month)[1]))
+    item = reminder("monthly", anchor, zone, interval)
+    for k, found in enumerate(local_dates(item, occurrences(item, 40))):
+        y, m = divmod(year * 12 + month - 1 + k * interval, 12)
+        assert found == date(y, m + 1, min(anchor.day, calendar.monthrange(y, m + 1)[1]))
+
+
+@settings(deadline=None)
+@given(year=st.sampled_from([2000, 2004, 2024, 2028, 2048]), zone=zones, hour=st.integers(4, 22))
+def test_yearly_leap_day_falls_back_to_feb_28(year, zone, hour):
+    item = reminder("yearly", datetime(year, 2, 29, hour), zone)
+    for k, found in enumerate(local_dates(item, occurrences(item, 12))):
+        y = year + k
+        assert found == date(y, 2, 29 if calendar.isleap(y) else 28)
+
+
+def test_leap_day_examples():
+    item = reminder("yearly", datetime(2024, 2, 29, 9), "Europe/London")
+    assert [d.isoformat() for d in local_dates(item, occurrences(item, 5))] == [
+        "2024-02-29", "2025-02-28", "2026-02-28", "2027-02-28", "2028-02-29"]
+    item = reminder("monthly", datetime(2024, 1, 31, 9), "UTC")
+    assert [d.isoformat() for d in local_dates(item, occurrences(item, 4))] == [
+        "2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30"]
+
+
+# ---------- DST examples ----------
+
+def test_dst_examples_new_york():
+    zone = "America/New_York"
+    # 09:00 local is 14:00 UTC in winter and 13:00 UTC once clocks go forward on 8 March
+    item = reminder("daily", datetime(2026, 3, 7, 9), zone)
+    assert [w.hour for w in occurrences(item, 3)] == [14, 13, 13]
+    # 02:30 doesn't exist on 8 March; it still fires that day, an hour later
+    item = reminder("daily", datetime(2026, 3, 7, 2, 30), zone)
+    assert [recurrence.to_local(w, recurrence.get_zone(zone)).isoformat() for w in occurrences(item, 3)] == [
+        "2026-03-07T02:30:00", "2026-03-08T03:30:00", "2026-03-09T02:30:00"]
+    # 01:30 happens twice on 1 November; it fires once
+    item = reminder("daily", datetime(2026, 10, 31, 1, 30), zone)
+    whens = occurrences(item, 3)
+    assert [d.day for d in local_dates(item, whens)] == [31, 1, 2]
+    assert whens[2] - whens[1] == timedelta(hours=25)
+    # Asked from the second pass through 01:xx, the 01:30 that just repeated doesn't count
+    assert recurrence.occurrence_after(item, datetime(2026, 11, 1, 6, 10)) == datetime(2026, 11, 2, 6, 30)
+
+
+# ---------- Catch-up policies ----------
+
+@settings(deadline=None)
+@given(schedule=st.sampled_from(["daily", "weekly", "monthly"]), local=local_times, zone=zones,
+       interval=intervals, late=st.timedeltas(min_value=timedelta(0), max_value=timedelta(days=800)),
+       catch_up=st.sampled_from(recurrence.CATCH_UP_POLICIES))
+def test_catch_up_policies(schedule, local, zone, interval, late, catch_up):
+    item = reminder(schedule, local, zone, interval, catch_up=catch_up)
+    trigger = recurrence.trigger_time(item)
+    now = trigger + late
+    fires, following = recurrence.plan(item, now)
+
+    # Whatever fires, the reminder moves on to the first occurrence after now
+    assert following == recurrence.occurrence_after(item, now)
+    assert following > now
+    missed = [w for w in occurrences(item, recurrence.MAX_CATCH_UP + 1) if w <= now]
+
+    if catch_up == "once":
+        assert fires == [trigger]
+    elif catch_up == "all":
+        assert fires == missed[:recurrence.MAX_CATCH_UP]
+    else:
+        assert fires == ([trigger] if late <= recurrence.CATCH_UP_GRACE else [])
+
+
+@settings(deadline=None)
+@given(local=local_times, zone=zones, late=st.timedeltas(min_value=timedelta(0), max_value=timedelta(days=30)))
+def test_one_off_reminders_finish(local, zone, late):
+    item = reminder("once", local, zone)
+    fires, following = recurrence.plan(item, recurrence.trigger_time(item) + late)
+    assert fires == [recurrence.trigger_time(item)]
+    assert following is None
+
+
+# ---------- Cron ----------
+
+def _cron_matches(when: datetime, minutes: set, hours: set, weekdays: set | None) -> bool:
+    # Reference matcher; cron weekdays count Sunday as 0
+    return (when.minute in minutes and when.hour in hours
+            and (weekdays is None or (when.weekday() + 1) % 7 in weekdays))
+
+
+@settings(deadline=None, max_examples=60)
+@given(minutes=st.sets(st.integers(0, 59), min_size=1, max_size=4),
+       hours=st.sets(st.integers(0, 23), min_size=1, max_size=4),
+       weekdays=st.one_of(st.none(), st.sets(st.integers(0, 6), min_size=1, max_size=3)),
+       after=local_times)
+def test_cron_finds_the_first_matching_minute(minutes, hours, weekdays, after):
+    field = lambda values: ",".join(map(str, sorted(values)))
+    spec = recurrence.CronSpec(f"{field(minutes)} {field(hours)} * * {'*' if weekdays is None else field(weekdays)}")
+    found = spec.next_after(after)
+    assert found > after and _cron_matches(found, minutes, hours, weekdays)
+    when = after + timedelta(minutes=1)
+    while when < found:
+        assert not _cron_matches(when, minutes, hours, weekdays)
+        when += timedelta(minutes=1)
+
+
+def test_cron_that_never_matches_is_rejected():
+    with pytest.raises(ValueError):
+        recurrence.new_schedule("cron", "2026-01-01T00:00:00", cron="0 9 30 2 *")
+
+
+# ---------- Storage ----------
+
+@given(when=st.datetimes(min_value=datetime(1971, 1, 1), max_value=datetime(2200, 1, 1)))
+def test_trigger_ms_round_trips(when):
+    when = when.replace(microsecond=when.microsecond // 1000 * 1000)
+    fields = recurrence.trigger_fields(when)
+    assert recurrence.from_ms(fields["triggerAtMs"]) == when
+    assert recurrence.trigger_time(fields) == when
+    assert recurrence.trigger_time({"triggerAt": fields["triggerAt"]}) == when
+
+
+def test_time_of_day_matches_zone_offset():
+    item = reminder("daily", datetime(2026, 6, 1, 9), "Asia/Kolkata")
+    assert recurrence.trigger_time(item).time() == time(3, 30)
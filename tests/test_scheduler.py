@@ -0,0 +1,165 @@
+# tests/test_scheduler.py
+# The reminder dispatcher driven by a fake clock: 100k reminders fire once
+# each, on time, while only the look-ahead window is held in memory.
+
+from datetime import datetime, timedelta
+import pytest
+from app import scheduler
+from app.scheduler import ReminderDispatcher
+from app.services import recurrence
+
+START = datetime(2026, 3, 1, 8, 0)
+LOOKAHEAD = timedelta(minutes=5)
+REFRESH_EVERY = timedelta(seconds=60)
+STEP = timedelta(seconds=1)
+
+
+class Clock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+def _reminder(i: int, when: datetime, schedule: str = "once") -> dict:
+    return {
+        "reminderId": f"r{i:06d}",
+        "userId": f"user-{i % 997}",
+        "title": f"Reminder {i}",
+        "scheduleType": schedule,
+        "timezone": "UTC",
+        "anchorAt": when.isoformat(),
+        "catchUp": "once",
+        "isActive": True,
+        "createdAt": (START - timedelta(days=1)).isoformat(),
+        **recurrence.trigger_fields(when),
+    }
+
+
+def _seed(db, reminders: list[dict]):
+    collection = db.collection("reminders")
+    for i in range(0, len(reminders), 500):
+        batch = db.batch()
+        for reminder in reminders[i:i + 500]:
+            batch.set(collection.document(reminder["reminderId"]), reminder)
+        batch.commit()
+
+
+def _drive(dispatcher: ReminderDispatcher, clock: Clock, until: datetime, check=None):
+    """What start_scheduler's jobs and the dispatcher thread do, one fake second at a time."""
+    dispatcher.refresh()
+    next_refresh = clock.now + REFRESH_EVERY
+    while clock.now < until:
+        clock.now += STEP
+        if clock.now >= next_refresh:
+            dispatcher.refresh()
+            next_refresh += REFRESH_EVERY
+        dispatcher.run_due(clock.now)
+        if check:
+            check()
+
+
+@pytest.fixture
+def clock():
+    return Clock(START)
+
+
+@pytest.fixture
+def fired(clock):
+    """(reminderId, occurrenceAt, fired at) for everything handed to on_due."""
+    return []
+
+
+@pytest.fixture
+def dispatcher(db, clock, fired):
+    def on_due(occurrences: list[dict]):
+        fired.extend((o["reminderId"], o["occurrenceAt"], clock.now) for o in occurrences)
+    return ReminderDispatcher(LOOKAHEAD, clock=clock, on_due=on_due)
+
+
+def test_100k_reminders_fire_once_on_time(db, clock, fired, dispatcher):
+    count, span = 100_000, timedelta(minutes=20)
+    # Spread over the span, every tenth one daily, some sharing a second
+    reminders = [
+        _reminder(i, START + span * (i * 7919 % count) / count, "daily" if i % 10 == 0 else "once")
+        for i in range(count)
+    ]
+    _seed(db, reminders)
+    window_peak = 0
+
+    def check():
+        nonlocal window_peak
+        window_peak = max(window_peak, len(dispatcher._entries))
+
+    _drive(dispatcher, clock, START + span + STEP, check)
+
+    assert len(fired) == count
+    assert len({reminder_id for reminder_id, _, _ in fired}) == count
+    by_id = {r["reminderId"]: r for r in reminders}
+    for reminder_id, occurrence_at, fired_at in fired:
+        trigger = datetime.fromisoformat(by_id[reminder_id]["triggerAt"])
+        assert occurrence_at == trigger.isoformat()
+        assert trigger <= fired_at < trigger + STEP + STEP
+    assert dispatcher.lost_claims == 0
+    # Only about one look-ahead window (plus a refresh interval) is ever in memory
+    assert window_peak <= count * (LOOKAHEAD + REFRESH_EVERY) / span * 1.05
+
+    stored = {doc.id: doc.to_dict() for doc in db.collection("reminders").get()}
+    for reminder in reminders:
+        after = stored[reminder["reminderId"]]
+        if reminder["scheduleType"] == "daily":
+            assert after["isActive"]
+            assert recurrence.trigger_time(after) == recurrence.trigger_time(reminder) + timedelta(days=1)
+        else:
+            assert not after["isActive"]
+
+
+def test_reminders_created_in_the_window_fire(db, clock, fired, dispatcher):
+    _seed(db, [_reminder(0, START + timedelta(minutes=3))])
+    dispatcher.refresh()
+    clock.now += timedelta(seconds=30)
+    # Created through the API: written to Firestore and handed straight to the dispatcher
+    created = _reminder(1, START + timedelta(minutes=1))
+    _seed(db, [created])
+    dispatcher.schedule(created)
+
+    _drive(dispatcher, clock, START + timedelta(minutes=4))
+    assert [(reminder_id, fired_at) for reminder_id, _, fired_at in fired] == [
+        ("r000001", START + timedelta(minutes=1)),
+        ("r000000", START + timedelta(minutes=3)),
+    ]
+
+
+def test_failed_claim_keeps_reminders_for_the_next_attempt(db, clock, fired, dispatcher, monkeypatch):
+    _seed(db, [_reminder(i, START + timedelta(seconds=10)) for i in range(3)])
+    dispatcher.refresh()
+    claim = dispatcher._claim
+
+    def unavailable(due, now):
+        raise RuntimeError("Firestore unavailable")
+
+    monkeypatch.setattr(dispatcher, "_claim", unavailable)
+    clock.now = START + timedelta(seconds=10)
+    with pytest.raises(RuntimeError):
+        dispatcher.run_due(clock.now)
+    assert fired == []
+
+    monkeypatch.setattr(dispatcher, "_claim", claim)
+    clock.now += timedelta(seconds=scheduler.CLAIM_RETRY_SECONDS)
+    assert dispatcher.run_due(clock.now) == 3
+    assert sorted(reminder_id for reminder_id, _, _ in fired) == ["r000000", "r000001", "r000002"]
+
+
+def test_fired_reminders_are_not_fired_again_by_another_worker(db, clock, fired, dispatcher):
+    _seed(db, [_reminder(0, START + timedelta(seconds=5))])
+    other = ReminderDispatcher(LOOKAHEAD, clock=clock, on_due=lambda occurrences: fired.extend(
+        (o["reminderId"], o["occurrenceAt"], "other") for o in occurrences))
+    dispatcher.refresh()
+    other.refresh()
+
+    clock.now += timedelta(seconds=5)
+    assert dispatcher.run_due(clock.now) == 1
+    assert other.run_due(clock.now) == 0
+    assert other.lost_claims == 1
+    assert len(fired) == 1
@@ -0,0 +1,62 @@
+# tests/test_search_index.py
+# The search index is partitioned by user: a query only sees documents the
+# caller owns or is a participant of, and edits and deletes leave no stray
+# terms behind.
+
+import pytest
+from app.services.search_index import SearchIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.sqlite3"))
+    index.upsert_many([
+        ("note", "n1", "", ["Alice"], "Trip to Zürich", "Fly on Friday, bring the passport", "2026-01-01"),
+        ("message", "m1", "c1", ["Alice", "bob"], "", "Dinner at café Fürst on friday?", "2026-01-02"),
+        ("note", "n2", "", ["bob"], "Groceries", "friday: milk, eggs", "2026-01-03"),
+    ])
+    yield index
+    index.close()
+
+
+def ids(results: list[dict]) -> set[str]:
+    return {r["id"] for r in results}
+
+
+def test_queries_only_see_the_callers_partition(index):
+    assert ids(index._search("Alice", "friday", None, 10)) == {"n1", "m1"}
+    assert ids(index._search("bob", "friday", None, 10)) == {"n2", "m1"}
+    # uids are case-sensitive
+    assert index._search("alice", "friday", None, 10) == []
+    # Nothing matches the owner tokens themselves
+    assert index._search("Alice", "u", None, 10) == []
+
+
+def test_prefixes_diacritics_and_markup(index):
+    [note] = index._search("Alice", "zur", None, 10)
+    assert note["title"] == "Trip to <mark>Zürich</mark>"
+    [message] = index._search("bob", "cafe fur", "message", 10)
+    assert message["snippet"] == "Dinner at <mark>café</mark> <mark>Fürst</mark> on friday?"
+    assert message["conversationId"] == "c1"
+
+
+def test_title_matches_rank_first(index):
+    index.upsert_many([("note", "n3", "", ["Alice"], "Passport renewal", "Forms", "2026-01-04")])
+    assert [r["id"] for r in index._search("Alice", "passport", None, 10)] == ["n3", "n1"]
+
+
+def test_updates_and_deletes_remove_old_terms(index):
+    index._update_note("n1", {"title": "Holiday"})
+    assert index._search("Alice", "zurich", None, 10) == []
+    assert ids(index._search("Alice", "holiday passport", None, 10)) == {"n1"}
+
+    index.upsert_many([("note", "n2", "", ["bob"], "Groceries", "saturday", "2026-01-03")])
+    assert ids(index._search("bob", "friday", None, 10)) == {"m1"}
+
+    index._delete("message", "m1")
+    assert index._search("bob", "friday", None, 10) == []
+    assert index.count() == 2
+
+    index.clear()
+    assert index.count() == 0
+    assert index._search("Alice", "holiday", None, 10) == []
@@ -0,0 +1,133 @@
+# tests/test_summarizer.py
+# Incremental summaries: every upstream call stays within the chunk budget
+# however long the conversation is, and a rerun only pays for new messages.
+
+from datetime import datetime, timedelta
+import httpx
+import pytest
+from app.config import SUMMARY_CHUNK_TOKENS
+from app.services import metrics, repository
+from app.services.rate_limit import MemoryBackend, rate_limiter
+from app.services.summarizer import chunk_messages, estimate_tokens, summarize_incremental
+
+CONV_ID = "conv-1"
+START = datetime(2026, 1, 1)
+# The prompt around the chunk: system message, separators and "senderId: " prefixes
+PROMPT_OVERHEAD = 100
+
+
+def _message(i: int) -> dict:
+    return {
+        "messageId": f"m{i:06d}",
+        "senderId": "alice" if i % 2 else "bob",
+        "text": f"Message {i}: " + "we should sort out the plans for the trip next week " * 3,
+        "timestamp": (START + timedelta(seconds=i)).isoformat(),
+    }
+
+
+def _seed(db, first: int, count: int):
+    messages = db.collection("conversations").document(CONV_ID).collection("messages")
+    batch = db.batch()
+    for i in range(first, first + count):
+        message = _message(i)
+        batch.set(messages.document(message["messageId"]), message)
+        if (i + 1) % 400 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+
+
+@pytest.fixture
+def usage(monkeypatch):
+    """Prompt tokens of every upstream call, as reported back by the API."""
+    prompts: list[int] = []
+    monkeypatch.setattr(metrics, "record_usage", lambda model, usage: prompts.append(usage.prompt_tokens))
+    return prompts
+
+
+@pytest.fixture
+def conversation(db):
+    db.collection("conversations").document(CONV_ID).set({"conversationId": CONV_ID, "participants": ["alice", "bob"]})
+    return db
+
+
+def _summarize(run) -> dict:
+    async def go():
+        conv = await repository.get_conversation(CONV_ID)
+        await summarize_incremental(CONV_ID, conv)
+        return await repository.get_conversation(CONV_ID)
+    return run(go())
+
+
+@pytest.mark.parametrize("count", [40, 1200, 5000])
+def test_every_call_fits_the_chunk_budget(run, conversation, mock_openai, usage, count):
+    _seed(conversation, 0, count)
+    conv = _summarize(run)
+
+    assert conv["summary"]
+    assert conv["summarizedThroughId"] == _message(count - 1)["messageId"]
+    assert max(usage) <= SUMMARY_CHUNK_TOKENS + PROMPT_OVERHEAD
+    # Each message is sent upstream once; merges only add short summaries
+    history = sum(estimate_tokens(f"{m['senderId']}: {m['text']}") for m in map(_message, range(count)))
+    chunks = history // SUMMARY_CHUNK_TOKENS + count // 500 + 1  # Pages of 500 can end mid-chunk
+    assert len(usage) <= 1.5 * chunks
+    assert sum(usage) <= history + len(usage) * PROMPT_OVERHEAD
+
+
+@pytest.mark.parametrize("history", [100, 4000])
+def test_rerun_only_pays_for_new_messages(run, conversation, mock_openai, usage, history):
+    _seed(conversation, 0, history)
+    _summarize(run)
+    usage.clear()
+
+    _seed(conversation, history, 10)
+    conv = _summarize(run)
+
+    # One chunk for the new messages, one merge with the stored summary
+    assert len(usage) == 2
+    new = sum(estimate_tokens(f"{m['senderId']}: {m['text']}") for m in map(_message, range(history, history + 10)))
+    assert sum(usage) <= new + 2 * PROMPT_OVERHEAD + estimate_tokens(conv["summary"]) * 2
+    assert conv["summarizedThroughId"] == _message(history + 9)["messageId"]
+
+
+def test_nothing_new_makes_no_calls(run, conversation, mock_openai, usage):
+    _seed(conversation, 0, 50)
+    _summarize(run)
+    usage.clear()
+    _summarize(run)
+    assert usage == []
+
+
+def test_route_charges_the_tokens_actually_used(run, conversation, mock_openai, monkeypatch):
+    # The request body is just an ID; the upstream cost depends on the unsummarized history
+    _seed(conversation, 0, 1200)
+    conversation.collection("users").document("alice").set({"uid": "alice"})
+    limit = 10_000_000
+    backend = MemoryBackend(clock=lambda: 0.0)  # No refill during the test
+    monkeypatch.setattr(rate_limiter, "backend", backend)
+    monkeypatch.setattr(rate_limiter, "tokens_per_minute", limit)
+    spent = []
+    monkeypatch.setattr(metrics, "record_usage",
+                        lambda model, usage: spent.append(usage.prompt_tokens + usage.completion_tokens))
+
+    async def call():
+        from app.main import app
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/v1/ai/summarize", json={"conversation_id": CONV_ID},
+                                         headers={"Authorization": "Bearer t:alice"})
+            return response.status_code
+
+    assert run(call()) == 200
+    tokens, _, _ = backend._buckets["tok:alice"]
+    assert sum(spent) > 10_000
+    assert limit - tokens == sum(spent)
+
+
+@pytest.mark.parametrize("max_tokens", [50, 500, 3000])
+def test_chunks_are_bounded_and_keep_order(max_tokens):
+    messages = [_message(i) for i in range(300)]
+    chunks = chunk_messages(messages, max_tokens)
+    assert [m for chunk in chunks for m in chunk] == messages
+    for chunk in chunks:
+        size = sum(estimate_tokens(f"{m['senderId']}: {m['text']}") for m in chunk)
+        assert size <= max_tokens or len(chunk) == 1
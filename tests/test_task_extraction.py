@@ -0,0 +1,140 @@
+# tests/test_task_extraction.py
+# Accuracy regression tests for batched task extraction, against the mock
+# OpenAI server's deterministic extractor. Packing many messages into one
+# call must give every message exactly the answer it gets on its own, and a
+# bad reply must only cost the message that caused it.
+
+import asyncio
+import json
+import pytest
+from app.services import ai_service, task_extraction
+from app.services.task_extraction import pack, start_job
+
+UID = "alice"
+
+# (message, expected tasks) labelled to the mock's rules
+CASES = [
+    ("Remind me to call the dentist on 2030-03-15",
+     [{"task": "Remind me to call the dentist", "date": "2030-03-15", "repeat": "none"}]),
+    ("call mum on 2030-01-02 weekly",
+     [{"task": "call mum", "date": "2030-01-02", "repeat": "weekly"}]),
+    ("remind me to water the plants daily",
+     [{"task": "remind me to water the plants daily", "date": None, "repeat": "daily"}]),
+    ("Please remind me to renew the passport on 2031-07-01 yearly",
+     [{"task": "Please remind me to renew the passport", "date": "2031-07-01", "repeat": "yearly"}]),
+    ("remind me to pay rent on 2030-02-01 monthly",
+     [{"task": "remind me to pay rent", "date": "2030-02-01", "repeat": "monthly"}]),
+    ("Lunch was great, thanks!", []),
+    ("Did you see the match last night?", []),
+    ("ok 👍", []),
+    ("Can you call me back when you're free", [{"task": "Can you call me back when you're free", "date": None, "repeat": "none"}]),
+    ("remind me about the invoice on 2020-01-01", [{"task": "remind me about the invoice", "date": "2020-01-01", "repeat": "none"}]),
+]
+
+
+def _items(count: int) -> tuple[list[dict], dict[str, list]]:
+    items, expected = [], {}
+    for i in range(count):
+        text, tasks = CASES[i % len(CASES)]
+        items.append({"id": f"m{i}", "text": text, "conversationId": f"conv-{i % 7}"})
+        expected[f"m{i}"] = tasks
+    return items, expected
+
+
+def _run_job(run, items: list[dict], create_reminders: bool = False) -> dict:
+    from app.services import repository
+
+    async def go():
+        job = await start_job(UID, items, "Europe/London", create_reminders)
+        await asyncio.gather(*task_extraction._jobs)
+        return await repository.get_job(job["jobId"])
+    return run(go())
+
+
+def _accuracy(job: dict, expected: dict[str, list]) -> float:
+    correct = sum(1 for r in job["results"] if r.get("tasks") == expected[r["id"]])
+    return correct / len(expected)
+
+
+@pytest.mark.parametrize("count", [1, 10, 300])
+def test_batched_extraction_matches_labels(run, db, mock_openai, count):
+    items, expected = _items(count)
+    job = _run_job(run, items)
+
+    assert job["status"] == "done"
+    assert [r["id"] for r in job["results"]] == [item["id"] for item in items]
+    assert not [r for r in job["results"] if "error" in r]
+    assert _accuracy(job, expected) == 1.0
+    # Packed into as few calls as the budget allows, and no retries were needed
+    assert job["calls"] == len(pack([(i["id"], i["text"]) for i in items]))
+    assert mock_openai.calls["chat"] == job["calls"]
+
+
+def test_batched_answers_equal_single_message_answers(run, db, mock_openai):
+    async def go():
+        single = [await ai_service.extract_tasks(text) for text, _ in CASES]
+        batched = await ai_service.extract_tasks_batch([(str(i), text) for i, (text, _) in enumerate(CASES)])
+        return single, [batched[str(i)] for i in range(len(CASES))]
+
+    single, batched = run(go())
+    assert batched == single == [tasks for _, tasks in CASES]
+
+
+def test_dropped_ids_are_recovered_by_splitting(run, db, mock_openai, monkeypatch):
+    reply = mock_openai._reply
+
+    def drop_first(body: dict) -> str:
+        # A model that leaves out the first message of every multi-message batch
+        content = json.loads(reply(body))
+        if len(content["results"]) > 1:
+            content["results"] = content["results"][1:]
+        return json.dumps(content)
+
+    monkeypatch.setattr(mock_openai, "_reply", drop_first)
+    items, expected = _items(40)
+    job = _run_job(run, items)
+
+    assert _accuracy(job, expected) == 1.0
+    assert mock_openai.calls["chat"] > job["calls"]
+
+
+def test_unreadable_reply_only_fails_its_message(run, db, mock_openai, monkeypatch):
+    reply = mock_openai._reply
+    poison = "remind me to break the parser"
+
+    def garble(body: dict) -> str:
+        return "{not json" if poison in body["messages"][-1]["content"] else reply(body)
+
+    monkeypatch.setattr(mock_openai, "_reply", garble)
+    items, expected = _items(40)
+    items[17] = {"id": "m17", "text": poison}
+    job = _run_job(run, items)
+
+    errors = {r["id"]: r["error"] for r in job["results"] if "error" in r}
+    assert errors == {"m17": "Unreadable AI response"}
+    del expected["m17"]
+    assert all(r["tasks"] == expected[r["id"]] for r in job["results"] if r["id"] != "m17")
+    # Halving down to the bad message costs about two calls per level, not one per message
+    assert mock_openai.calls["chat"] <= job["calls"] + 2 * 6
+
+
+def test_dated_tasks_become_reminders(run, db, mock_openai):
+    items, _ = _items(len(CASES))
+    job = _run_job(run, items, create_reminders=True)
+
+    reminders = {doc.to_dict()["title"]: doc.to_dict() for doc in db.collection("reminders").get()}
+    # Dated tasks in the future; the 2020 one has passed and undated ones have no time
+    assert sorted(reminders) == sorted([
+        "Remind me to call the dentist", "call mum", "Please remind me to renew the passport", "remind me to pay rent"])
+    assert job["remindersCreated"] == 4
+    assert {title: r["scheduleType"] for title, r in reminders.items()} == {
+        "Remind me to call the dentist": "once",
+        "call mum": "weekly",
+        "Please remind me to renew the passport": "yearly",
+        "remind me to pay rent": "monthly",
+    }
+    # 09:00 London time (GMT in March)
+    assert reminders["Remind me to call the dentist"]["triggerAt"] == "2030-03-15T09:00:00"
+    assert all(r["userId"] == UID and r["isActive"] and r["catchUp"] == "skip" for r in reminders.values())
+    linked = [rid for r in job["results"] for rid in r.get("reminderIds", [])]
+    assert sorted(linked) == sorted(r["reminderId"] for r in reminders.values())